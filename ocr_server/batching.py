@@ -0,0 +1,89 @@
+"""
+Dynamic micro-batching of OCR requests.
+
+Requests that arrive within a short window and share a batch key (language
+model + predict parameters) are gathered and sent to the pipeline as one
+predict() call over a list of images. Each waiting request then receives the
+result for its own image.
+"""
+import asyncio
+import logging
+
+from stats import RollingWindow
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Args:
+        run_batch: `async run_batch(key, items)` returning one result per item,
+            in order
+        window_ms: How long the first request of a batch waits for company
+        max_batch: Flush immediately once this many requests are gathered
+    """
+
+    def __init__(self, run_batch, window_ms=10, max_batch=8):
+        self._run_batch = run_batch
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        # All state is only touched from the event loop thread
+        self._pending = {}
+        self._timers = {}
+        # The loop only keeps weak references to tasks; running batches live here
+        self._tasks = set()
+        self.batches = 0
+        self.batch_sizes = RollingWindow()
+
+    async def submit(self, key, item):
+        """Queue `item` under `key` and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        bucket = self._pending.setdefault(key, [])
+        bucket.append((item, future))
+        if len(bucket) >= self.max_batch:
+            self._flush(key)
+        elif len(bucket) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        entries = self._pending.pop(key, None)
+        if not entries:
+            return
+        # Requests whose client went away while waiting are dropped before inference
+        entries = [(item, future) for item, future in entries if not future.done()]
+        if entries:
+            task = asyncio.get_running_loop().create_task(self._run(key, entries))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key, entries):
+        self.batches += 1
+        self.batch_sizes.add(len(entries))
+        try:
+            results = await self._run_batch(key, [item for item, _ in entries])
+            if results is None or len(results) != len(entries):
+                raise RuntimeError(
+                    f"Batch returned {0 if results is None else len(results)} results for {len(entries)} inputs"
+                )
+        except Exception as e:
+            for _, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(entries, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "window_ms": round(self.window * 1000.0, 2),
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "waiting": sum(len(bucket) for bucket in self._pending.values()),
+            "batch_size": self.batch_sizes.summary(scale=1.0),
+        }
@@ -0,0 +1,11 @@
+"""
+Benchmarks for the OCR server. Run from the ocr_server directory, e.g.
+
+    python -m benchmarks.detection ../comics
+    python -m benchmarks.synthetic out/ --pages 5
+    python -m benchmarks.loadgen --spawn --engine fake
+    python -m benchmarks.backends ../comics --lang japan
+
+`fake_engine` stands in for PaddleOCR when OCR_ENGINE=fake, so the load
+tests run on machines without it. Extra dependencies: requirements.txt.
+"""
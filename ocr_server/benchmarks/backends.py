@@ -0,0 +1,141 @@
+"""
+Compare the Paddle and ONNX Runtime engines on a fixed test set.
+
+Runs every image through each backend with the server's predict parameters
+and reports timing and accuracy:
+
+- paddle: PaddleOCR
+- onnx: the exported float32 models on ONNX Runtime
+- onnx-int8: the int8-quantized exports
+
+Accuracy is the character error rate against the image's ground truth when
+a <image>.txt sits next to it, and against the first backend's text
+otherwise. Without image paths the test set is synthetic pages with fixed
+seeds, which only makes sense for timing.
+
+No results are checked in: the numbers depend on the machine and need a
+PaddleOCR install plus the models exported with export_onnx.py.
+
+    python -m benchmarks.backends ../comics --lang japan
+    python -m benchmarks.backends --backends onnx onnx-int8 --pages 10
+"""
+import argparse
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from benchmarks.detection import _text, _time, char_error_rate, find_images
+from benchmarks.synthetic import make_page
+from pipelines import PIPELINE_CONFIGS, PREDICT_PARAMS, STAGE_MODELS, build_pipeline, warmup_image
+
+BACKENDS = ('paddle', 'onnx', 'onnx-int8')
+
+
+def onnx_pipeline(lang, int8):
+    """An OnnxOCR with its own stage models, independent of OCR_ENGINE and the registry"""
+    from onnx_engine import STAGE_CLASSES, OnnxOCR, model_path
+
+    models = {}
+
+    def get_model(stage, model_name=None):
+        key = (stage, model_name or STAGE_MODELS[stage])
+        if key not in models:
+            models[key] = STAGE_CLASSES[stage](key[1], model_path(key[1], int8))
+        return models[key]
+
+    return OnnxOCR(**PIPELINE_CONFIGS[lang], get_model=get_model)
+
+
+def build_backend(name, lang):
+    if name == 'paddle':
+        pipeline = build_pipeline(lang)
+    else:
+        pipeline = onnx_pipeline(lang, int8=name == 'onnx-int8')
+    return lambda img: pipeline.predict(img, **PREDICT_PARAMS)
+
+
+def test_set(paths, pages, seed):
+    """(name, image, ground truth or None) for the given images, or synthetic pages"""
+    if not paths:
+        for i in range(pages):
+            yield f"synthetic-{seed + i}", make_page(seed=seed + i)[0], None
+        return
+    for path in find_images(paths):
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"Skipping unreadable image {path}", file=sys.stderr)
+            continue
+        truth = None
+        truth_path = os.path.splitext(path)[0] + '.txt'
+        if os.path.exists(truth_path):
+            with open(truth_path, encoding='utf-8') as f:
+                truth = "".join(f.read().split())
+        yield path, img, truth
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help='Images or directories (default: synthetic pages)')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--lang', default='japan', choices=list(PIPELINE_CONFIGS))
+    parser.add_argument('--pages', type=int, default=5, help='Synthetic pages when no paths are given')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    backends = {name: build_backend(name, args.lang) for name in args.backends}
+    # Load and warm every model before timing anything
+    for fn in backends.values():
+        fn(warmup_image())
+
+    pages = []
+    for name, img, truth in test_set(args.paths, args.pages, args.seed):
+        page = {'image': name, 'height': img.shape[0], 'width': img.shape[1], 'ground_truth': truth is not None}
+        reference = truth
+        for backend, fn in backends.items():
+            seconds, result = _time(lambda: fn(img), args.repeats)
+            text = "".join(_text(result).split())
+            if reference is None:
+                reference = text
+            page[backend] = {
+                'ms': round(seconds * 1000, 1),
+                'chars': len(text),
+                'cer': round(char_error_rate(reference, text), 4),
+            }
+        pages.append(page)
+        print(f"{name}: " + ", ".join(f"{backend} {page[backend]['ms']}ms" for backend in backends), file=sys.stderr)
+
+    summary = {}
+    first = args.backends[0]
+    for backend in backends:
+        times = [page[backend]['ms'] for page in pages]
+        cers = [page[backend]['cer'] for page in pages]
+        summary[backend] = {
+            'total_ms': round(sum(times), 1),
+            'mean_ms': round(sum(times) / len(times), 1) if times else 0.0,
+            'mean_cer': round(sum(cers) / len(cers), 4) if cers else 0.0,
+        }
+        if summary[first]['total_ms'] and backend != first:
+            summary[backend][f"speedup_vs_{first}"] = round(summary[first]['total_ms'] / max(summary[backend]['total_ms'], 1e-6), 2)
+
+    report = {
+        'lang': args.lang,
+        'repeats': args.repeats,
+        'cer_reference': 'ground truth where available, else ' + first,
+        'summary': summary,
+        'pages': pages,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Compare full-resolution detection with downscale-then-refine detection.
+
+Runs every page through three paths and reports timing and accuracy:
+
+- full: the PaddleOCR pipeline with the server's predict parameters
+- staged: the staged pipeline at full resolution (isolates pipeline differences)
+- adaptive: the staged pipeline detecting on a copy downscaled to --side-limit
+
+Accuracy is the character error rate of each path against the `full` text.
+
+    python -m benchmarks.detection ../comics --side-limit 1600 --lang japan
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from jobs import IMAGE_EXTENSIONS
+from pipelines import run_predict
+from staged_pipeline import run_staged
+
+
+def levenshtein(a, b):
+    """Edit distance between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def char_error_rate(reference, hypothesis):
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return levenshtein(reference, hypothesis) / len(reference)
+
+
+def find_images(paths):
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                images.extend(
+                    os.path.join(root, name) for name in sorted(names)
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+                )
+        else:
+            images.append(path)
+    return images
+
+
+def _text(result):
+    page_result = result[0] if isinstance(result, list) else result
+    return "".join(str(text).strip() for text in page_result.get('rec_texts', []))
+
+
+def _time(fn, repeats):
+    """Best-of-`repeats` wall time and the last result"""
+    best, result = None, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='Page images or directories of pages')
+    parser.add_argument('--lang', default='japan')
+    parser.add_argument('--side-limit', type=int, default=1600)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    images = find_images(args.paths)
+    if not images:
+        parser.error('No images found')
+
+    paths = {
+        'full': lambda img: run_predict(args.lang, img),
+        'staged': lambda img: run_staged(img, [args.lang]),
+        'adaptive': lambda img: run_staged(img, [args.lang], det_side_limit=args.side_limit),
+    }
+
+    # Load every model before timing anything
+    warmup = np.full((64, 256, 3), 255, dtype=np.uint8)
+    for fn in paths.values():
+        fn(warmup)
+
+    pages = []
+    for path in images:
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"Skipping unreadable image {path}", file=sys.stderr)
+            continue
+        page = {'image': path, 'height': img.shape[0], 'width': img.shape[1]}
+        reference = None
+        for name, fn in paths.items():
+            seconds, result = _time(lambda: fn(img), args.repeats)
+            text = _text(result)
+            if reference is None:
+                reference = text
+            page[name] = {
+                'ms': round(seconds * 1000, 1),
+                'chars': len(text),
+                'cer_vs_full': round(char_error_rate(reference, text), 4),
+            }
+        pages.append(page)
+        print(f"{path}: " + ", ".join(f"{name} {page[name]['ms']}ms" for name in paths), file=sys.stderr)
+
+    summary = {}
+    for name in paths:
+        times = [page[name]['ms'] for page in pages]
+        cers = [page[name]['cer_vs_full'] for page in pages]
+        summary[name] = {
+            'total_ms': round(sum(times), 1),
+            'mean_ms': round(sum(times) / len(times), 1) if times else 0.0,
+            'mean_cer_vs_full': round(sum(cers) / len(cers), 4) if cers else 0.0,
+        }
+    if pages and summary['full']['total_ms']:
+        summary['adaptive']['speedup_vs_full'] = round(summary['full']['total_ms'] / max(summary['adaptive']['total_ms'], 1e-6), 2)
+
+    report = {'lang': args.lang, 'side_limit': args.side_limit, 'repeats': args.repeats, 'summary': summary, 'pages': pages}
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
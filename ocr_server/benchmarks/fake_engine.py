@@ -0,0 +1,158 @@
+"""
+Stand-in OCR engine for load tests and CI machines without PaddleOCR.
+
+Selected with OCR_ENGINE=fake, which makes `pipelines.build_model` build
+these classes instead of PaddleOCR ones. They return results shaped like
+PaddleOCR 3.x (`rec_texts`, `rec_scores`, `rec_boxes`, `rec_polys` for the
+pipeline; `dt_polys`, `rec_text`, `label_names` for the stage models) and
+spend a configurable amount of time per image and per line (see the
+OCR_FAKE_* settings). Output is deterministic for a given image: vertical
+text columns laid out right to left.
+"""
+import time
+import zlib
+
+import numpy as np
+
+import settings
+
+# Text the fake recognizer "reads"
+KANA = list("あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん")
+
+
+def _spend(ms):
+    seconds = ms / 1000.0
+    if seconds <= 0:
+        return
+    if settings.FAKE_COST_MODE == 'cpu':
+        # Busy loop holding the GIL, like pure-Python pre/post-processing
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+    else:
+        time.sleep(seconds)
+
+
+def _rng(img):
+    """Random generator seeded by (a subsample of) the image, so results repeat"""
+    sample = np.ascontiguousarray(np.asarray(img)[::16, ::16])
+    return np.random.default_rng(zlib.crc32(sample.tobytes()) ^ sample.shape[0] << 16 ^ sample.shape[1])
+
+
+def _text(rng, length):
+    return "".join(rng.choice(KANA, size=max(1, length)))
+
+
+def fake_columns(img, count):
+    """
+    Vertical text columns, right to left: (N, 4, 2) float32 quads clockwise
+    from top-left, plus a detection score per column.
+    """
+    h, w = img.shape[:2]
+    rng = _rng(img)
+    column_width = max(4, min(w // (count + 1), h // 3, 48))
+    quads = []
+    x2 = w - column_width // 2
+    for _ in range(count):
+        x1 = x2 - column_width
+        if x1 < 0:
+            break
+        y1 = int(rng.integers(0, max(1, h // 10)))
+        y2 = h - int(rng.integers(0, max(1, h // 4))) - 1
+        if y2 - y1 < column_width:
+            y2 = min(h - 1, y1 + column_width)
+        quads.append([[x1, y1], [x2, y1], [x2, y2], [x1, y2]])
+        x2 = x1 - column_width // 3
+    polys = np.array(quads, dtype=np.float32).reshape(-1, 4, 2)
+    scores = rng.uniform(0.6, 0.99, size=len(polys)).astype(np.float32)
+    return polys, scores
+
+
+def _line_text(rng, poly):
+    width = float(poly[:, 0].max() - poly[:, 0].min())
+    height = float(poly[:, 1].max() - poly[:, 1].min())
+    # About one character per line-thickness along the line
+    return _text(rng, min(20, int(max(width, height) / max(1.0, min(width, height)))))
+
+
+class FakeOCR:
+    """Mimics `PaddleOCR(...).predict()`"""
+
+    def __init__(self, lang='japan', **config):
+        self.lang = lang
+        self.config = config
+
+    def _predict_one(self, img, params):
+        h, w = img.shape[:2]
+        polys, _ = fake_columns(img, settings.FAKE_LINES)
+        rng = _rng(img)
+        texts = [_line_text(rng, poly) for poly in polys]
+        scores = rng.uniform(0.5, 0.99, size=len(texts))
+        threshold = params.get('text_rec_score_thresh', self.config.get('text_rec_score_thresh', 0.0))
+        keep = [i for i, score in enumerate(scores) if score >= threshold]
+        _spend(settings.FAKE_COST_MS + settings.FAKE_COST_MS_PER_MP * h * w / 1e6 + settings.FAKE_LINE_COST_MS * len(keep))
+        polys = polys[keep].astype(np.int16)
+        return {
+            'rec_texts': [texts[i] for i in keep],
+            'rec_scores': [float(scores[i]) for i in keep],
+            'rec_polys': list(polys),
+            'rec_boxes': np.concatenate([polys.min(axis=1), polys.max(axis=1)], axis=1).reshape(-1, 4),
+        }
+
+    def predict(self, input, **params):
+        images = input if isinstance(input, list) else [input]
+        return [self._predict_one(img, params) for img in images]
+
+
+class FakeTextDetection:
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+
+    def predict(self, img, **params):
+        h, w = img.shape[:2]
+        _spend(settings.FAKE_COST_MS + settings.FAKE_COST_MS_PER_MP * h * w / 1e6)
+        polys, scores = fake_columns(img, settings.FAKE_LINES)
+        return [{'dt_polys': polys, 'dt_scores': scores.tolist()}]
+
+
+class FakeDocOrientation:
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+
+    def predict(self, img, **params):
+        return [{'label_names': ['0']}]
+
+
+class FakeTextlineOrientation:
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+
+    def predict(self, crops, **params):
+        return [{'label_names': ['0_degree']} for _ in crops]
+
+
+class FakeTextRecognition:
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+
+    def predict(self, crops, **params):
+        results = []
+        for crop in crops:
+            _spend(settings.FAKE_LINE_COST_MS)
+            rng = _rng(crop)
+            h, w = crop.shape[:2]
+            # Crops arrive rotated so the text runs along the width
+            results.append({
+                'rec_text': _text(rng, min(20, w // max(1, h))),
+                'rec_score': float(rng.uniform(0.5, 0.99)),
+            })
+        return results
+
+
+STAGE_CLASSES = {
+    'det': FakeTextDetection,
+    'doc_ori': FakeDocOrientation,
+    'textline_ori': FakeTextlineOrientation,
+    'rec': FakeTextRecognition,
+}
+
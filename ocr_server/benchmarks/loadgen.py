@@ -0,0 +1,240 @@
+"""
+Load generator for the OCR server.
+
+Sends synthetic bubble crops (or the images given with --images) to /ocr and
+/ocr-chinese at a fixed concurrency and reports latency percentiles,
+requests per second, errors and the server's peak RSS as JSON. Every image
+is made unique per request so the result cache doesn't answer it.
+
+Against a running server (pass its pid for the RSS figure):
+
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --server-pid 1234
+
+Or start a server with the fake engine, measure, and stop it:
+
+    python -m benchmarks.loadgen --spawn --engine fake --concurrency 8 --requests 500
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import encode, make_bubble
+from benchmarks.detection import find_images
+from stats import RollingWindow
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb(pid):
+    """Peak resident set size of a process in MiB (VmHWM on Linux, psutil elsewhere)"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        memory = psutil.Process(pid).memory_info()
+    except psutil.Error:
+        return None
+    # Windows reports the peak working set; elsewhere only the current RSS is known
+    return round(getattr(memory, 'peak_wset', memory.rss) / (1024.0 * 1024.0), 1)
+
+
+def load_images(paths, count, seed):
+    """Decoded images to send: the given files, or `count` synthetic bubble crops"""
+    if paths:
+        images = []
+        for path in find_images(paths):
+            img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img is not None:
+                images.append(img)
+        return images
+    return [make_bubble(seed=seed + i) for i in range(count)]
+
+
+def _unique_payload(img, serial):
+    """Encode a copy of `img` with the request serial stamped into one pixel row"""
+    img = img.copy()
+    stamp = np.frombuffer(serial.to_bytes(8, 'little'), dtype=np.uint8)
+    img[-1, :len(stamp), 0] = stamp[:img.shape[1]]
+    return encode(img)
+
+
+async def run_load(url, endpoints, images, concurrency, requests, warmup=0, server_pid=None, timeout=120.0):
+    """
+    Drive `endpoints` round-robin with `requests` requests, `concurrency` at a
+    time, and return the report dict. Payloads are encoded up front so the
+    generator itself doesn't limit throughput.
+    """
+    import httpx
+
+    total = warmup + requests
+    serials = itertools.count()
+    payloads = [
+        (endpoints[i % len(endpoints)], _unique_payload(images[i % len(images)], i + int(time.time() * 1000)))
+        for i in range(total)
+    ]
+    latency = {endpoint: RollingWindow(size=requests) for endpoint in endpoints}
+    overall = RollingWindow(size=requests)
+    errors = {endpoint: {} for endpoint in endpoints}
+    measured = {'start': None, 'end': None}
+
+    async def worker(client):
+        while True:
+            index = next(serials)
+            if index >= total:
+                return
+            if index == warmup and measured['start'] is None:
+                measured['start'] = time.perf_counter()
+            endpoint, data = payloads[index]
+            started = time.perf_counter()
+            try:
+                response = await client.post(endpoint, files={'file': ('page.png', data, 'image/png')})
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if index < warmup:
+                continue
+            if status == 200:
+                latency[endpoint].add(elapsed)
+                overall.add(elapsed)
+            else:
+                errors[endpoint][str(status)] = errors[endpoint].get(str(status), 0) + 1
+            measured['end'] = time.perf_counter()
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        try:
+            server_stats = (await client.get('/stats')).json()
+        except (httpx.HTTPError, ValueError):
+            server_stats = None
+
+    if measured['start'] is None:
+        measured['start'] = time.perf_counter()
+    duration = max((measured['end'] or measured['start']) - measured['start'], 1e-9)
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'requests': requests,
+        'warmup': warmup,
+        'duration_s': round(duration, 3),
+        'rps': round(overall.count / duration, 2),
+        'latency_ms': overall.summary(),
+        'endpoints': {
+            endpoint: {
+                'latency_ms': latency[endpoint].summary(),
+                'rps': round(latency[endpoint].count / duration, 2),
+                'errors': errors[endpoint],
+            }
+            for endpoint in endpoints
+        },
+        'errors': sum(sum(counts.values()) for counts in errors.values()),
+        'peak_rss_mb': peak_rss_mb(server_pid),
+        'server_stats': server_stats,
+    }
+
+
+def spawn_server(port, env=None, args=()):
+    """
+    Start server.py in a subprocess on `port`; returns the Popen. Its output
+    goes to stderr so the access log doesn't end up in the JSON report.
+    """
+    command = [sys.executable, '-m', 'uvicorn', 'server:app', '--host', '127.0.0.1', '--port', str(port), *args]
+    return subprocess.Popen(command, cwd=SERVER_DIR, env=dict(os.environ, **(env or {})), stdout=sys.stderr)
+
+
+def wait_ready(url, process=None, timeout=300.0, path='/ready'):
+    """Poll the server until it answers `path` with 200 (models loaded and warm)"""
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(url + path, timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Server at {url} not ready after {timeout}s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--endpoint', action='append', dest='endpoints',
+                        help='Endpoint to load (repeatable; default: /ocr and /ocr-chinese)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--images', nargs='*', help='Images or directories to send instead of synthetic crops')
+    parser.add_argument('--synthetic', type=int, default=32, help='Number of distinct synthetic crops')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--server-pid', type=int, help='Server process to read peak RSS from')
+    parser.add_argument('--spawn', action='store_true', help='Start a server for the run and stop it afterwards')
+    parser.add_argument('--port', type=int, default=8765, help='Port for --spawn')
+    parser.add_argument('--engine', help='OCR_ENGINE for --spawn (e.g. fake)')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    endpoints = args.endpoints or ['/ocr', '/ocr-chinese']
+    images = load_images(args.images, args.synthetic, args.seed)
+    if not images:
+        parser.error('No images to send')
+
+    process = None
+    url = args.url
+    server_pid = args.server_pid
+    if args.spawn:
+        url = f"http://127.0.0.1:{args.port}"
+        env = {'OCR_ENGINE': args.engine} if args.engine else {}
+        # Measure the server, not the cache
+        env.setdefault('OCR_CACHE_SIZE', '0')
+        process = spawn_server(args.port, env)
+        server_pid = process.pid
+    try:
+        if process is not None:
+            wait_ready(url, process)
+        report = asyncio.run(run_load(url, endpoints, images, args.concurrency, args.requests, args.warmup, server_pid))
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
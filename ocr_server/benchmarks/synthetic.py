@@ -0,0 +1,138 @@
+"""
+Synthetic manga pages and speech-bubble crops for benchmarks.
+
+Pages have panel borders, some line art and screentone, and oval speech
+bubbles holding vertical columns of glyph-like strokes. No fonts are needed,
+so the output is the same on every machine for a given seed. The bubble
+boxes are returned in the overlay-box shape /ocr-page takes.
+
+    python -m benchmarks.synthetic out/ --pages 5 --crops 20 --seed 0
+"""
+import argparse
+import json
+import os
+
+import cv2
+import numpy as np
+
+
+def _glyph(img, x, y, size, rng):
+    """A few short strokes inside a size x size cell, roughly like a kana"""
+    for _ in range(int(rng.integers(2, 5))):
+        p1 = (x + int(rng.integers(1, size - 1)), y + int(rng.integers(1, size - 1)))
+        p2 = (x + int(rng.integers(1, size - 1)), y + int(rng.integers(1, size - 1)))
+        cv2.line(img, p1, p2, (0, 0, 0), max(1, size // 10), cv2.LINE_AA)
+
+
+def _text_columns(img, x, y, columns, chars, glyph, rng):
+    """Vertical columns right to left starting at the top-right corner (x, y)"""
+    for column in range(columns):
+        length = int(rng.integers(max(1, chars // 2), chars + 1))
+        cx = x - (column + 1) * int(glyph * 1.4)
+        for row in range(length):
+            _glyph(img, cx, y + row * int(glyph * 1.1), glyph, rng)
+
+
+def _bubble_size(columns, chars, glyph):
+    width = int(columns * glyph * 1.4 + glyph * 1.6)
+    height = int(chars * glyph * 1.1 + glyph * 1.6)
+    return width, height
+
+
+def make_bubble(seed=0, columns=None, chars=None, glyph=None):
+    """A single speech-bubble crop, like the ones the viewer sends to /ocr"""
+    rng = np.random.default_rng(seed)
+    columns = columns or int(rng.integers(1, 5))
+    chars = chars or int(rng.integers(3, 10))
+    glyph = glyph or int(rng.integers(16, 32))
+    width, height = _bubble_size(columns, chars, glyph)
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.ellipse(img, (width // 2, height // 2), (width // 2 - 2, height // 2 - 2), 0, 0, 360, (0, 0, 0), 2, cv2.LINE_AA)
+    _text_columns(img, width - int(glyph * 0.6), int(glyph * 0.8), columns, chars, glyph, rng)
+    return img
+
+
+def make_page(seed=0, width=1200, height=1800, bubbles=8):
+    """
+    A manga-like page. Returns (image, boxes) where boxes are dicts with
+    x, y, width, height (pixels) and the bubble's columns and chars.
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+    margin = width // 24
+
+    # Panels: 2-4 rows, each split into 1-3 panels
+    rows = int(rng.integers(2, 5))
+    row_edges = np.linspace(margin, height - margin, rows + 1).astype(int)
+    panels = []
+    for top, bottom in zip(row_edges[:-1], row_edges[1:]):
+        cols = int(rng.integers(1, 4))
+        col_edges = np.sort(rng.integers(margin, width - margin, size=cols - 1))
+        col_edges = [margin, *col_edges.tolist(), width - margin]
+        for left, right in zip(col_edges[:-1], col_edges[1:]):
+            if right - left < margin * 2:
+                continue
+            panels.append((left + 6, top + 6, right - 6, bottom - 6))
+
+    for left, top, right, bottom in panels:
+        # Screentone in part of the panel, then some line art
+        tone_bottom = top + (bottom - top) // int(rng.integers(2, 4))
+        img[top:tone_bottom:6, left:right:6] = 150
+        for _ in range(int(rng.integers(3, 9))):
+            p1 = (int(rng.integers(left, right)), int(rng.integers(top, bottom)))
+            p2 = (int(rng.integers(left, right)), int(rng.integers(top, bottom)))
+            cv2.line(img, p1, p2, (40, 40, 40), int(rng.integers(1, 4)), cv2.LINE_AA)
+        cv2.rectangle(img, (left, top), (right, bottom), (0, 0, 0), 3)
+
+    boxes = []
+    attempts = 0
+    while len(boxes) < bubbles and attempts < bubbles * 20:
+        attempts += 1
+        columns = int(rng.integers(1, 5))
+        chars = int(rng.integers(3, 10))
+        glyph = int(rng.integers(18, 30))
+        bw, bh = _bubble_size(columns, chars, glyph)
+        if bw >= width - 2 * margin or bh >= height - 2 * margin:
+            continue
+        x = int(rng.integers(margin, width - margin - bw))
+        y = int(rng.integers(margin, height - margin - bh))
+        if any(x < b['x'] + b['width'] and b['x'] < x + bw and y < b['y'] + b['height'] and b['y'] < y + bh for b in boxes):
+            continue
+        cv2.ellipse(img, (x + bw // 2, y + bh // 2), (bw // 2, bh // 2), 0, 0, 360, (255, 255, 255), -1)
+        cv2.ellipse(img, (x + bw // 2, y + bh // 2), (bw // 2, bh // 2), 0, 0, 360, (0, 0, 0), 2, cv2.LINE_AA)
+        _text_columns(img, x + bw - int(glyph * 0.6), y + int(glyph * 0.8), columns, chars, glyph, rng)
+        boxes.append({'x': x, 'y': y, 'width': bw, 'height': bh, 'columns': columns, 'chars': chars})
+    return img, boxes
+
+
+def encode(img, ext='.png'):
+    """Encoded image bytes, as a client would upload them"""
+    ok, buffer = cv2.imencode(ext, img)
+    if not ok:
+        raise ValueError(f"Could not encode image as {ext}")
+    return buffer.tobytes()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output', help='Directory to write images into')
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--crops', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--width', type=int, default=1200)
+    parser.add_argument('--height', type=int, default=1800)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    for i in range(args.pages):
+        img, boxes = make_page(seed=args.seed + i, width=args.width, height=args.height)
+        cv2.imwrite(os.path.join(args.output, f"page_{i:03d}.png"), img)
+        with open(os.path.join(args.output, f"page_{i:03d}.boxes.json"), 'w', encoding='utf-8') as f:
+            json.dump(boxes, f)
+    for i in range(args.crops):
+        cv2.imwrite(os.path.join(args.output, f"crop_{i:03d}.png"), make_bubble(seed=args.seed + i))
+    print(f"Wrote {args.pages} pages and {args.crops} crops to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
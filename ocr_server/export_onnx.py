@@ -0,0 +1,131 @@
+"""
+Export the server's PP-OCR models to ONNX for OCR_ENGINE=onnx.
+
+For every stage model (detection, orientation, recognition per language) this
+converts the downloaded Paddle inference model with paddle2onnx into
+OCR_ONNX_MODEL_DIR/<model name>/inference.onnx, copies its inference.yml
+(labels, character dictionary) alongside and, with --int8, writes a
+dynamically quantized inference.int8.onnx next to it (int8 weights,
+activations quantized at run time; no calibration set needed).
+
+    python export_onnx.py                       # every model the server uses
+    python export_onnx.py PP-OCRv5_server_rec --int8
+
+Models missing from the PaddleX cache are downloaded first by building them
+with PaddleOCR. Needs paddleocr, paddle2onnx and onnxruntime.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+import settings
+from pipelines import REC_MODELS, STAGE_MODELS
+
+PADDLE_MODEL_DIR = os.path.join(os.path.expanduser('~'), '.paddlex', 'official_models')
+
+
+def server_models():
+    """(stage, model_name) for every model the staged pipeline loads"""
+    models = dict((name, stage) for stage, name in STAGE_MODELS.items())
+    models.update((name, 'rec') for name in REC_MODELS.values())
+    return [(stage, name) for name, stage in models.items()]
+
+
+def paddle_model_dir(stage, model_name, source):
+    """Directory of the Paddle inference model, downloading it through PaddleOCR if needed"""
+    directory = os.path.join(source, model_name)
+    if not os.path.isdir(directory):
+        print(f"{model_name}: not in {source}, downloading", file=sys.stderr)
+        from pipelines import build_model
+        build_model((stage, model_name))
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"{model_name} not found in {source}")
+    return directory
+
+
+def _model_filename(directory):
+    # PaddlePaddle 3 saves the program as JSON (PIR); older exports as .pdmodel
+    for name in ('inference.json', 'inference.pdmodel'):
+        if os.path.exists(os.path.join(directory, name)):
+            return name
+    raise FileNotFoundError(f"No inference.json or inference.pdmodel in {directory}")
+
+
+def export(stage, model_name, source, output, opset=14):
+    """Convert one model; returns the path of the float32 .onnx"""
+    directory = paddle_model_dir(stage, model_name, source)
+    target = os.path.join(output, model_name)
+    os.makedirs(target, exist_ok=True)
+    onnx_path = os.path.join(target, 'inference.onnx')
+    subprocess.run([
+        'paddle2onnx',
+        '--model_dir', directory,
+        '--model_filename', _model_filename(directory),
+        '--params_filename', 'inference.pdiparams',
+        '--save_file', onnx_path,
+        '--opset_version', str(opset),
+    ], check=True)
+
+    config = os.path.join(directory, 'inference.yml')
+    if os.path.exists(config):
+        shutil.copyfile(config, os.path.join(target, 'inference.yml'))
+    if stage == 'rec' and os.path.exists(config):
+        import yaml
+
+        with open(config, encoding='utf-8') as f:
+            characters = (yaml.safe_load(f).get('PostProcess') or {}).get('character_dict') or []
+        with open(os.path.join(target, 'characters.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(str(char) for char in characters))
+    return onnx_path
+
+
+def quantize(onnx_path):
+    """Write the dynamically int8-quantized copy next to `onnx_path`; returns its path"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    directory = os.path.dirname(onnx_path)
+    prepared = os.path.join(directory, 'inference.prep.onnx')
+    int8_path = os.path.join(directory, 'inference.int8.onnx')
+    quant_pre_process(onnx_path, prepared, skip_symbolic_shape=True)
+    try:
+        quantize_dynamic(prepared, int8_path, per_channel=True, weight_type=QuantType.QInt8)
+    finally:
+        os.remove(prepared)
+    return int8_path
+
+
+def _size_mb(path):
+    return round(os.path.getsize(path) / (1024.0 * 1024.0), 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('models', nargs='*', help='Model names to export (default: every model the server uses)')
+    parser.add_argument('--int8', action='store_true', help='Also write an int8-quantized copy')
+    parser.add_argument('--source', default=PADDLE_MODEL_DIR, help='PaddleX model cache')
+    parser.add_argument('--output', default=settings.ONNX_MODEL_DIR)
+    parser.add_argument('--opset', type=int, default=14)
+    args = parser.parse_args(argv)
+
+    models = server_models()
+    if args.models:
+        stages = dict((name, stage) for stage, name in models)
+        unknown = [name for name in args.models if name not in stages]
+        if unknown:
+            parser.error(f"Not a model the server uses: {', '.join(unknown)}")
+        models = [(stages[name], name) for name in args.models]
+
+    for stage, model_name in models:
+        onnx_path = export(stage, model_name, args.source, args.output, args.opset)
+        line = f"{model_name}: {onnx_path} ({_size_mb(onnx_path)} MB)"
+        if args.int8:
+            int8_path = quantize(onnx_path)
+            line += f", int8 {_size_mb(int8_path)} MB"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Box geometry helpers: overlay box rectangles to page polygons and upright crops.
+
+Overlay boxes use the viewer's `OverlayBoxModel` shape: top-left x/y, width,
+height and a rotation in degrees, clockwise in screen coordinates, around the
+box centre.
+"""
+import cv2
+import numpy as np
+
+
+def box_affine(x, y, width, height, rotation=0.0):
+    """
+    2x3 affine matrix mapping page pixels into the upright box crop, where the
+    crop is `width` x `height` with the box's top-left at (0, 0).
+    """
+    cx, cy = x + width / 2.0, y + height / 2.0
+    # A positive OpenCV angle rotates the image counter-clockwise, which undoes
+    # a clockwise box rotation
+    matrix = cv2.getRotationMatrix2D((cx, cy), rotation, 1.0)
+    matrix[0, 2] += width / 2.0 - cx
+    matrix[1, 2] += height / 2.0 - cy
+    return matrix
+
+
+def box_polygon(x, y, width, height, rotation=0.0):
+    """Corners of the box in page coordinates, clockwise from top-left, shape (4, 2)"""
+    corners = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float64)
+    return crop_to_page(corners, box_affine(x, y, width, height, rotation))
+
+
+def crop_box(img, x, y, width, height, rotation=0.0):
+    """Cut the (possibly rotated) box out of the page as an upright image"""
+    w, h = int(round(width)), int(round(height))
+    if w <= 0 or h <= 0:
+        return None
+    x0, y0 = int(round(x)), int(round(y))
+    if not rotation and x0 >= 0 and y0 >= 0 and x0 + w <= img.shape[1] and y0 + h <= img.shape[0]:
+        # Plain slice, no resampling; a copy so the crop doesn't pin the page
+        return img[y0:y0 + h, x0:x0 + w].copy()
+    matrix = box_affine(x, y, width, height, rotation)
+    return cv2.warpAffine(
+        img, matrix, (w, h),
+        flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=(255, 255, 255),
+    )
+
+
+def crop_to_page(points, matrix):
+    """Map (N, 2) crop coordinates back to page coordinates through the inverse affine"""
+    inverse = cv2.invertAffineTransform(matrix)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return points @ inverse[:, :2].T + inverse[:, 2]
+
+
+def order_quad(poly):
+    """Order 4 points clockwise starting from the top-left one"""
+    poly = np.asarray(poly, dtype=np.float32).reshape(4, 2)
+    sums = poly.sum(axis=1)
+    diffs = np.diff(poly, axis=1).ravel()
+    return np.array([
+        poly[np.argmin(sums)],   # top-left
+        poly[np.argmin(diffs)],  # top-right
+        poly[np.argmax(sums)],   # bottom-right
+        poly[np.argmax(diffs)],  # bottom-left
+    ], dtype=np.float32)
+
+
+def crop_quad(img, poly):
+    """
+    Perspective-crop a detected text quad to an upright line image. Tall
+    crops (vertical text) are rotated 90 degrees counter-clockwise so the
+    recognizer always reads along the long side, as PaddleOCR does.
+    """
+    quad = order_quad(poly)
+    width = int(max(np.linalg.norm(quad[0] - quad[1]), np.linalg.norm(quad[3] - quad[2])))
+    height = int(max(np.linalg.norm(quad[0] - quad[3]), np.linalg.norm(quad[1] - quad[2])))
+    if width < 1 or height < 1:
+        return None
+    target = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(quad, target)
+    crop = cv2.warpPerspective(
+        img, matrix, (width, height),
+        borderMode=cv2.BORDER_REPLICATE,
+        flags=cv2.INTER_CUBIC,
+    )
+    if height / width >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def quad_bounds(polys):
+    """Axis-aligned [x_min, y_min, x_max, y_max] per quad, shape (N, 4)"""
+    polys = np.asarray(polys, dtype=np.float32).reshape(-1, 4, 2)
+    return np.concatenate([polys.min(axis=1), polys.max(axis=1)], axis=1)
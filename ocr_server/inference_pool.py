@@ -0,0 +1,135 @@
+"""
+Bounded worker pool that runs blocking OCR inference off the event loop.
+
+`predict()` holds the calling thread for the whole inference, so calling it
+from an `async def` handler stalls every other request (including the health
+check). The pool runs it on a thread or process executor instead and refuses
+new work once the queue is full, so overload turns into a fast 503 with
+Retry-After rather than an ever-growing backlog.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from stats import RollingWindow
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the pool already holds `max_workers + max_queue` jobs"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _timed_call(fn, args, kwargs, report=None):
+    # Module-level so it can be pickled for process pools. Wall-clock time is
+    # used because monotonic clocks are not comparable across processes.
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, result, (os.getpid(), report()) if report is not None else None
+
+
+class InferencePool:
+    """
+    Args:
+        max_workers: Jobs that run concurrently
+        max_queue: Jobs allowed to wait for a worker; beyond this `run`
+            raises PoolSaturatedError
+        kind: 'thread' or 'process'. Process workers each load their own
+            models, so `fn` must be a picklable module-level function.
+        initializer: Run by each worker before its first job
+        report: Process pools only: a module-level function whose result
+            (e.g. the worker's model registry stats) comes back with every
+            job and is kept per worker pid in `worker_reports`
+    """
+
+    def __init__(self, max_workers=1, max_queue=8, kind='thread', initializer=None, report=None):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown pool kind: {kind}")
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.kind = kind
+        self._report = report if kind == 'process' else None
+        self.worker_reports = {}
+        if kind == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=initializer)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='ocr-worker', initializer=initializer
+            )
+        # Only touched from the event loop thread, so no lock is needed
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_times = RollingWindow()
+        self.run_times = RollingWindow()
+
+    @property
+    def capacity(self):
+        return self.max_workers + self.max_queue
+
+    @property
+    def queue_depth(self):
+        # The executors are FIFO, so anything beyond the worker count is waiting
+        return max(0, self._pending - self.max_workers)
+
+    def retry_after(self):
+        """Seconds until a slot is likely free, from recent run times"""
+        avg_run = self.run_times.mean() or 1.0
+        return max(1, math.ceil(avg_run * (self.queue_depth + 1) / self.max_workers))
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` on a worker and await its result"""
+        if self._pending >= self.capacity:
+            self.rejected += 1
+            retry_after = self.retry_after()
+            logger.warning(f"Inference pool saturated ({self._pending} pending), rejecting request")
+            raise PoolSaturatedError(retry_after)
+
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        future = self._executor.submit(_timed_call, fn, args, kwargs, self._report)
+        # Release the slot when the job really finishes, not when the awaiting
+        # request goes away: a cancelled request still occupies its worker
+        self._pending += 1
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            started, result, report = await asyncio.wrap_future(future)
+        except Exception:
+            self.failed += 1
+            raise
+        finished = time.time()
+        self.completed += 1
+        if report is not None:
+            pid, value = report
+            self.worker_reports[pid] = value
+        self.wait_times.add(max(0.0, started - submitted))
+        self.run_times.add(max(0.0, finished - started))
+        return result
+
+    def _release(self):
+        self._pending -= 1
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self._pending, self.max_workers),
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_ms": self.wait_times.summary(),
+            "run_ms": self.run_times.summary(),
+        }
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,83 @@
+"""
+Image ingestion without extra copies.
+
+- Raw pixel uploads: a 16-byte header followed by the uint8 pixel buffer,
+  wrapped as a numpy view of the request body instead of being decoded.
+- Large multipart uploads: Starlette already spools them to a temporary
+  file; they are memory-mapped from there instead of read into a bytes object.
+"""
+import mmap
+import struct
+
+import cv2
+import numpy as np
+
+# magic, width, height, channels, channel order, 2 bytes padding (little-endian)
+RAW_HEADER = struct.Struct('<4sIIBB2x')
+RAW_MAGIC = b'QRAW'
+RAW_ORDER_BGR = 0
+RAW_ORDER_RGB = 1
+RAW_MAX_PIXELS = 100_000_000
+
+
+def parse_raw_image(buffer):
+    """
+    Wrap a raw pixel upload as an image without copying the pixels.
+
+    Layout: RAW_HEADER (magic b'QRAW', width, height, channels 1/3/4, order
+    0=BGR(A) or 1=RGB(A)) followed by height * width * channels bytes, row-major.
+    BGR inputs stay zero-copy views; grey, RGB(A) and BGRA inputs need one
+    conversion to BGR, the 3-channel layout every engine expects.
+
+    Raises:
+        ValueError: if the header or the buffer size is invalid
+    """
+    if len(buffer) < RAW_HEADER.size:
+        raise ValueError("Raw image is shorter than its header")
+    magic, width, height, channels, order = RAW_HEADER.unpack_from(buffer, 0)
+    if magic != RAW_MAGIC:
+        raise ValueError("Raw image header must start with b'QRAW'")
+    if channels not in (1, 3, 4):
+        raise ValueError(f"Unsupported channel count: {channels}")
+    if order not in (RAW_ORDER_BGR, RAW_ORDER_RGB):
+        raise ValueError(f"Unsupported channel order: {order}")
+    if width == 0 or height == 0 or width * height > RAW_MAX_PIXELS:
+        raise ValueError(f"Invalid image size {width}x{height}")
+    expected = width * height * channels
+    if len(buffer) - RAW_HEADER.size != expected:
+        raise ValueError(f"Expected {expected} pixel bytes for {width}x{height}x{channels}, got {len(buffer) - RAW_HEADER.size}")
+
+    img = np.frombuffer(buffer, dtype=np.uint8, count=expected, offset=RAW_HEADER.size)
+    img = img.reshape((height, width) if channels == 1 else (height, width, channels))
+    if channels == 1:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    elif channels == 3 and order == RAW_ORDER_RGB:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    elif channels == 4:
+        img = cv2.cvtColor(img, cv2.COLOR_RGBA2BGR if order == RAW_ORDER_RGB else cv2.COLOR_BGRA2BGR)
+    return img
+
+
+async def read_upload(upload, mmap_threshold):
+    """
+    Contents of an UploadFile as a buffer: bytes for small uploads, a
+    read-only mmap of the spooled temp file for uploads of `mmap_threshold`
+    bytes or more. Pass the result to `release_buffer` when done.
+    """
+    size = upload.size
+    if mmap_threshold and size is not None and size >= mmap_threshold:
+        spooled = upload.file
+        spooled.flush()
+        # fileno() rolls an in-memory spool over to a real file first
+        return mmap.mmap(spooled.fileno(), 0, access=mmap.ACCESS_READ)
+    return await upload.read()
+
+
+def release_buffer(buffer):
+    """Unmap a buffer from `read_upload`; a no-op for bytes"""
+    if isinstance(buffer, mmap.mmap):
+        try:
+            buffer.close()
+        except BufferError:
+            # A numpy view still points into the mapping; it is unmapped when collected
+            pass
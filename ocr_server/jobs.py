@@ -0,0 +1,372 @@
+"""
+Whole-chapter OCR jobs.
+
+A job OCRs every page of a directory (or of an uploaded batch) in the
+background. Pages flow through a small pipeline: read + decode in a worker
+thread, OCR through the server's inference pool, then the result is appended
+to the job's results.ndjson. Several pages are in flight at once, so decoding
+the next page overlaps inference of the current one.
+
+Everything a job needs is persisted under `<jobs_dir>/<job_id>/`, so a job that
+was cancelled or interrupted by a restart can be resumed and only the pages
+without a result are processed again.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tif', '.tiff'}
+
+# Statuses after which the job task is no longer running
+FINISHED = ('completed', 'failed', 'cancelled', 'interrupted')
+
+
+def _natural_key(name):
+    """Sort '2.png' before '10.png'"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def list_page_files(directory):
+    """Image files directly inside `directory`, in natural name order"""
+    names = [
+        name for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        and os.path.isfile(os.path.join(directory, name))
+    ]
+    return [os.path.join(directory, name) for name in sorted(names, key=_natural_key)]
+
+
+def _read_image(path):
+    # np.fromfile + imdecode instead of cv2.imread so non-ASCII Windows paths work
+    data = np.fromfile(path, dtype=np.uint8)
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+class Job:
+    def __init__(self, job_id, lang, pages, source, job_dir, created=None, status='queued'):
+        self.id = job_id
+        self.lang = lang
+        self.pages = pages
+        self.source = source
+        self.dir = job_dir
+        self.created = created or time.time()
+        self.status = status
+        self.error = None
+        # page index -> result record; only successful pages count as done
+        self.results = {}
+        self.task = None
+        # Set while the task is stopped only to be started again right away
+        self.restarting = False
+        self._subscribers = set()
+        self._write_lock = threading.Lock()
+
+    @property
+    def done(self):
+        return sum(1 for record in self.results.values() if 'error' not in record)
+
+    @property
+    def failed(self):
+        return sum(1 for record in self.results.values() if 'error' in record)
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "lang": self.lang,
+            "source": self.source,
+            "total": len(self.pages),
+            "done": self.done,
+            "failed": self.failed,
+            "created": self.created,
+            "error": self.error,
+        }
+
+    def pending_indexes(self):
+        return [
+            i for i in range(len(self.pages))
+            if i not in self.results or 'error' in self.results[i]
+        ]
+
+    # -- persistence --------------------------------------------------------
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.dir, 'job.json')
+
+    @property
+    def _results_path(self):
+        return os.path.join(self.dir, 'results.ndjson')
+
+    def save_manifest(self):
+        manifest = {
+            "id": self.id,
+            "lang": self.lang,
+            "pages": self.pages,
+            "source": self.source,
+            "created": self.created,
+            "status": self.status,
+            "error": self.error,
+        }
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self._manifest_path)
+
+    def append_result(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._write_lock, open(self._results_path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+    def rewrite_results(self):
+        """Replace results.ndjson with the current results (after re-indexing)"""
+        tmp_path = self._results_path + '.tmp'
+        with self._write_lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for index in sorted(self.results):
+                    f.write(json.dumps(self.results[index], ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self._results_path)
+
+    @classmethod
+    def load(cls, job_dir):
+        with open(os.path.join(job_dir, 'job.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        job = cls(
+            manifest['id'], manifest['lang'], manifest['pages'], manifest['source'],
+            job_dir, created=manifest.get('created'), status=manifest.get('status', 'queued'),
+        )
+        job.error = manifest.get('error')
+        results_path = job._results_path
+        if os.path.exists(results_path):
+            with open(results_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash; that page simply runs again
+                        continue
+                    job.results[record['index']] = record
+        if job.status not in FINISHED:
+            # The server stopped while this job was running
+            job.status = 'interrupted'
+        return job
+
+    # -- event streaming ----------------------------------------------------
+
+    def subscribe(self):
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event):
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+
+class JobManager:
+    """
+    Args:
+        jobs_dir: Where job manifests, results and uploaded pages are stored
+        process_page: `async process_page(img, lang)` returning a JSON-able
+            result dict for one decoded page
+        concurrency: Pages of one job in flight at once
+    """
+
+    def __init__(self, jobs_dir, process_page, concurrency=2):
+        self.jobs_dir = jobs_dir
+        self._process_page = process_page
+        self.concurrency = max(1, concurrency)
+        self.jobs = {}
+
+    def load(self):
+        """Pick up jobs persisted by a previous run of the server"""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        for name in os.listdir(self.jobs_dir):
+            job_dir = os.path.join(self.jobs_dir, name)
+            if not os.path.isfile(os.path.join(job_dir, 'job.json')):
+                continue
+            try:
+                job = Job.load(job_dir)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable job in {job_dir}: {e}")
+                continue
+            self.jobs[job.id] = job
+        if self.jobs:
+            logger.info(f"Loaded {len(self.jobs)} OCR jobs from {self.jobs_dir}")
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def create_for_directory(self, directory, lang):
+        """
+        Job over every image in `directory`. The id is derived from the path and
+        language, so submitting the same chapter again resumes the existing job.
+        If the chapter's pages changed while that job is running, it is stopped
+        and restarted over the new page list.
+        """
+        directory = os.path.abspath(directory)
+        job_id = hashlib.sha1(f"{os.path.normcase(directory)}|{lang}".encode('utf-8')).hexdigest()[:16]
+        job = self.jobs.get(job_id)
+        pages = list_page_files(directory)
+        if job is not None:
+            # Pick up pages added to the chapter since the job was created.
+            # Results are keyed by page index, so re-key them to the new order.
+            if pages != job.pages:
+                # Running page workers hold indexes into the old page list
+                if job.task is not None and not job.task.done():
+                    job.restarting = True
+                    job.task.cancel()
+                    await asyncio.gather(job.task, return_exceptions=True)
+                new_index = {path: i for i, path in enumerate(pages)}
+                results = {}
+                for record in job.results.values():
+                    i = new_index.get(job.pages[record['index']])
+                    if i is not None:
+                        results[i] = dict(record, index=i)
+                job.pages = pages
+                job.results = results
+                job.rewrite_results()
+            job.save_manifest()
+            self.start(job)
+            return job
+        job = Job(job_id, lang, pages, 'directory', os.path.join(self.jobs_dir, job_id))
+        os.makedirs(job.dir, exist_ok=True)
+        job.save_manifest()
+        self.jobs[job.id] = job
+        self.start(job)
+        return job
+
+    async def create_for_uploads(self, files, lang):
+        """Job over uploaded pages, which are saved inside the job directory"""
+        job_id = uuid.uuid4().hex[:16]
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        pages_dir = os.path.join(job_dir, 'pages')
+        os.makedirs(pages_dir, exist_ok=True)
+        pages = []
+        for i, upload in enumerate(files):
+            name = os.path.basename(upload.filename or '') or f"page{i}.png"
+            path = os.path.join(pages_dir, f"{i:04d}_{name}")
+            # Copy from Starlette's spooled temp file without loading it into memory
+            await run_in_threadpool(_copy_upload, upload.file, path)
+            pages.append(path)
+        job = Job(job_id, lang, pages, 'upload', job_dir)
+        job.save_manifest()
+        self.jobs[job.id] = job
+        self.start(job)
+        return job
+
+    def start(self, job):
+        """Run (or resume) a job unless it is already running"""
+        if job.task is not None and not job.task.done():
+            return
+        job.status = 'queued'
+        job.error = None
+        job.save_manifest()
+        job.task = asyncio.get_running_loop().create_task(self._run(job))
+        # A callback rather than `finally` in _run: a task cancelled before it
+        # starts never enters its coroutine, and its streams must still end
+        job.task.add_done_callback(lambda task: self._finished(job, task))
+
+    def cancel(self, job):
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+
+    async def shutdown(self):
+        """Stop running jobs; they stay resumable"""
+        tasks = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job):
+        pending = job.pending_indexes()
+        logger.info(f"Job {job.id}: {len(pending)} of {len(job.pages)} pages to process")
+        job.status = 'running'
+        job.save_manifest()
+        job.publish({"event": "status", **job.summary()})
+
+        queue = asyncio.Queue()
+        for index in pending:
+            queue.put_nowait(index)
+        workers = [
+            asyncio.create_task(self._page_worker(job, queue))
+            for _ in range(min(self.concurrency, len(pending)) or 1)
+        ]
+        try:
+            await asyncio.gather(*workers)
+            job.status = 'completed' if job.failed == 0 else 'failed'
+            if job.failed:
+                job.error = f"{job.failed} pages failed"
+        except asyncio.CancelledError:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            job.status = 'cancelled'
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}", exc_info=True)
+            job.status = 'failed'
+            job.error = str(e)
+
+    def _finished(self, job, task):
+        """Record how the job's task ended and end its event streams"""
+        if task.cancelled():
+            if job.status not in FINISHED:
+                job.status = 'cancelled'
+        elif task.exception() is not None:
+            job.status = 'failed'
+            job.error = str(task.exception())
+        try:
+            job.save_manifest()
+        except OSError as e:
+            logger.error(f"Job {job.id}: could not save its manifest: {e}")
+        if job.restarting:
+            # Subscribers keep listening to the restarted run
+            job.restarting = False
+            return
+        logger.info(f"Job {job.id} {job.status}: {job.done}/{len(job.pages)} pages done")
+        job.publish({"event": "end", **job.summary()})
+
+    async def _page_worker(self, job, queue):
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            path = job.pages[index]
+            record = {"index": index, "page": os.path.basename(path)}
+            started = time.perf_counter()
+            try:
+                img = await run_in_threadpool(_read_image, path)
+                if img is None:
+                    raise ValueError("Invalid or missing image file")
+                record.update(await self._process_page(img, job.lang))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job {job.id}: page {path} failed: {e}")
+                record["error"] = str(e)
+            record["seconds"] = round(time.perf_counter() - started, 3)
+            await run_in_threadpool(job.append_result, record)
+            job.results[index] = record
+            job.publish({"event": "page", "done": job.done, "total": len(job.pages), "result": record})
+
+
+def _copy_upload(source, path):
+    source.seek(0)
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(source, f)
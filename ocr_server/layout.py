@@ -0,0 +1,174 @@
+"""
+Reading order and speech-bubble grouping of recognized lines.
+
+Manga text is mostly vertical and read in columns from right to left, with
+the lines of one speech bubble close together. Given the line polygons, this
+module decides each line's orientation, clusters nearby lines into blocks
+(bubbles), orders the blocks the way the page is read and orders the lines
+inside each block (columns right-to-left for vertical text, rows
+top-to-bottom for horizontal text).
+
+Everything is vectorized with NumPy; a dense page of a few dozen lines takes
+well under a millisecond, so it runs on every request.
+"""
+import numpy as np
+
+# A line is vertical when its height exceeds its width by this factor
+VERTICAL_RATIO = 1.2
+# Lines whose boxes come within this many line-thicknesses of each other
+# belong to the same bubble
+GAP_FACTOR = 0.6
+
+
+def _as_quads(polys, boxes, count):
+    """(N, 4, 2) quads from rec_polys, or from rec_boxes ([x1, y1, x2, y2])"""
+    if polys is not None and len(polys) == count:
+        quads = np.asarray(polys, dtype=np.float32)
+        if quads.shape == (count, 4, 2):
+            return quads
+    if boxes is not None and len(boxes) == count:
+        b = np.asarray(boxes, dtype=np.float32).reshape(count, -1)
+        if b.shape[1] == 4:
+            x1, y1, x2, y2 = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+            return np.stack([
+                np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+                np.stack([x2, y2], 1), np.stack([x1, y2], 1),
+            ], axis=1)
+        if b.shape[1] == 8:
+            return b.reshape(count, 4, 2)
+    return None
+
+
+def _components(adjacent):
+    """Connected-component label per node of a boolean adjacency matrix"""
+    n = adjacent.shape[0]
+    labels = np.arange(n)
+    while True:
+        # Every node takes the smallest label among itself and its neighbours
+        new_labels = np.where(adjacent, labels[None, :], n).min(axis=1)
+        new_labels = np.minimum(new_labels, labels)
+        # Pointer jumping: follow labels of labels to converge in few rounds
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def _bands(primary, lo, hi, group, ascending):
+    """
+    Split lines into bands (columns or rows) within each group.
+
+    Lines are visited in `primary` order inside each group; a line starts a
+    new band when its centre lies beyond every line seen so far in the group
+    (beyond the running min of `lo` when descending, the running max of `hi`
+    when ascending). Returns (visit order, band id per visited line).
+    """
+    order = np.lexsort((primary if ascending else -primary, group))
+    g = group[order]
+    centre = (lo[order] + hi[order]) / 2.0
+    span = float(max(hi.max() - lo.min(), 1.0)) * 4.0
+    # Offset each group so a running min/max never carries across groups
+    if ascending:
+        edge = hi[order] + g * span
+        previous = np.maximum.accumulate(edge)
+        previous = np.concatenate([[-np.inf], previous[:-1]]) - g * span
+        new_band = centre > previous
+    else:
+        edge = lo[order] - g * span
+        previous = np.minimum.accumulate(edge)
+        previous = np.concatenate([[np.inf], previous[:-1]]) + g * span
+        new_band = centre < previous
+    new_band |= np.concatenate([[True], g[1:] != g[:-1]])
+    return order, np.cumsum(new_band)
+
+
+def analyze_layout(count, polys=None, boxes=None):
+    """
+    Group lines into blocks in reading order.
+
+    Args:
+        count: Number of recognized lines
+        polys: (N, 4, 2) line polygons (PaddleOCR rec_polys), or
+        boxes: (N, 4) [x1, y1, x2, y2] line boxes (PaddleOCR rec_boxes)
+
+    Returns:
+        (order, blocks): `order` is the line indexes in reading order;
+        `blocks` is a list of dicts with `lines` (line indexes in order),
+        `orientation` ('vertical' or 'horizontal') and `polygon`
+        (the block's bounding quad, clockwise from top-left).
+    """
+    if count == 0:
+        return np.zeros(0, dtype=np.int64), []
+    quads = _as_quads(polys, boxes, count)
+    if quads is None:
+        # No geometry: keep recognition order as one block
+        return np.arange(count), [{'lines': list(range(count)), 'orientation': 'horizontal', 'polygon': None}]
+
+    x1, y1 = quads[:, :, 0].min(axis=1), quads[:, :, 1].min(axis=1)
+    x2, y2 = quads[:, :, 0].max(axis=1), quads[:, :, 1].max(axis=1)
+    width, height = x2 - x1, y2 - y1
+    vertical = height > width * VERTICAL_RATIO
+
+    # Bubbles: lines whose boxes, grown by a fraction of the typical line
+    # thickness, touch each other
+    gap = GAP_FACTOR * float(np.median(np.minimum(width, height)))
+    ex1, ey1, ex2, ey2 = x1 - gap, y1 - gap, x2 + gap, y2 + gap
+    adjacent = (
+        (ex1[:, None] <= ex2[None, :]) & (ex1[None, :] <= ex2[:, None])
+        & (ey1[:, None] <= ey2[None, :]) & (ey1[None, :] <= ey2[:, None])
+    )
+    _, label = np.unique(_components(adjacent), return_inverse=True)
+    blocks_count = label.max() + 1
+
+    # Per-block geometry and orientation (majority of its lines)
+    bx1 = np.full(blocks_count, np.inf, dtype=np.float32)
+    by1 = np.full(blocks_count, np.inf, dtype=np.float32)
+    bx2 = np.full(blocks_count, -np.inf, dtype=np.float32)
+    by2 = np.full(blocks_count, -np.inf, dtype=np.float32)
+    np.minimum.at(bx1, label, x1)
+    np.minimum.at(by1, label, y1)
+    np.maximum.at(bx2, label, x2)
+    np.maximum.at(by2, label, y2)
+    block_vertical = np.bincount(label, weights=vertical, minlength=blocks_count) * 2 > np.bincount(label, minlength=blocks_count)
+    page_vertical = block_vertical.sum() * 2 >= blocks_count
+
+    # Blocks: top-to-bottom in rows (a block whose top is below every block
+    # above it starts a new row), then right-to-left in a vertical page,
+    # left-to-right otherwise
+    block_x = -(bx1 + bx2) if page_vertical else (bx1 + bx2)
+    block_order, block_row = _bands(by1, by1, by2, np.zeros(blocks_count, dtype=np.int64), ascending=True)
+    rows = np.empty(blocks_count, dtype=np.int64)
+    rows[block_order] = block_row
+    rank = np.empty(blocks_count, dtype=np.int64)
+    rank[np.lexsort((block_x, rows))] = np.arange(blocks_count)
+
+    # Lines: columns right-to-left in vertical blocks, rows top-to-bottom in
+    # horizontal ones; then along the column/row
+    line_rank = rank[label]
+    line_vertical = block_vertical[label]
+    band = np.zeros(count, dtype=np.int64)
+    along = np.where(line_vertical, y1, x1)
+    for is_vertical in (True, False):
+        idx = np.flatnonzero(line_vertical == is_vertical)
+        if idx.size == 0:
+            continue
+        if is_vertical:
+            order, ids = _bands(x2[idx], x1[idx], x2[idx], line_rank[idx], ascending=False)
+        else:
+            order, ids = _bands(y1[idx], y1[idx], y2[idx], line_rank[idx], ascending=True)
+        band[idx[order]] = ids
+    order = np.lexsort((along, band, line_rank))
+
+    blocks = []
+    boundaries = np.flatnonzero(np.diff(line_rank[order])) + 1
+    for members in np.split(order, boundaries):
+        b = label[members[0]]
+        blocks.append({
+            'lines': members.tolist(),
+            'orientation': 'vertical' if block_vertical[b] else 'horizontal',
+            'polygon': [
+                [float(bx1[b]), float(by1[b])], [float(bx2[b]), float(by1[b])],
+                [float(bx2[b]), float(by2[b])], [float(bx1[b]), float(by2[b])],
+            ],
+        })
+    return order, blocks
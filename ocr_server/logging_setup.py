@@ -0,0 +1,125 @@
+"""
+Queue-based logging.
+
+Request handlers only put log records on a queue (QueueHandler); a
+QueueListener thread formats them and does the console/file writes, so a slow
+console never holds up a request. Full OCR results can be sampled, 1 in N, to
+a JSON-lines file through a second queue, serialized on the listener thread.
+"""
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listeners = []
+_sample_logger = logging.getLogger('ocr.results')
+_sample_every = 0
+_sample_counter = itertools.count(1)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including fields passed with `extra=`"""
+
+    def format(self, record):
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _SampleFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=_json_default)
+
+
+class _RawQueueHandler(logging.handlers.QueueHandler):
+    """Queue the record untouched; the payload dict is serialized by the listener"""
+
+    def prepare(self, record):
+        return record
+
+
+def _json_default(value):
+    tolist = getattr(value, 'tolist', None)
+    return tolist() if tolist is not None else str(value)
+
+
+def _start(logger, handlers, queue_handler_class=logging.handlers.QueueHandler):
+    records = queue.SimpleQueue()
+    logger.addHandler(queue_handler_class(records))
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+
+def configure_logging(level='INFO', fmt='text', log_file='', sample_every=0, sample_file=''):
+    """
+    Route the root logger (and uvicorn's, which propagate to it) through a
+    queue. Safe to call more than once; later calls replace the handlers.
+    """
+    global _sample_every
+    stop_logging()
+    formatter = JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(getattr(logging, level, logging.INFO))
+    _start(root, handlers)
+
+    for handler in list(_sample_logger.handlers):
+        _sample_logger.removeHandler(handler)
+    _sample_logger.propagate = False
+    _sample_logger.setLevel(logging.INFO)
+    _sample_every = max(0, sample_every)
+    if _sample_every and sample_file:
+        os.makedirs(os.path.dirname(os.path.abspath(sample_file)), exist_ok=True)
+        sample_handler = logging.FileHandler(sample_file, encoding='utf-8')
+        sample_handler.setFormatter(_SampleFormatter())
+        _start(_sample_logger, [sample_handler], _RawQueueHandler)
+    else:
+        _sample_every = 0
+
+
+def stop_logging():
+    """Flush and stop the listener threads"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+def sample_result(build_payload):
+    """
+    Dump a full OCR result for 1 in OCR_RESULT_SAMPLE_EVERY calls.
+    `build_payload()` returns a JSON-able dict; it is only called for the
+    requests that are sampled.
+    """
+    if not _sample_every or next(_sample_counter) % _sample_every:
+        return
+    payload = build_payload()
+    payload.setdefault('time', round(time.time(), 3))
+    _sample_logger.info(payload)
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,285 @@
+"""
+Prometheus metrics and per-request stage timing.
+
+`MetricsMiddleware` gives every OCR request a `RequestTimer`. Handlers wrap
+their steps in `stage('decode')` etc.; when the response starts, the stage
+durations go out in a `Server-Timing` header and into the histograms, which
+`render()` formats for the /metrics endpoint (Prometheus text format 0.0.4).
+No client library is needed.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PIXEL_BUCKETS = (1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2e6, 4e6, 8e6, 16e6, 32e6)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _render_items(self, items):
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # per-bucket counts (last one is +Inf), sum
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    def _render_items(self, items):
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "ocr_request_seconds", "OCR request latency by endpoint, language and status",
+    ("endpoint", "lang", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "ocr_stage_seconds", "Time spent in each stage of an OCR request",
+    ("endpoint", "lang", "stage"),
+)
+IN_FLIGHT = Gauge("ocr_requests_in_flight", "OCR requests being processed", ("endpoint",))
+IMAGE_PIXELS = Histogram(
+    "ocr_image_pixels", "Decoded image size in pixels (width x height)",
+    ("endpoint",), PIXEL_BUCKETS,
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "ocr_model_load_seconds",
+    "Time it took to load each resident model, per inference process (pool workers with OCR_POOL_KIND=process)",
+    ("model", "worker"),
+)
+
+METRICS = (REQUEST_SECONDS, STAGE_SECONDS, IN_FLIGHT, IMAGE_PIXELS, MODEL_LOAD_SECONDS)
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RequestTimer:
+    """Stage durations of one request, in the order the stages first ran"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.lang = ""
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self):
+        """`Server-Timing` header value, durations in milliseconds"""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def finish(self, status):
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - self.started,
+            endpoint=self.endpoint, lang=self.lang, status=status,
+        )
+        for name, seconds in self.stages.items():
+            STAGE_SECONDS.observe(seconds, endpoint=self.endpoint, lang=self.lang, stage=name)
+
+
+_current = contextvars.ContextVar("ocr_request_timer", default=None)
+
+
+def stage(name):
+    """Time a block as stage `name` of the current request (no-op outside one)"""
+    timer = _current.get()
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def add_elapsed(name):
+    """
+    Record the time since the request started that no stage accounts for yet
+    as stage `name`; called on entering a handler, it measures receiving and
+    parsing the request body.
+    """
+    timer = _current.get()
+    if timer is not None:
+        timer.add(name, max(0.0, time.perf_counter() - timer.started - sum(timer.stages.values())))
+
+
+def add_stages(timings):
+    """Add stage durations measured elsewhere, e.g. inside an inference worker"""
+    timer = _current.get()
+    if timer is not None and timings:
+        for name, seconds in timings.items():
+            timer.add(name, seconds)
+
+
+def set_lang(lang):
+    timer = _current.get()
+    if timer is not None:
+        timer.lang = lang
+
+
+def observe_image(img):
+    timer = _current.get()
+    if timer is not None and img is not None:
+        IMAGE_PIXELS.observe(img.shape[0] * img.shape[1], endpoint=timer.endpoint)
+
+
+@contextmanager
+def track(endpoint):
+    """
+    Time work that isn't an HTTP request, such as one WebSocket job, like a
+    request to `endpoint`. The status is 200, the `status_code` of the
+    exception raised, 499 when cancelled, or 500.
+    """
+    timer = RequestTimer(endpoint)
+    token = _current.set(timer)
+    status = 200
+    IN_FLIGHT.inc(endpoint=endpoint)
+    try:
+        yield timer
+    except asyncio.CancelledError:
+        status = 499
+        raise
+    except Exception as e:
+        status = getattr(e, "status_code", 500)
+        raise
+    finally:
+        IN_FLIGHT.dec(endpoint=endpoint)
+        timer.finish(status)
+        _current.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing requests to `paths`: tracks in-flight requests,
+    records the histograms and adds the `Server-Timing` response header.
+    """
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        timer = RequestTimer(scope["path"])
+        token = _current.set(timer)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timer.server_timing().encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        IN_FLIGHT.inc(endpoint=timer.endpoint)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            IN_FLIGHT.dec(endpoint=timer.endpoint)
+            timer.finish(status)
+            _current.reset(token)
@@ -0,0 +1,133 @@
+"""
+Lazy, thread-safe registry of OCR pipelines.
+
+Building a PaddleOCR pipeline loads the detection, orientation and recognition
+models from disk, which takes seconds. The registry builds each pipeline once
+per key, keeps it warm and hands the same instance to every request.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    """A built model plus the bookkeeping needed for eviction"""
+
+    def __init__(self, model, load_seconds):
+        self.model = model
+        self.load_seconds = load_seconds
+        self.last_used = time.monotonic()
+
+
+class ModelRegistry:
+    """
+    Build models lazily through `factory(key)` and reuse them across requests.
+
+    Args:
+        factory: Callable that builds the model for a key
+        max_models: Keep at most this many models resident (LRU eviction).
+            None or 0 disables the limit.
+        idle_timeout: Evict models not used for this many seconds.
+            None or 0 disables idle eviction.
+        pinned: Keys that are never evicted (e.g. the default language)
+    """
+
+    def __init__(self, factory, max_models=None, idle_timeout=None, pinned=()):
+        self._factory = factory
+        self._max_models = max_models or None
+        self._idle_timeout = idle_timeout or None
+        self._pinned = set(pinned)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per key so two requests for the same model build it once,
+        # while a slow build never blocks lookups of other models
+        self._build_locks = {}
+
+    def get(self, key):
+        """Return the model for `key`, building it on first use"""
+        with self._lock:
+            if self._idle_timeout:
+                self._evict_locked()
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(key)
+                return entry.model
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            # Another thread may have finished building while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.last_used = time.monotonic()
+                    self._entries.move_to_end(key)
+                    return entry.model
+
+            logger.info(f"Building model for {key!r}...")
+            start = time.perf_counter()
+            model = self._factory(key)
+            load_seconds = time.perf_counter() - start
+            logger.info(f"Model for {key!r} ready in {load_seconds:.2f}s")
+
+            with self._lock:
+                self._entries[key] = _Entry(model, load_seconds)
+                self._entries.move_to_end(key)
+                self._evict_locked()
+            return model
+
+    def peek(self, key):
+        """Return the model for `key` if it is already built, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.model if entry is not None else None
+
+    def evict_idle(self):
+        """Drop models idle for longer than `idle_timeout`. Returns evicted keys."""
+        with self._lock:
+            return self._evict_locked()
+
+    def clear(self):
+        """Drop every resident model"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Snapshot of resident models for health/debug endpoints"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "max_models": self._max_models,
+                "idle_timeout": self._idle_timeout,
+                "models": [
+                    {
+                        "key": repr(key),
+                        "load_seconds": round(entry.load_seconds, 3),
+                        "idle_seconds": round(now - entry.last_used, 1),
+                    }
+                    for key, entry in self._entries.items()
+                ],
+            }
+
+    def _evict_locked(self):
+        evicted = []
+        if self._idle_timeout:
+            now = time.monotonic()
+            for key, entry in list(self._entries.items()):
+                if key not in self._pinned and now - entry.last_used > self._idle_timeout:
+                    del self._entries[key]
+                    evicted.append(key)
+        if self._max_models:
+            # Oldest first; pinned models are skipped, never counted as evictable
+            for key in list(self._entries.keys()):
+                if len(self._entries) <= self._max_models:
+                    break
+                if key not in self._pinned:
+                    del self._entries[key]
+                    evicted.append(key)
+        for key in evicted:
+            logger.info(f"Evicted model {key!r}")
+        return evicted
@@ -0,0 +1,348 @@
+"""
+ONNX Runtime engine: PP-OCR models exported to ONNX, run on the CPU.
+
+Selected with OCR_ENGINE=onnx, which makes `pipelines.build_model` build
+these classes instead of PaddleOCR ones. Each stage model is read from
+OCR_ONNX_MODEL_DIR/<model name>/inference.onnx (or inference.int8.onnx with
+OCR_ONNX_INT8), as written by export_onnx.py, and reproduces the matching
+PaddleOCR predictor's pre- and post-processing:
+
+- detection: DB probability map -> quads (unclipped min-area rectangles)
+- recognition: height-48 crops, padded per batch -> greedy CTC decode
+- document / text line orientation: PP-LCNet classifiers
+
+The per-language "pipeline" runs those stage models through the staged
+pipeline, so its results have the PaddleOCR predict() shape the endpoints
+already read.
+"""
+import logging
+import math
+import os
+
+import cv2
+import numpy as np
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# PaddleOCR's defaults for arguments predict() may leave as None
+DET_DEFAULTS = dict(limit_side_len=960, limit_type='max', thresh=0.3, box_thresh=0.6, unclip_ratio=1.5)
+DET_MAX_CANDIDATES = 1000
+DET_MIN_SIZE = 3
+REC_HEIGHT = 48
+REC_MIN_WIDTH = 320
+
+# Fallback labels when the exported inference.yml doesn't list them
+DEFAULT_LABELS = {
+    'doc_ori': ['0', '90', '180', '270'],
+    'textline_ori': ['0_degree', '180_degree'],
+}
+
+
+def model_path(model_name, int8=None):
+    """The .onnx file for `model_name`, preferring the int8 variant with OCR_ONNX_INT8"""
+    int8 = settings.ONNX_INT8 if int8 is None else int8
+    directory = os.path.join(settings.ONNX_MODEL_DIR, model_name)
+    names = ('inference.int8.onnx', 'inference.onnx') if int8 else ('inference.onnx',)
+    for name in names:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            if int8 and name == 'inference.onnx':
+                logger.warning(f"No int8 model for {model_name}, using float32")
+            return path
+    raise FileNotFoundError(
+        f"No ONNX model for {model_name} in {directory}; export it with "
+        f"'python export_onnx.py {model_name}'{' --int8' if int8 else ''}"
+    )
+
+
+def _session(path):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if settings.THREADS > 0:
+        options.intra_op_num_threads = settings.THREADS
+        options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+
+def _post_process_config(path):
+    """PostProcess section of the inference.yml exported next to the model, or {}"""
+    config_path = os.path.join(os.path.dirname(path), 'inference.yml')
+    if not os.path.exists(config_path):
+        return {}
+    import yaml
+
+    with open(config_path, encoding='utf-8') as f:
+        return (yaml.safe_load(f) or {}).get('PostProcess') or {}
+
+
+class _OnnxModel:
+    def __init__(self, model_name, path=None):
+        self.model_name = model_name
+        self.path = path or model_path(model_name)
+        self.session = _session(self.path)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+# -- detection -----------------------------------------------------------------
+
+
+def _det_resize(img, limit_side_len, limit_type):
+    """Resize so the limited side fits and both sides are multiples of 32; returns (image, (ratio_h, ratio_w))"""
+    h, w = img.shape[:2]
+    if limit_type == 'max':
+        ratio = limit_side_len / float(max(h, w)) if max(h, w) > limit_side_len else 1.0
+    elif limit_type == 'min':
+        ratio = limit_side_len / float(min(h, w)) if min(h, w) < limit_side_len else 1.0
+    else:
+        ratio = limit_side_len / float(max(h, w))
+    resize_h = max(int(round(h * ratio / 32) * 32), 32)
+    resize_w = max(int(round(w * ratio / 32) * 32), 32)
+    img = cv2.resize(img, (resize_w, resize_h))
+    return img, (resize_h / float(h), resize_w / float(w))
+
+
+def _normalize(img, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+    """HWC uint8 -> CHW float32, scaled to [0, 1] then standardized per channel"""
+    img = (img.astype(np.float32) / 255.0 - mean) / std
+    return img.transpose(2, 0, 1)
+
+
+def _mini_box(points):
+    """Min-area rectangle of `points` ordered top-left, top-right, bottom-right, bottom-left, and its shorter side"""
+    rect = cv2.minAreaRect(points)
+    box = sorted(cv2.boxPoints(rect).tolist(), key=lambda p: p[0])
+    left = sorted(box[:2], key=lambda p: p[1])
+    right = sorted(box[2:], key=lambda p: p[1])
+    ordered = np.array([left[0], right[0], right[1], left[1]], dtype=np.float32)
+    return ordered, min(rect[1])
+
+
+def _box_score(prob, box):
+    """Mean probability inside the quad (PaddleOCR's 'fast' score mode)"""
+    h, w = prob.shape
+    xmin = int(np.clip(np.floor(box[:, 0].min()), 0, w - 1))
+    xmax = int(np.clip(np.ceil(box[:, 0].max()), 0, w - 1))
+    ymin = int(np.clip(np.floor(box[:, 1].min()), 0, h - 1))
+    ymax = int(np.clip(np.ceil(box[:, 1].max()), 0, h - 1))
+    mask = np.zeros((ymax - ymin + 1, xmax - xmin + 1), dtype=np.uint8)
+    shifted = box - np.array([xmin, ymin], dtype=np.float32)
+    cv2.fillPoly(mask, shifted.reshape(1, -1, 2).astype(np.int32), 1)
+    return cv2.mean(prob[ymin:ymax + 1, xmin:xmax + 1], mask)[0]
+
+
+def _unclip(box, unclip_ratio):
+    """
+    Grow the quad outwards by area * ratio / perimeter on every side. For a
+    rectangle this is the min-area rectangle of PaddleOCR's rounded
+    pyclipper offset, without needing pyclipper.
+    """
+    area = cv2.contourArea(box)
+    perimeter = cv2.arcLength(box, True)
+    if perimeter == 0:
+        return box
+    distance = area * unclip_ratio / perimeter
+    (cx, cy), (w, h), angle = cv2.minAreaRect(box)
+    return cv2.boxPoints(((cx, cy), (w + 2 * distance, h + 2 * distance), angle))
+
+
+def db_postprocess(prob, src_shape, thresh, box_thresh, unclip_ratio):
+    """DB probability map (H, W) -> quads (N, 4, 2) in source pixels and their scores"""
+    src_h, src_w = src_shape
+    h, w = prob.shape
+    bitmap = (prob > thresh).astype(np.uint8)
+    contours, _ = cv2.findContours(bitmap, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    polys, scores = [], []
+    for contour in contours[:DET_MAX_CANDIDATES]:
+        box, side = _mini_box(contour.reshape(-1, 2).astype(np.float32))
+        if side < DET_MIN_SIZE:
+            continue
+        score = _box_score(prob, box)
+        if score < box_thresh:
+            continue
+        box, side = _mini_box(_unclip(box, unclip_ratio))
+        if side < DET_MIN_SIZE + 2:
+            continue
+        box[:, 0] = np.clip(np.round(box[:, 0] / w * src_w), 0, src_w)
+        box[:, 1] = np.clip(np.round(box[:, 1] / h * src_h), 0, src_h)
+        polys.append(box)
+        scores.append(float(score))
+    return np.array(polys, dtype=np.float32).reshape(-1, 4, 2), scores
+
+
+class OnnxTextDetection(_OnnxModel):
+    """Mimics `paddleocr.TextDetection` for DB detectors"""
+
+    def predict(self, img, limit_side_len=None, limit_type=None, thresh=None, box_thresh=None, unclip_ratio=None, **params):
+        limit_side_len = limit_side_len or DET_DEFAULTS['limit_side_len']
+        limit_type = limit_type or DET_DEFAULTS['limit_type']
+        resized, _ = _det_resize(img, limit_side_len, limit_type)
+        prob = self._run(_normalize(resized)[None])[0, 0]
+        polys, scores = db_postprocess(
+            prob, img.shape[:2],
+            DET_DEFAULTS['thresh'] if thresh is None else thresh,
+            DET_DEFAULTS['box_thresh'] if box_thresh is None else box_thresh,
+            DET_DEFAULTS['unclip_ratio'] if unclip_ratio is None else unclip_ratio,
+        )
+        return [{'dt_polys': polys, 'dt_scores': scores}]
+
+
+# -- recognition ---------------------------------------------------------------
+
+
+def load_characters(path):
+    """CTC label list: blank, the model's dictionary, then space (as PaddleOCR appends it)"""
+    directory = os.path.dirname(path)
+    characters_path = os.path.join(directory, 'characters.txt')
+    if os.path.exists(characters_path):
+        with open(characters_path, encoding='utf-8') as f:
+            characters = [line.rstrip('\r\n') for line in f]
+    else:
+        characters = list(_post_process_config(path).get('character_dict') or [])
+    if not characters:
+        raise FileNotFoundError(f"No character dictionary (characters.txt or inference.yml) next to {path}")
+    return ['blank'] + characters + [' ']
+
+
+def ctc_decode(probs, characters):
+    """Greedy CTC over (N, T, C) probabilities; returns (texts, scores)"""
+    indexes = probs.argmax(axis=2)
+    confidences = probs.max(axis=2)
+    texts, scores = [], []
+    for index, confidence in zip(indexes, confidences):
+        keep = np.ones(len(index), dtype=bool)
+        keep[1:] = index[1:] != index[:-1]
+        keep &= index != 0
+        keep &= index < len(characters)
+        texts.append(''.join(characters[i] for i in index[keep]))
+        scores.append(float(confidence[keep].mean()) if keep.any() else 0.0)
+    return texts, scores
+
+
+def _rec_batch(crops):
+    """Resize to height 48 keeping aspect, normalize to [-1, 1] and right-pad to the widest"""
+    max_ratio = max([REC_MIN_WIDTH / REC_HEIGHT] + [crop.shape[1] / float(max(1, crop.shape[0])) for crop in crops])
+    batch_width = int(math.ceil(REC_HEIGHT * max_ratio))
+    batch = np.zeros((len(crops), 3, REC_HEIGHT, batch_width), dtype=np.float32)
+    for i, crop in enumerate(crops):
+        h, w = crop.shape[:2]
+        width = min(batch_width, int(math.ceil(REC_HEIGHT * w / float(max(1, h)))))
+        resized = cv2.resize(crop, (max(1, width), REC_HEIGHT)).astype(np.float32)
+        batch[i, :, :, :resized.shape[1]] = (resized.transpose(2, 0, 1) / 255.0 - 0.5) / 0.5
+    return batch
+
+
+class OnnxTextRecognition(_OnnxModel):
+    """Mimics `paddleocr.TextRecognition` for CTC recognizers"""
+
+    def __init__(self, model_name, path=None):
+        super().__init__(model_name, path)
+        self.characters = load_characters(self.path)
+
+    def predict(self, crops, batch_size=1, **params):
+        if not isinstance(crops, list):
+            crops = [crops]
+        results = [None] * len(crops)
+        # Similar widths batch together, so little of each batch is padding
+        order = sorted(range(len(crops)), key=lambda i: crops[i].shape[1] / float(max(1, crops[i].shape[0])))
+        batch_size = max(1, batch_size or 1)
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            probs = self._run(_rec_batch([crops[i] for i in chunk]))
+            texts, scores = ctc_decode(probs, self.characters)
+            for i, text, score in zip(chunk, texts, scores):
+                results[i] = {'rec_text': text, 'rec_score': score}
+        return results
+
+
+# -- orientation ---------------------------------------------------------------
+
+
+class _OnnxClassifier(_OnnxModel):
+    stage = None
+
+    def __init__(self, model_name, path=None):
+        super().__init__(model_name, path)
+        topk = _post_process_config(self.path).get('Topk') or {}
+        self.labels = list(topk.get('label_list') or DEFAULT_LABELS[self.stage])
+
+    def _prepare(self, img):
+        raise NotImplementedError
+
+    def predict(self, images, batch_size=1, **params):
+        if not isinstance(images, list):
+            images = [images]
+        results = []
+        batch_size = max(1, batch_size or 1)
+        for start in range(0, len(images), batch_size):
+            batch = np.stack([self._prepare(img) for img in images[start:start + batch_size]])
+            for scores in self._run(batch):
+                results.append({'label_names': [self.labels[int(np.argmax(scores))]]})
+        return results
+
+
+class OnnxDocOrientation(_OnnxClassifier):
+    """Mimics `paddleocr.DocImgOrientationClassification`: short side to 256, centre 224 crop"""
+    stage = 'doc_ori'
+
+    def _prepare(self, img):
+        h, w = img.shape[:2]
+        scale = 256.0 / min(h, w)
+        img = cv2.resize(img, (max(224, round(w * scale)), max(224, round(h * scale))))
+        h, w = img.shape[:2]
+        top, left = (h - 224) // 2, (w - 224) // 2
+        img = cv2.cvtColor(img[top:top + 224, left:left + 224], cv2.COLOR_BGR2RGB)
+        return _normalize(img)
+
+
+class OnnxTextlineOrientation(_OnnxClassifier):
+    """Mimics `paddleocr.TextLineOrientationClassification`: lines resized to 160 x 80"""
+    stage = 'textline_ori'
+
+    def _prepare(self, img):
+        return _normalize(cv2.cvtColor(cv2.resize(img, (160, 80)), cv2.COLOR_BGR2RGB))
+
+
+STAGE_CLASSES = {
+    'det': OnnxTextDetection,
+    'doc_ori': OnnxDocOrientation,
+    'textline_ori': OnnxTextlineOrientation,
+    'rec': OnnxTextRecognition,
+}
+
+
+class OnnxOCR:
+    """
+    Mimics `PaddleOCR(...).predict()` for one language by running the ONNX
+    stage models through the staged pipeline.
+
+    Args:
+        get_model: `get_model(stage, model_name=None)` returning a stage
+            model; defaults to the shared registry, so languages share the
+            detection and orientation sessions
+    """
+
+    def __init__(self, lang='japan', get_model=None, **config):
+        from staged_pipeline import StagedPipeline
+
+        if get_model is None:
+            from pipelines import get_stage_model as get_model
+        self.lang = lang
+        # Constructor thresholds and switches are defaults that predict() overrides
+        self.defaults = {key: value for key, value in config.items() if key.startswith(('text_', 'use_'))}
+        self._staged = StagedPipeline(get_model)
+
+    def predict(self, input, **params):
+        images = input if isinstance(input, list) else [input]
+        params = dict(self.defaults, **params)
+        return [self._staged.run(img, [self.lang], params=params) for img in images]
+
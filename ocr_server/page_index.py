@@ -0,0 +1,183 @@
+"""
+Detected text lines of recently seen pages, for /ocr-page.
+
+Nudging or resizing an overlay box re-sends the same page with new box
+geometry, but the text on the page has not changed. The lines detected on a
+page the first time are kept here, keyed by a hash of the page and the
+detection settings, in a uniform grid. A box then looks up the lines it
+overlaps and only those are recognized. Readings are kept per line and
+recognition model, so a box whose lines were all read before needs no
+inference at all.
+"""
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from geometry import order_quad, quad_bounds
+from result_cache import make_key
+
+
+class LineGrid:
+    """
+    Uniform grid over text line quads: each cell lists the lines whose
+    bounding boxes touch it, so a box query only tests nearby lines.
+
+    Args:
+        polys: Line quads (N, 4, 2) in page pixels
+        cell: Grid cell size in pixels
+    """
+
+    def __init__(self, polys, cell=128):
+        self.polys = np.asarray(polys, dtype=np.float32).reshape(-1, 4, 2)
+        self.bounds = quad_bounds(self.polys)
+        self.cell = max(1, int(cell))
+        self._cells = {}
+        for i, (x0, y0, x1, y1) in enumerate(self.bounds):
+            for cx in range(int(x0 // self.cell), int(x1 // self.cell) + 1):
+                for cy in range(int(y0 // self.cell), int(y1 // self.cell) + 1):
+                    self._cells.setdefault((cx, cy), []).append(i)
+        # Area the lines cover; queries are clamped to it so a huge box costs
+        # no more than the page
+        if len(self.bounds):
+            self._extent = (*self.bounds[:, :2].min(axis=0), *self.bounds[:, 2:].max(axis=0))
+        else:
+            self._extent = None
+        # Clockwise quads and their areas for the exact overlap test
+        self._quads = [order_quad(poly) for poly in self.polys]
+        self._areas = [max(float(cv2.contourArea(quad)), 1e-6) for quad in self._quads]
+
+    def __len__(self):
+        return len(self.polys)
+
+    def candidates(self, x0, y0, x1, y1):
+        """Lines whose bounding boxes intersect the rectangle, in index order"""
+        if self._extent is None or not np.all(np.isfinite((x0, y0, x1, y1))):
+            return []
+        ex0, ey0, ex1, ey1 = self._extent
+        x0, y0 = max(x0, ex0), max(y0, ey0)
+        x1, y1 = min(x1, ex1), min(y1, ey1)
+        if x0 > x1 or y0 > y1:
+            return []
+        found = set()
+        for cx in range(int(x0 // self.cell), int(x1 // self.cell) + 1):
+            for cy in range(int(y0 // self.cell), int(y1 // self.cell) + 1):
+                found.update(self._cells.get((cx, cy), ()))
+        bounds = self.bounds
+        return [
+            i for i in sorted(found)
+            if bounds[i, 0] <= x1 and bounds[i, 2] >= x0 and bounds[i, 1] <= y1 and bounds[i, 3] >= y0
+        ]
+
+    def query(self, polygon, min_overlap=0.5):
+        """
+        Lines with at least `min_overlap` of their area inside `polygon`, a
+        (possibly rotated) box given as 4 page points
+        """
+        box = order_quad(polygon)
+        x0, y0 = box.min(axis=0)
+        x1, y1 = box.max(axis=0)
+        lines = []
+        for i in self.candidates(x0, y0, x1, y1):
+            area, _ = cv2.intersectConvexConvex(self._quads[i], box)
+            if area / self._areas[i] >= min_overlap:
+                lines.append(i)
+        return lines
+
+
+class PageEntry:
+    """The lines of one page and the readings made of them so far"""
+
+    def __init__(self, polys, cell=128):
+        self.grid = LineGrid(polys, cell)
+        # Recognition model name -> {line index: (text, score)}
+        self.readings = {}
+
+    @property
+    def polys(self):
+        return self.grid.polys
+
+    def unread(self, lines, model_name):
+        """The lines among `lines` not read with `model_name` yet"""
+        read = self.readings.get(model_name, {})
+        return [i for i in lines if i not in read]
+
+    def store(self, model_name, lines, texts, scores):
+        readings = self.readings.setdefault(model_name, {})
+        for i, text, score in zip(lines, texts, scores):
+            readings[i] = (text, float(score))
+
+    def read(self, model_name, lines):
+        """(line index, text, score) of read lines among `lines`"""
+        readings = self.readings.get(model_name, {})
+        return [(i,) + readings[i] for i in lines if i in readings]
+
+
+class PageIndex:
+    """
+    LRU of PageEntry by page hash.
+
+    Args:
+        max_pages: Pages kept; the least recently used is dropped first
+        cell: Grid cell size in pixels for new entries
+    """
+
+    def __init__(self, max_pages=32, cell=128):
+        self.max_pages = max(1, max_pages)
+        self.cell = cell
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lines_recognized = 0
+        self.lines_reused = 0
+
+    @staticmethod
+    def key(data, params):
+        """Key for page bytes (or any buffer) + detection settings"""
+        return make_key(data, 'page-index', params)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, polys):
+        """
+        Index a page's detected lines and return its entry. A page indexed
+        meanwhile by a concurrent request keeps its entry and readings.
+        """
+        entry = PageEntry(polys, self.cell)
+        with self._lock:
+            entry = self._pages.setdefault(key, entry)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+                self.evictions += 1
+            return entry
+
+    def count_lines(self, recognized, reused):
+        with self._lock:
+            self.lines_recognized += recognized
+            self.lines_reused += reused
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "pages": len(self._pages),
+                "max_pages": self.max_pages,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "lines_recognized": self.lines_recognized,
+                "lines_reused": self.lines_reused,
+            }
@@ -0,0 +1,233 @@
+"""
+PaddleOCR pipeline configuration and the shared model registry.
+
+Every endpoint gets its pipeline from `registry` so each language is loaded
+once per process and reused across requests. Besides the full per-language
+pipelines, the registry also holds the individual stage models (detection,
+orientation, recognition) used by the staged multi-language pipeline.
+"""
+import logging
+import time
+
+import numpy as np
+
+import settings
+from model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANG = 'japan'
+
+# Constructor arguments per language pipeline
+PIPELINE_CONFIGS = {
+    'japan': dict(
+        use_textline_orientation=True,  # Enable angle classification for vertical text (replaces use_angle_cls)
+        use_doc_orientation_classify=True,  # Enable document orientation classification
+        use_doc_unwarping=False,  # Disable document unwarping for manga
+        lang='japan',  # Japanese language model
+        # Note: Detection parameters like text_det_limit_side_len are passed to predict() method
+    ),
+    'ch': dict(
+        use_textline_orientation=True,  # Enable angle classification for vertical text
+        use_doc_orientation_classify=True,  # Enable document orientation classification
+        use_doc_unwarping=False,  # Disable document unwarping for manga
+        lang='ch',  # Chinese language model
+        # Improved detection parameters for better accuracy
+        text_det_thresh=0.3,  # Lower threshold for better detection
+        text_det_box_thresh=0.5,  # Lower box threshold
+        text_rec_score_thresh=0.3,  # Very low recognition threshold to catch all text
+    ),
+}
+
+# Arguments passed to predict() by both OCR endpoints
+PREDICT_PARAMS = dict(
+    use_textline_orientation=True,
+    use_doc_orientation_classify=True,
+    text_det_thresh=0.3,  # Lower threshold for better detection
+    text_det_box_thresh=0.5,  # Lower box threshold
+    text_rec_score_thresh=0.3,  # Very low recognition threshold to catch all text (was 0.5)
+    text_det_limit_side_len=10000,  # Increase max side limit for large images (was 4000 default)
+    text_det_limit_type='max',  # Use max side instead of min
+    text_det_unclip_ratio=1.8,  # Increase unclip ratio for better text detection
+)
+
+
+# Stage models shared by every language in the staged pipeline. These are the
+# PaddleOCR 3.x defaults the full pipelines above use.
+STAGE_MODELS = {
+    'det': settings.env_str("OCR_DET_MODEL", 'PP-OCRv5_server_det'),
+    'doc_ori': settings.env_str("OCR_DOC_ORI_MODEL", 'PP-LCNet_x1_0_doc_ori'),
+    'textline_ori': settings.env_str("OCR_TEXTLINE_ORI_MODEL", 'PP-LCNet_x1_0_textline_ori'),
+}
+
+# Recognition model per language. PP-OCRv5 covers Chinese and Japanese with
+# one model; languages that resolve to the same model are recognized once.
+REC_MODELS = {
+    'ch': settings.env_str("OCR_REC_MODEL_CH", 'PP-OCRv5_server_rec'),
+    'japan': settings.env_str("OCR_REC_MODEL_JAPAN", 'PP-OCRv5_server_rec'),
+}
+
+
+def _runtime_args():
+    """Constructor arguments that affect speed but not results (kept out of the cache key)"""
+    return {'cpu_threads': settings.THREADS} if settings.THREADS > 0 else {}
+
+
+def engine_name():
+    """The engine results come from, e.g. 'paddle' or 'onnx-int8'"""
+    if settings.ENGINE == 'onnx' and settings.ONNX_INT8:
+        return 'onnx-int8'
+    return settings.ENGINE
+
+
+def build_pipeline(lang):
+    """Construct the PaddleOCR pipeline for a language key"""
+    if lang not in PIPELINE_CONFIGS:
+        raise ValueError(f"Unsupported OCR language: {lang}")
+    from paddleocr import PaddleOCR
+    return PaddleOCR(**PIPELINE_CONFIGS[lang], **_runtime_args())
+
+
+def _build_engine_model(key, pipeline_class, stage_classes):
+    """
+    build_model for the non-Paddle engines: a language key builds
+    `pipeline_class` with the language's pipeline config, a (stage,
+    model_name) key the engine's class for that stage
+    """
+    if isinstance(key, str):
+        if key not in PIPELINE_CONFIGS:
+            raise ValueError(f"Unsupported OCR language: {key}")
+        return pipeline_class(**PIPELINE_CONFIGS[key])
+    stage, model_name = key
+    if stage not in stage_classes:
+        raise ValueError(f"Unknown model stage: {stage}")
+    return stage_classes[stage](model_name=model_name)
+
+
+def build_model(key):
+    """
+    Registry factory. A language string builds the full pipeline; a
+    (stage, model_name) tuple builds a single stage model.
+    """
+    if settings.ENGINE == 'fake':
+        from benchmarks.fake_engine import STAGE_CLASSES, FakeOCR
+        return _build_engine_model(key, FakeOCR, STAGE_CLASSES)
+    if settings.ENGINE == 'onnx':
+        from onnx_engine import STAGE_CLASSES, OnnxOCR
+        return _build_engine_model(key, OnnxOCR, STAGE_CLASSES)
+    if isinstance(key, str):
+        return build_pipeline(key)
+    stage, model_name = key
+    if stage == 'det':
+        from paddleocr import TextDetection
+        return TextDetection(model_name=model_name, **_runtime_args())
+    if stage == 'doc_ori':
+        from paddleocr import DocImgOrientationClassification
+        return DocImgOrientationClassification(model_name=model_name, **_runtime_args())
+    if stage == 'textline_ori':
+        from paddleocr import TextLineOrientationClassification
+        return TextLineOrientationClassification(model_name=model_name, **_runtime_args())
+    if stage == 'rec':
+        from paddleocr import TextRecognition
+        return TextRecognition(model_name=model_name, **_runtime_args())
+    raise ValueError(f"Unknown model stage: {stage}")
+
+
+registry = ModelRegistry(
+    build_model,
+    max_models=settings.MAX_MODELS,
+    idle_timeout=settings.MODEL_IDLE_TIMEOUT,
+    pinned=(DEFAULT_LANG,),
+)
+
+
+def registry_stats():
+    """`registry.stats()` as a module-level function, for process pool reports"""
+    return registry.stats()
+
+
+def get_pipeline(lang):
+    """Return the warm pipeline for `lang`, loading it on first use"""
+    return registry.get(lang)
+
+
+def get_stage_model(stage, model_name=None):
+    """Return a warm stage model ('det', 'doc_ori', 'textline_ori' or 'rec')"""
+    return registry.get((stage, model_name or STAGE_MODELS[stage]))
+
+
+# Keys the endpoints read from a predict() result. The full OCRResult also
+# carries the input image and intermediate maps, which are costly to pickle
+# back from a process worker.
+_RESULT_KEYS = ('rec_texts', 'rec_scores', 'rec_boxes', 'rec_polys')
+
+
+def run_predict(lang, image, params=None):
+    """
+    Run the `lang` pipeline on an image (or list of images) and return one
+    plain dict per image. Module-level so inference pools can pickle it.
+    """
+    pipeline = get_pipeline(lang)
+    result = pipeline.predict(image, **(params if params is not None else PREDICT_PARAMS))
+    if result is None:
+        return None
+    return [
+        {key: page_result[key] for key in _RESULT_KEYS if key in page_result}
+        if isinstance(page_result, dict) else page_result
+        for page_result in result
+    ]
+
+
+def warmup_image():
+    """Small white image with one dark bar, enough to exercise every stage"""
+    img = np.full((64, 256, 3), 255, dtype=np.uint8)
+    img[24:40, 32:224] = 0
+    return img
+
+
+def preload_langs():
+    """Languages OCR_PRELOAD asks to load at startup"""
+    value = settings.PRELOAD.strip().lower()
+    if value in ("", "none"):
+        return []
+    langs = [lang.strip() for lang in value.split(",") if lang.strip()]
+    unknown = [lang for lang in langs if lang not in PIPELINE_CONFIGS]
+    if unknown:
+        logger.warning(f"Ignoring unknown languages in OCR_PRELOAD: {', '.join(unknown)}")
+    return [lang for lang in langs if lang in PIPELINE_CONFIGS]
+
+
+def warm_up(langs, predict=True):
+    """
+    Load the pipelines for `langs` and, with `predict`, run each once on a
+    tiny image so the first real request doesn't pay for graph set-up. The
+    stage models the settings put in use are warmed too (see
+    staged_pipeline.warm_up_stages). Returns the seconds spent per language
+    and stage model. Module-level so inference pools can pickle it.
+    """
+    from staged_pipeline import warm_up_stages
+
+    seconds = {}
+    for lang in langs:
+        start = time.perf_counter()
+        if predict:
+            run_predict(lang, warmup_image())
+        else:
+            get_pipeline(lang)
+        seconds[lang] = round(time.perf_counter() - start, 3)
+    if langs:
+        seconds.update(warm_up_stages(langs, predict))
+    return seconds
+
+
+def warm_worker():
+    """
+    Process pool initializer: every worker process loads and warms the
+    preloaded languages before it takes its first job, so no request runs
+    on a cold worker, including workers the executor starts later.
+    """
+    try:
+        warm_up(preload_langs(), settings.WARMUP)
+    except Exception as e:
+        # Models then load on first use; the startup warm-up run reports the error
+        logger.error(f"Warm-up of inference worker failed: {e}")
@@ -0,0 +1,132 @@
+"""
+Content-addressed cache of OCR responses.
+
+Keys are a SHA-256 of the uploaded bytes combined with the language and the
+predict parameters, so re-running OCR on the same crop with the same settings
+returns the stored response instead of running inference again. An in-memory
+LRU tier answers repeats within a session; an optional SQLite tier survives
+server restarts.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(data, lang, params):
+    """Cache key for image bytes (or any buffer) + language + predict parameters"""
+    digest = hashlib.sha256(data).hexdigest()
+    params_json = json.dumps(params, sort_keys=True, default=str)
+    params_digest = hashlib.sha256(f"{lang}|{params_json}".encode("utf-8")).hexdigest()[:16]
+    return f"{digest}:{params_digest}"
+
+
+class ResultCache:
+    """
+    Args:
+        max_entries: Size of the in-memory LRU tier
+        db_path: SQLite file for the persistent tier, or None to disable it
+        max_disk_entries: Rows kept in the SQLite tier (least recently used
+            rows are deleted first)
+    """
+
+    def __init__(self, max_entries=256, db_path=None, max_disk_entries=10000):
+        self.max_entries = max(1, max_entries)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions_memory = 0
+        self.evictions_disk = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used)")
+            self._db.commit()
+            logger.info(f"OCR result cache persisted to {db_path}")
+
+    def lookup(self, data, lang, params):
+        """Hash `data` and look it up. Returns (key, cached value or None)."""
+        key = make_key(data, lang, params)
+        return key, self.get(key)
+
+    def get(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return value
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    value = json.loads(row[0])
+                    self._put_memory_locked(key, value)
+                    self.hits_disk += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._put_memory_locked(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, last_used) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), time.time()),
+                )
+                count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                overflow = count - self.max_disk_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM results WHERE key IN "
+                        "(SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.evictions_disk += overflow
+                self._db.commit()
+
+    def _put_memory_locked(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions_memory += 1
+
+    def stats(self):
+        with self._lock:
+            disk_entries = None
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk_entries": disk_entries,
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 3) if lookups else 0.0,
+                "evictions_memory": self.evictions_memory,
+                "evictions_disk": self.evictions_disk,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
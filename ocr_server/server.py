@@ -1,100 +1,544 @@
 """
 PaddleOCR FastAPI Server for Japanese/Chinese Text Recognition
 """
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from paddleocr import PaddleOCR
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import cv2
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
+import asyncio
+import base64
+import binascii
 import io
+import json
 import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
-# Configure logging - ensure logs are visible in console
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # Output to console
-    ]
+import metrics
+import settings
+from batching import MicroBatcher
+from geometry import box_affine, box_polygon, crop_box, crop_to_page
+from inference_pool import InferencePool, PoolSaturatedError
+from ingest import parse_raw_image, read_upload, release_buffer
+from jobs import JobManager
+from layout import analyze_layout
+from logging_setup import configure_logging, sample_result
+from page_index import PageIndex
+from pipelines import (
+    DEFAULT_LANG, PIPELINE_CONFIGS, PREDICT_PARAMS, REC_MODELS, STAGE_MODELS,
+    engine_name, preload_langs, registry, registry_stats, run_predict, warm_up, warm_worker,
 )
-logger = logging.getLogger(__name__)
+from result_cache import ResultCache
+from sessions import OcrSession, SessionFullError
+from staged_pipeline import MODES, STAGES, detect_page, empty_result, plan_crop, read_quads, run_staged
+from stats import RollingWindow, ThroughputMeter
+
+# 'full': PaddleOCR pipeline at full resolution; 'adaptive': detect on a
+# downscaled copy, recognize full-resolution crops
+DET_MODES = ('full', 'adaptive')
+# Bumped when the response shape changes so persisted cache entries are not reused
+RESPONSE_VERSION = 3
 
-# Also use print for critical messages to ensure visibility
-def log_and_print(message, level='info'):
-    """Log and print message to ensure visibility"""
-    if level == 'info':
-        logger.info(message)
-        print(f"[INFO] {message}")
-    elif level == 'warning':
-        logger.warning(message)
-        print(f"[WARNING] {message}")
-    elif level == 'error':
-        logger.error(message)
-        print(f"[ERROR] {message}")
+# Logging goes through a queue to a background writer thread (see logging_setup)
+configure_logging(
+    level=settings.LOG_LEVEL,
+    fmt=settings.LOG_FORMAT,
+    log_file=settings.LOG_FILE,
+    sample_every=settings.RESULT_SAMPLE_EVERY,
+    sample_file=settings.RESULT_SAMPLE_FILE,
+)
+logger = logging.getLogger(__name__)
 
 
 def _preprocess_image(img):
     """
-    Preprocess image to improve OCR accuracy:
-    - Resize if too small
-    - Enhance contrast and sharpness
-    - Denoise
-    - Apply CLAHE for better text visibility
+    Upscale extremely small images (shorter side below OCR_PREPROCESS_MIN_SIDE)
+    so the detector has enough pixels to work with. Larger images are returned
+    untouched; enhancement is skipped because it loses detail on manga scans.
+    Single OpenCV pass on the BGR image, no colour or PIL round trips.
     """
     try:
-        # Convert BGR to RGB if needed
-        if len(img.shape) == 3 and img.shape[2] == 3:
-            # Check if it's BGR (OpenCV default)
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        else:
-            img_rgb = img
-        
-        # Convert to PIL for enhancement
-        pil_img = Image.fromarray(img_rgb)
-        
-        # Don't resize - let PaddleOCR handle image size with its internal limits
-        # Resizing can lose detail and reduce OCR accuracy
-        width, height = pil_img.size
-        min_size = 100  # Only resize if extremely small
-        
-        # Only resize if extremely small (less than 100px)
-        if min(width, height) < min_size:
-            scale = min_size / min(width, height)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            pil_img = pil_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            logger.info(f"Resized very small image from {width}x{height} to {new_width}x{new_height}")
-        else:
-            logger.info(f"Keeping original image size {width}x{height} for maximum quality")
-        
-        # Minimal enhancement - avoid over-processing that can lose detail
-        # Only enhance if image quality is poor
-        # Skip enhancement for good quality images to preserve detail
-        
-        # Convert back to numpy array
-        img_processed = np.array(pil_img)
-        
-        # Convert RGB back to BGR for OpenCV
-        if len(img_processed.shape) == 3:
-            img_processed = cv2.cvtColor(img_processed, cv2.COLOR_RGB2BGR)
-        
-        # Minimal processing - return image as-is to preserve maximum detail
-        # Only apply light denoising if image has significant noise
-        # For most manga images, original quality is best
-        img_final = img_processed
-        
-        logger.info(f"Minimal preprocessing applied - preserving original image quality")
-        
-        logger.info(f"Image preprocessed: original {img.shape} -> final {img_final.shape}")
-        return img_final
-        
+        height, width = img.shape[:2]
+        min_size = settings.PREPROCESS_MIN_SIDE
+        if min(width, height) >= min_size:
+            return img
+        scale = min_size / min(width, height)
+        new_width, new_height = int(round(width * scale)), int(round(height * scale))
+        logger.info(f"Resized very small image from {width}x{height} to {new_width}x{new_height}")
+        return cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_LANCZOS4)
     except Exception as e:
         logger.warning(f"Error in image preprocessing: {e}, using original image")
         return img
 
 
-app = FastAPI(title="PaddleOCR Server")
+def _decode_image(contents, preprocess=False):
+    """
+    Decode an uploaded buffer (bytes or mmap) to a BGR image, or None if it is
+    not an image. With `preprocess`, tiny images are upscaled when
+    OCR_PREPROCESS is enabled.
+    """
+    nparr = np.frombuffer(contents, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    del nparr  # drop the view so an mmap'd upload can be unmapped
+    if img is not None and preprocess and settings.PREPROCESS:
+        img = _preprocess_image(img)
+    return img
+
+
+def _join_text(texts):
+    """Join recognized lines: with spaces if the text naturally has them, else directly (CJK)"""
+    if any(" " in text for text in texts):
+        return " ".join(texts)
+    return "".join(texts)
+
+
+def _result_lines(page_result):
+    """Non-empty recognized lines of one predict() result as (text, score, polygon or None)"""
+    if not isinstance(page_result, dict):
+        return []
+    rec_texts = page_result.get('rec_texts', [])
+    rec_scores = page_result.get('rec_scores', [])
+    rec_polys = page_result.get('rec_polys', [])
+    lines = []
+    for i, text in enumerate(rec_texts):
+        text_str = str(text).strip() if text else ""
+        if not text_str:
+            continue
+        score = float(rec_scores[i]) if i < len(rec_scores) else 0.5
+        poly = np.asarray(rec_polys[i], dtype=np.float64) if i < len(rec_polys) else None
+        lines.append((text_str, score, poly))
+    return lines
+
+
+def _layout(lines):
+    """Reading order (indexes into `lines`) and speech-bubble blocks of recognized lines"""
+    polys = [poly for _, _, poly in lines]
+    if lines and all(poly is not None for poly in polys):
+        return analyze_layout(len(lines), polys=np.stack(polys))
+    return analyze_layout(len(lines))
+
+
+def _text_fields(lines, blocks, to_page=None):
+    """
+    Response fields for recognized lines grouped by `_layout`: the text (one
+    line per block, in reading order), mean confidence, line count and the
+    blocks with their polygons. `to_page` maps crop polygons to page coordinates.
+    """
+    def polygon(points):
+        if points is None:
+            return None
+        points = np.asarray(points, dtype=np.float64)
+        return (to_page(points) if to_page else points).round(1).tolist()
+    
+    layout = []
+    for block in blocks:
+        members = [lines[i] for i in block['lines']]
+        scores = [score for _, score, _ in members]
+        layout.append({
+            "text": _join_text([text for text, _, _ in members]),
+            "confidence": float(sum(scores) / len(scores)),
+            "orientation": block['orientation'],
+            "polygon": polygon(block['polygon']),
+            "lines": [
+                {"text": text, "confidence": score, "polygon": polygon(poly)}
+                for text, score, poly in members
+            ],
+        })
+    scores = [score for _, score, _ in lines]
+    return {
+        "text": "\n".join(block["text"] for block in layout),
+        "confidence": float(sum(scores) / len(scores)) if scores else 0.0,
+        "blocks": len(lines),
+        "layout": layout,
+    }
+
+
+def _sample_result(endpoint, lang, img, result, response, **fields):
+    """Dump the raw result and response of 1 in OCR_RESULT_SAMPLE_EVERY requests"""
+    sample_result(lambda: {
+        "endpoint": endpoint,
+        "lang": lang,
+        "image": list(img.shape),
+        **fields,
+        "result": result,
+        "response": response,
+    })
+
+
+def _parse_page_boxes(boxes_json, page_shape, normalized):
+    """Validate the `boxes` form field of /ocr-page into a list of box dicts in pixels"""
+    try:
+        boxes = json.loads(boxes_json)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"boxes is not valid JSON: {e}")
+    if not isinstance(boxes, list):
+        raise HTTPException(status_code=400, detail="boxes must be a JSON list")
+    if len(boxes) > settings.PAGE_MAX_BOXES:
+        raise HTTPException(status_code=400, detail=f"Too many boxes (max {settings.PAGE_MAX_BOXES})")
+
+    page_h, page_w = page_shape[:2]
+    diagonal = math.hypot(page_w, page_h)
+    parsed = []
+    for i, box in enumerate(boxes):
+        try:
+            x, y = float(box['x']), float(box['y'])
+            width, height = float(box['width']), float(box['height'])
+            rotation = float(box.get('rotation') or 0.0)
+        except (TypeError, KeyError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Box {i} needs numeric x, y, width and height")
+        if not all(math.isfinite(value) for value in (x, y, width, height, rotation)):
+            raise HTTPException(status_code=400, detail=f"Box {i} has a non-finite coordinate")
+        if width <= 0 or height <= 0:
+            raise HTTPException(status_code=400, detail=f"Box {i} needs a positive width and height")
+        if normalized:
+            x, width = x * page_w, width * page_w
+            y, height = y * page_h, height * page_h
+        # A box, however rotated, never needs to be larger than the page diagonal
+        if width > diagonal or height > diagonal:
+            raise HTTPException(status_code=400, detail=f"Box {i} is larger than the page")
+        parsed.append({
+            'id': box.get('overlay_id', box.get('id')),
+            'x': x, 'y': y, 'width': width, 'height': height, 'rotation': rotation,
+        })
+    return parsed
+
+
+def _crop_page_boxes(img, boxes):
+    return [crop_box(img, b['x'], b['y'], b['width'], b['height'], b['rotation']) for b in boxes]
+
+
+def _overloaded(error):
+    """503 telling the client when to retry, used when the inference queue is full"""
+    return HTTPException(
+        status_code=503,
+        detail="OCR server is busy, please retry later",
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+# Repeated OCR of the same upload with the same settings is answered from here
+result_cache = ResultCache(
+    max_entries=settings.CACHE_SIZE,
+    db_path=settings.CACHE_DB or None,
+    max_disk_entries=settings.CACHE_DB_MAX,
+) if settings.CACHE_SIZE > 0 else None
+
+
+async def _cache_lookup(contents, lang, params=None, det_mode='full', fast_path=False):
+    """Return (cache key, cached response or None); hashing runs off the event loop"""
+    if result_cache is None:
+        return None, None
+    # Pipeline constructor settings matter too (the Chinese pipeline sets its
+    # own thresholds), so both go into the key
+    params = {
+        "pipeline": PIPELINE_CONFIGS.get(lang),
+        "predict": PREDICT_PARAMS if params is None else params,
+        "response": RESPONSE_VERSION,
+        "engine": engine_name(),
+    }
+    if det_mode == 'adaptive':
+        params["det"] = {"side_limit": settings.DET_SIDE_LIMIT, "rec_model": REC_MODELS.get(lang)}
+    if fast_path:
+        params["fast_path"] = {
+            "blank_std": settings.BLANK_STD,
+            "doc_ori_min_side": settings.DOC_ORI_MIN_SIDE,
+            "single_line_aspect": settings.SINGLE_LINE_ASPECT,
+            "single_line_max_thickness": settings.SINGLE_LINE_MAX_THICKNESS,
+            "rec_model": REC_MODELS.get(lang),
+        }
+    return await run_in_threadpool(result_cache.lookup, contents, lang, params)
+
+
+async def _cache_store(key, response):
+    if result_cache is not None and key is not None:
+        await run_in_threadpool(result_cache.put, key, response)
+
+
+# Blocking inference runs here, never on the event loop
+pool = InferencePool(
+    max_workers=settings.POOL_WORKERS,
+    max_queue=settings.POOL_QUEUE,
+    kind=settings.POOL_KIND,
+    initializer=warm_worker if settings.POOL_KIND == 'process' else None,
+    # Process workers hold the models, so they report their registries back
+    report=registry_stats,
+)
+
+
+def _worker_models():
+    """
+    Model registry stats per process that runs inference, keyed by pid.
+    Process workers' stats are as of the last job each of them ran.
+    """
+    if pool.kind == 'process':
+        return {str(pid): stats for pid, stats in pool.worker_reports.items()}
+    return {str(os.getpid()): registry.stats()}
+
+
+async def _run_batch(key, images):
+    lang, params = key
+    return await pool.run(run_predict, lang, images, dict(params))
+
+
+# Requests for the same model and predict parameters that arrive together
+# share one predict() call
+batcher = MicroBatcher(
+    _run_batch,
+    window_ms=settings.BATCH_WINDOW_MS,
+    max_batch=settings.BATCH_MAX,
+) if settings.BATCHING else None
+
+# End-to-end predict latency and throughput, split by batching mode so the two
+# can be compared from /stats
+predict_latency = {"batched": RollingWindow(), "direct": RollingWindow()}
+predict_throughput = {"batched": ThroughputMeter(), "direct": ThroughputMeter()}
+# Crops answered by the fast path: blank, single line, or without document orientation
+fast_path_counts = {"blank": 0, "single_line": 0, "no_doc_ori": 0}
+
+
+def _fast_path(value):
+    """Per-request fast path switch, falling back to OCR_CROP_FAST_PATH"""
+    return settings.CROP_FAST_PATH if value is None else value
+
+
+def _plan_crop(img, params=None):
+    """plan_crop, counted in /stats"""
+    plan = plan_crop(img, params)
+    if plan['blank']:
+        fast_path_counts["blank"] += 1
+    elif plan['single_line']:
+        fast_path_counts["single_line"] += 1
+    elif 'doc_ori' in plan['skipped_stages']:
+        fast_path_counts["no_doc_ori"] += 1
+    return plan
+
+
+def _skipped_stages(result):
+    """Stages the fast path skipped for the first image of a predict() result"""
+    if result and isinstance(result[0], dict):
+        return list(result[0].get('skipped_stages', []))
+    return []
+
+
+def _det_mode(value):
+    """Validate a per-request detection mode, falling back to OCR_DET_MODE"""
+    value = value or settings.DET_MODE
+    if value not in DET_MODES:
+        raise HTTPException(status_code=400, detail=f"det_mode must be one of {', '.join(DET_MODES)}")
+    return value
+
+
+async def _predict(lang, img, params=None, det_mode='full', fast_path=False):
+    """
+    Run OCR for one image through the batcher (when enabled) or straight on
+    the pool. Returns the predict() result list for that image.
+    
+    det_mode='adaptive' runs the staged pipeline instead, detecting on a
+    downscaled copy of oversized pages. With `fast_path` the crop is checked
+    first (see plan_crop): blank crops return an empty result without
+    inference, small ones skip document orientation and single lines go
+    straight to recognition. The result then lists `skipped_stages`.
+    """
+    params = PREDICT_PARAMS if params is None else params
+    plan = _plan_crop(img, params) if fast_path else None
+    if plan is not None and plan['blank']:
+        return [dict(empty_result([lang]), skipped_stages=plan['skipped_stages'])]
+    if plan is not None and 'doc_ori' in plan['skipped_stages']:
+        params = dict(params, use_doc_orientation_classify=False)
+    single_line = plan is not None and plan['single_line']
+    # Only full-pipeline predicts go through the batcher
+    mode = "batched" if batcher is not None and det_mode == 'full' and not single_line else "direct"
+    start = time.perf_counter()
+    if single_line:
+        result = [await pool.run(run_staged, img, [lang], 'best', params, None, True)]
+        metrics.add_stages(result[0].get('timings'))
+    elif det_mode == 'adaptive':
+        result = [await pool.run(run_staged, img, [lang], 'best', params, settings.DET_SIDE_LIMIT)]
+        metrics.add_stages(result[0].get('timings'))
+    elif batcher is not None:
+        result = [await batcher.submit((lang, tuple(sorted(params.items()))), img)]
+    else:
+        result = await pool.run(run_predict, lang, img, params)
+    predict_latency[mode].add(time.perf_counter() - start)
+    predict_throughput[mode].mark()
+    if plan is not None and plan['skipped_stages'] and result and isinstance(result[0], dict):
+        result[0]['skipped_stages'] = plan['skipped_stages']
+    return result
+
+
+# Text lines detected on recently seen pages, so box edits on /ocr-page only
+# run recognition
+page_index = PageIndex(
+    max_pages=settings.PAGE_INDEX_SIZE,
+    cell=settings.PAGE_INDEX_CELL,
+) if settings.PAGE_INDEX_SIZE > 0 else None
+
+
+def _page_det_side_limit():
+    return settings.DET_SIDE_LIMIT if settings.DET_MODE == 'adaptive' else None
+
+
+def _page_index_key(contents):
+    """Page index key for an upload; everything that changes the detected lines goes in"""
+    return page_index.key(contents, {
+        "predict": PREDICT_PARAMS,
+        "det_model": STAGE_MODELS['det'],
+        "side_limit": _page_det_side_limit(),
+        "engine": engine_name(),
+    })
+
+
+async def _read_page_boxes(img, key, page_boxes, lang):
+    """
+    Recognized lines of every /ocr-page box through the page index. The page
+    is detected once (skipping document orientation, pages are upright);
+    each box takes the detected lines it overlaps and only lines not read
+    before with the language's model are recognized.
+
+    Returns (lines per box as (text, score, page polygon), skipped stages
+    per box, summary for the response).
+    """
+    params = PREDICT_PARAMS
+    entry = page_index.get(key)
+    cached = entry is not None
+    if entry is None:
+        with metrics.stage('det'):
+            polys = await pool.run(detect_page, img, params, _page_det_side_limit())
+        entry = page_index.put(key, polys)
+
+    grid = entry.grid
+    box_lines = [
+        grid.query(box_polygon(b['x'], b['y'], b['width'], b['height'], b['rotation']), settings.PAGE_INDEX_MIN_OVERLAP)
+        for b in page_boxes
+    ]
+    model_name = REC_MODELS[lang]
+    wanted = sorted(set(i for lines in box_lines for i in lines))
+    unread = entry.unread(wanted, model_name)
+    if unread:
+        with metrics.stage('rec'):
+            texts, scores = await pool.run(read_quads, img, entry.polys[unread], lang, params)
+        entry.store(model_name, unread, texts, scores)
+    page_index.count_lines(len(unread), len(wanted) - len(unread))
+
+    threshold = params.get('text_rec_score_thresh', 0.0)
+    # Stages the params turn off were never going to run, so they aren't "skipped"
+    switches = {'doc_ori': 'use_doc_orientation_classify', 'textline_ori': 'use_textline_orientation'}
+    enabled = [stage for stage in STAGES if stage not in switches or params.get(switches[stage])]
+    results, skipped = [], []
+    for lines in box_lines:
+        results.append([
+            (text, score, entry.polys[i].astype(np.float64))
+            for i, text, score in entry.read(model_name, lines)
+            if text and score >= threshold
+        ])
+        skip = {'doc_ori'}
+        if cached:
+            skip.add('det')
+        if not set(lines).intersection(unread):
+            skip.update(('textline_ori', 'rec'))
+        skipped.append([stage for stage in enabled if stage in skip])
+    summary = {
+        "cached": cached,
+        "lines": len(grid),
+        "recognized": len(unread),
+        "reused": len(wanted) - len(unread),
+    }
+    return results, skipped, summary
+
+
+async def _ocr_job_page(img, lang):
+    """OCR one page of a chapter job. Jobs run in the background, so a full queue means wait, not fail."""
+    while True:
+        try:
+            result = await _predict(lang, img, det_mode=_det_mode(None))
+            break
+        except PoolSaturatedError as e:
+            await asyncio.sleep(e.retry_after)
+    lines = _result_lines(result[0]) if result else []
+    _, blocks = _layout(lines)
+    return _text_fields(lines, blocks)
+
+
+job_manager = JobManager(settings.JOBS_DIR, _ocr_job_page, concurrency=settings.JOBS_CONCURRENCY)
+
+
+# Background model loading; /ready reports it separately from liveness (/)
+startup = {"state": "starting", "preload": [], "warm_seconds": {}, "error": None}
+
+
+def _check_paddle():
+    try:
+        import paddle
+        logger.info(f"PaddlePaddle found: {paddle.__version__}")
+    except ImportError:
+        logger.warning("PaddlePaddle not found, but PaddleOCR 3.x may work with PaddleX")
+        # PaddleOCR 3.x might work with PaddleX only
+
+
+async def _load_models():
+    """Load the preloaded languages on the inference pool, then warm them up"""
+    langs = preload_langs()
+    startup["preload"] = langs
+    logger.info(f"Initializing PaddleOCR in the background (preload: {', '.join(langs) or 'none'})...")
+    started = time.perf_counter()
+    try:
+        if settings.ENGINE == 'paddle':
+            await run_in_threadpool(_check_paddle)
+        # Thread workers share the registry, so one run warms them all.
+        # Process workers warm themselves in the pool initializer before
+        # their first job (see pipelines.warm_worker); these runs start them,
+        # wait until at least one is warm and report the timings.
+        runs = pool.max_workers if pool.kind == 'process' else 1
+        results = await asyncio.gather(*(pool.run(warm_up, langs, settings.WARMUP) for _ in range(runs)))
+    except asyncio.CancelledError:
+        raise
+    except ImportError as e:
+        if "paddle" in str(e).lower():
+            logger.error(f"PaddlePaddle is required but not installed: {e}")
+            logger.error("Please install PaddlePaddle:")
+            logger.error("  For Windows CPU: pip install paddlepaddle -i https://www.paddlepaddle.org.cn/packages/stable/cpu/")
+            logger.error("  Note: PaddlePaddle may not support Python 3.14. Try Python 3.10-3.12")
+        else:
+            logger.error(f"Failed to import required module: {e}")
+        startup.update(state="failed", error=str(e))
+        return
+    except Exception as e:
+        logger.error(f"Failed to initialize PaddleOCR: {e}")
+        logger.error("Please check PaddleOCR installation and ensure models are downloaded")
+        startup.update(state="failed", error=str(e))
+        return
+    startup.update(state="ready", warm_seconds=results[0] if results else {})
+    logger.info(f"PaddleOCR initialized successfully in {time.perf_counter() - started:.1f}s")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    job_manager.load()
+    # The port is bound while models load; requests for a language that is
+    # still loading wait for it in the registry
+    loader = asyncio.create_task(_load_models())
+    yield
+    loader.cancel()
+    await asyncio.gather(loader, return_exceptions=True)
+    await job_manager.shutdown()
+    pool.shutdown()
+    if result_cache is not None:
+        result_cache.close()
+
+
+app = FastAPI(title="PaddleOCR Server", lifespan=lifespan)
+
+# Per-stage timing of the OCR endpoints: histograms on /metrics and a
+# Server-Timing header on every response
+app.add_middleware(
+    metrics.MetricsMiddleware,
+    paths=("/ocr", "/ocr-chinese", "/ocr-raw", "/ocr-page", "/ocr-multi"),
+)
 
 # Enable CORS for Flutter app
 app.add_middleware(
@@ -103,217 +547,158 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 # Initialize PaddleOCR with Japanese support
 # Models will be downloaded automatically on first run
-logger.info("Initializing PaddleOCR...")
-ocr = None
-try:
-    # Try to import paddle first to check if it's available
-    try:
-        import paddle
-        logger.info(f"PaddlePaddle found: {paddle.__version__}")
-    except ImportError:
-        logger.warning("PaddlePaddle not found, but PaddleOCR 3.x may work with PaddleX")
-        # PaddleOCR 3.x might work with PaddleX only
-    
-    ocr = PaddleOCR(
-        use_textline_orientation=True,  # Enable angle classification for vertical text (replaces use_angle_cls)
-        use_doc_orientation_classify=True,  # Enable document orientation classification
-        use_doc_unwarping=False,  # Disable document unwarping for manga
-        lang='japan',  # Japanese language model
-        # Note: Detection parameters like text_det_limit_side_len are passed to predict() method
-    )
-    logger.info("PaddleOCR initialized successfully")
-except ImportError as e:
-    if "paddle" in str(e).lower():
-        logger.error(f"PaddlePaddle is required but not installed: {e}")
-        logger.error("Please install PaddlePaddle:")
-        logger.error("  For Windows CPU: pip install paddlepaddle -i https://www.paddlepaddle.org.cn/packages/stable/cpu/")
-        logger.error("  Note: PaddlePaddle may not support Python 3.14. Try Python 3.10-3.12")
-    else:
-        logger.error(f"Failed to import required module: {e}")
-    ocr = None
-except Exception as e:
-    logger.error(f"Failed to initialize PaddleOCR: {e}")
-    logger.error("Please check PaddleOCR installation and ensure models are downloaded")
-    ocr = None
-
-
 @app.get("/")
 async def root():
-    """Health check endpoint"""
+    """Liveness: answers as soon as the server is up, even while models load"""
     return {
         "status": "running",
-        "ocr_initialized": ocr is not None,
+        "ocr_initialized": startup["state"] == "ready",
+        "startup": startup["state"],
+        "models": registry.stats(),
+        "worker_models": _worker_models() if pool.kind == 'process' else None,
+        "engine": engine_name(),
         "service": "PaddleOCR Server"
     }
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the preloaded models are loaded and warmed up, 503 before (or if loading failed)"""
+    body = {
+        "ready": startup["state"] == "ready",
+        "state": startup["state"],
+        "preload": startup["preload"],
+        "lazy": [lang for lang in PIPELINE_CONFIGS if lang not in startup["preload"]],
+        "warm_seconds": startup["warm_seconds"],
+        "error": startup["error"],
+    }
+    if not body["ready"]:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+
+@app.get("/stats")
+async def stats():
+    """Inference queue and model registry statistics, for sizing the pool"""
+    return {
+        "pool": pool.stats(),
+        "batching": batcher.stats() if batcher is not None else None,
+        "predict": {
+            mode: {
+                "latency_ms": predict_latency[mode].summary(),
+                "throughput_rps": round(predict_throughput[mode].rate(), 2),
+            }
+            for mode in predict_latency
+        },
+        "cache": result_cache.stats() if result_cache is not None else None,
+        "fast_path": dict(fast_path_counts, enabled=settings.CROP_FAST_PATH),
+        "page_index": page_index.stats() if page_index is not None else None,
+        "models": registry.stats(),
+        "worker_models": _worker_models() if pool.kind == 'process' else None,
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Request and stage latency histograms in Prometheus text format"""
+    metrics.MODEL_LOAD_SECONDS.clear()
+    for pid, stats in _worker_models().items():
+        for model in stats["models"]:
+            metrics.MODEL_LOAD_SECONDS.set(model["load_seconds"], model=model["key"], worker=pid)
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.post("/ocr")
-async def perform_ocr(file: UploadFile = File(...)):
+async def perform_ocr(
+    file: UploadFile = File(...),
+    det_mode: Optional[str] = Form(None),
+    fast_path: Optional[bool] = Form(None),
+):
     """
     Perform OCR on uploaded image file.
     
     Args:
         file: Image file (JPEG, PNG, etc.)
+        det_mode: 'full' or 'adaptive' detection (default: OCR_DET_MODE)
+        fast_path: Skip stages a bubble crop doesn't need (default: OCR_CROP_FAST_PATH)
     
     Returns:
-        JSON with recognized text and confidence score
+        JSON with recognized text (one line per speech bubble, in reading
+        order), confidence score, the layout blocks with their polygons and
+        the stages the fast path skipped
     """
-    if ocr is None:
+    if startup["state"] == "failed" and DEFAULT_LANG in startup["preload"]:
         logger.error("OCR service not initialized - check server logs for initialization errors")
         raise HTTPException(
             status_code=503, 
             detail="OCR service not initialized. Please check server logs and ensure PaddleOCR models are downloaded."
         )
+    det_mode = _det_mode(det_mode)
+    fast_path = _fast_path(fast_path)
+    metrics.set_lang(DEFAULT_LANG)
+    metrics.add_elapsed('upload')
     
     try:
-        # Read image file
-        contents = await file.read()
-        
-        # Convert to numpy array
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Read image file (large uploads are memory-mapped, not copied)
+        with metrics.stage('read'):
+            contents = await read_upload(file, settings.UPLOAD_MMAP_THRESHOLD)
+        try:
+            with metrics.stage('cache'):
+                cache_key, cached = await _cache_lookup(contents, DEFAULT_LANG, det_mode=det_mode, fast_path=fast_path)
+            if cached is not None:
+                logger.info(f"OCR cache hit for image: {file.filename}")
+                return cached
+            
+            # Decode in a worker thread so large pages don't stall the event loop.
+            # Tiny crops are upscaled only when OCR_PREPROCESS is on.
+            with metrics.stage('decode'):
+                img = await run_in_threadpool(_decode_image, contents, True)
+        finally:
+            release_buffer(contents)
         
         if img is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
-        
-        # Skip preprocessing to preserve maximum detail
-        # Preprocessing can lose detail and reduce OCR accuracy
-        # img = _preprocess_image(img)  # Disabled to preserve quality
+        metrics.observe_image(img)
         
         # Perform OCR
-        log_and_print("=" * 60)
-        log_and_print(f"Processing OCR (Japanese model) for image: {file.filename}")
-        log_and_print(f"Image size: {img.shape}")
-        log_and_print(f"No preprocessing - preserving original quality")
+        logger.debug(f"Processing OCR (Japanese model) for image: {file.filename}, size: {img.shape}")
         # PaddleOCR 3.3.2: Use predict() instead of ocr() (ocr() is deprecated)
         # For vertical text, ensure proper orientation handling
-        result = ocr.predict(
-            img,
-            use_textline_orientation=True,
-            use_doc_orientation_classify=True,
-            text_det_thresh=0.3,  # Lower threshold for better detection
-            text_det_box_thresh=0.5,  # Lower box threshold
-            text_rec_score_thresh=0.3,  # Very low recognition threshold to catch all text (was 0.5)
-            text_det_limit_side_len=10000,  # Increase max side limit for large images (was 4000 default)
-            text_det_limit_type='max',  # Use max side instead of min
-            text_det_unclip_ratio=1.8,  # Increase unclip ratio for better text detection
-        )
-        
-        # Debug: Log result type and structure
-        log_and_print(f"OCR result type: {type(result)}")
-        if result is not None:
-            result_len = len(result) if isinstance(result, (list, tuple)) else 'N/A'
-            log_and_print(f"OCR result length: {result_len}")
-            if isinstance(result, list) and len(result) > 0:
-                log_and_print(f"First item type: {type(result[0])}")
-                first_keys = list(result[0].keys()) if isinstance(result[0], dict) else 'N/A'
-                log_and_print(f"First item keys: {first_keys}")
-                first_sample = str(result[0])[:500] if len(str(result[0])) > 500 else str(result[0])
-                log_and_print(f"First item sample: {first_sample}")
-        
-        # Parse result - predict() returns different format than ocr()
-        if result is None:
-            logger.warning("OCR result is None")
-            return {
-                "text": "",
-                "confidence": 0.0,
-                "message": "No text detected - result is None"
-            }
+        try:
+            with metrics.stage('predict'):
+                result = await _predict(DEFAULT_LANG, img, det_mode=det_mode, fast_path=fast_path)
+        except PoolSaturatedError as e:
+            raise _overloaded(e)
         
-        if not isinstance(result, (list, tuple)) or len(result) == 0:
-            logger.warning(f"OCR result is empty or invalid format: {type(result)}")
+        if not result:
+            logger.warning(f"OCR returned no result: {type(result)}")
             return {
                 "text": "",
                 "confidence": 0.0,
-                "message": f"No text detected - invalid result format: {type(result)}"
+                "message": "No text detected"
             }
         
-        # Extract text from result
-        # PaddleOCR 3.3.2 predict() returns: [{'rec_texts': [...], 'rec_scores': [...], ...}, ...]
-        all_text = []
-        all_confidences = []
-        
-        try:
-            # New format: List of dicts with 'rec_texts' and 'rec_scores'
-            if isinstance(result, list) and len(result) > 0:
-                for page_result in result:
-                    if isinstance(page_result, dict):
-                        # Extract texts and scores
-                        rec_texts = page_result.get('rec_texts', [])
-                        rec_scores = page_result.get('rec_scores', [])
-                        
-                        log_and_print(f"Found {len(rec_texts)} text items, {len(rec_scores)} scores")
-                        
-                        # Log all detected texts for debugging
-                        for i, text in enumerate(rec_texts):
-                            score = rec_scores[i] if i < len(rec_scores) else 0.0
-                            log_and_print(f"  Text[{i}]: '{text}' (confidence: {score:.3f})")
-                        
-                        # Match texts with scores - include ALL text, don't filter by confidence
-                        for i, text in enumerate(rec_texts):
-                            text_str = str(text).strip() if text else ""
-                            # Include all non-empty text, regardless of confidence
-                            if text_str:
-                                all_text.append(text_str)
-                                # Get corresponding score if available
-                                if i < len(rec_scores):
-                                    score = float(rec_scores[i])
-                                    all_confidences.append(score)
-                                else:
-                                    all_confidences.append(0.5)  # Default confidence for missing scores
-                        
-                        # If no texts found, check for alternative keys
-                        if not all_text:
-                            # Try old format compatibility
-                            if 'text' in page_result:
-                                all_text.append(str(page_result['text']))
-                                all_confidences.append(page_result.get('confidence', 0.9))
-                    # Fallback: old format (nested lists)
-                    elif isinstance(page_result, list):
-                        logger.info("Parsing as old nested list format")
-                        for line in page_result:
-                            if line is None:
-                                continue
-                            if isinstance(line, list):
-                                for word_info in line:
-                                    if word_info is None:
-                                        continue
-                                    if isinstance(word_info, (list, tuple)) and len(word_info) >= 2:
-                                        text_conf = word_info[1]
-                                        if isinstance(text_conf, (list, tuple)) and len(text_conf) >= 2:
-                                            text, confidence = text_conf[0], text_conf[1]
-                                            if text and str(text).strip():
-                                                all_text.append(str(text).strip())
-                                                all_confidences.append(float(confidence))
-        except Exception as e:
-            logger.error(f"Error parsing OCR result: {e}", exc_info=True)
-            logger.error(f"Result structure: {type(result)}, first item: {result[0] if result else 'None'}")
+        # PaddleOCR 3.3.2 predict() returns: [{'rec_texts': [...], 'rec_scores': [...], 'rec_polys': [...], ...}]
+        with metrics.stage('parse'):
+            lines = _result_lines(result[0])
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, (text, score, _) in enumerate(lines):
+                    logger.debug(f"  Text[{i}]: '{text}' (confidence: {score:.3f})")
+            
+            # Reading order: speech bubbles right-to-left, columns right-to-left inside them
+            _, blocks = _layout(lines)
+            response = _text_fields(lines, blocks)
+            response["skipped_stages"] = _skipped_stages(result)
         
-        # Combine all text - for Chinese/Japanese, join without spaces unless text naturally has spaces
-        # Check if any text item contains spaces
-        has_natural_spaces = any(" " in text for text in all_text) if all_text else False
-        if has_natural_spaces:
-            combined_text = " ".join(all_text) if all_text else ""
-        else:
-            # For Chinese/Japanese, join directly without spaces
-            combined_text = "".join(all_text) if all_text else ""
-        
-        avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0.0
-        
-        log_and_print(f"OCR completed: {len(all_text)} text blocks detected, combined length: {len(combined_text)}, text preview: {combined_text[:150] if combined_text else 'empty'}")
-        
-        if not all_text:
-            logger.warning(f"No text extracted from result. Result structure: {type(result)}, length: {len(result) if isinstance(result, (list, tuple)) else 'N/A'}")
-        
-        return {
-            "text": combined_text,
-            "confidence": float(avg_confidence),
-            "blocks": len(all_text)
-        }
+        logger.info(f"OCR completed: {len(lines)} text lines in {len(blocks)} blocks, text preview: {response['text'][:150] or 'empty'}")
+        _sample_result("/ocr", DEFAULT_LANG, img, result, response, filename=file.filename)
+        await _cache_store(cache_key, response)
+        return response
         
     except HTTPException:
         raise
@@ -323,175 +708,775 @@ async def perform_ocr(file: UploadFile = File(...)):
 
 
 @app.post("/ocr-chinese")
-async def perform_ocr_chinese(file: UploadFile = File(...)):
+async def perform_ocr_chinese(
+    file: UploadFile = File(...),
+    det_mode: Optional[str] = Form(None),
+    fast_path: Optional[bool] = Form(None),
+):
     """
     Perform OCR with Chinese language model.
     Useful for Traditional/Simplified Chinese text.
+    det_mode selects 'full' or 'adaptive' detection (default: OCR_DET_MODE);
+    fast_path works as for /ocr.
     """
+    det_mode = _det_mode(det_mode)
+    fast_path = _fast_path(fast_path)
+    metrics.set_lang('ch')
+    metrics.add_elapsed('upload')
+    
     try:
-        # Initialize Chinese OCR if not already done
-        ocr_ch = PaddleOCR(
-            use_textline_orientation=True,  # Enable angle classification for vertical text
-            use_doc_orientation_classify=True,  # Enable document orientation classification
-            use_doc_unwarping=False,  # Disable document unwarping for manga
-            lang='ch',  # Chinese language model
-            # Improved detection parameters for better accuracy
-            text_det_thresh=0.3,  # Lower threshold for better detection
-            text_det_box_thresh=0.5,  # Lower box threshold
-            text_rec_score_thresh=0.3,  # Very low recognition threshold to catch all text (was 0.5) to catch more text
-        )
-        
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Read image file (large uploads are memory-mapped, not copied)
+        with metrics.stage('read'):
+            contents = await read_upload(file, settings.UPLOAD_MMAP_THRESHOLD)
+        try:
+            with metrics.stage('cache'):
+                cache_key, cached = await _cache_lookup(contents, 'ch', det_mode=det_mode, fast_path=fast_path)
+            if cached is not None:
+                logger.info(f"Chinese OCR cache hit for image: {file.filename}")
+                return cached
+            
+            # Decode in a worker thread so large pages don't stall the event loop.
+            # Tiny crops are upscaled only when OCR_PREPROCESS is on.
+            with metrics.stage('decode'):
+                img = await run_in_threadpool(_decode_image, contents, True)
+        finally:
+            release_buffer(contents)
         
         if img is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
-        
-        # Skip preprocessing to preserve maximum detail for Chinese text
-        # img = _preprocess_image(img)  # Disabled to preserve quality
+        metrics.observe_image(img)
         
         # PaddleOCR 3.3.2: Use predict() instead of ocr() (ocr() is deprecated)
         # For Chinese vertical text, use enhanced orientation detection
-        log_and_print("=" * 60)
-        log_and_print(f"Processing OCR (Chinese model) for image: {file.filename}")
-        log_and_print(f"Image size: {img.shape}")
-        log_and_print(f"No preprocessing - preserving original quality")
-        result = ocr_ch.predict(
-            img,
-            use_textline_orientation=True,
-            use_doc_orientation_classify=True,
-            text_det_thresh=0.3,  # Lower threshold for better detection
-            text_det_box_thresh=0.5,  # Lower box threshold
-            text_rec_score_thresh=0.3,  # Very low recognition threshold to catch all text (was 0.5)
-            text_det_limit_side_len=10000,  # Increase max side limit for large images (was 4000 default)
-            text_det_limit_type='max',  # Use max side instead of min
-            text_det_unclip_ratio=1.8,  # Increase unclip ratio for better text detection
-        )
-        
-        # Debug: Log result type and structure
-        log_and_print(f"Chinese OCR result type: {type(result)}")
-        if result is not None:
-            result_len = len(result) if isinstance(result, (list, tuple)) else 'N/A'
-            log_and_print(f"Chinese OCR result length: {result_len}")
-            if isinstance(result, list) and len(result) > 0:
-                log_and_print(f"Chinese OCR first item type: {type(result[0])}")
-                first_keys = list(result[0].keys()) if isinstance(result[0], dict) else 'N/A'
-                log_and_print(f"Chinese OCR first item keys: {first_keys}")
-                first_sample = str(result[0])[:500] if len(str(result[0])) > 500 else str(result[0])
-                log_and_print(f"Chinese OCR first item sample: {first_sample}")
+        logger.debug(f"Processing OCR (Chinese model) for image: {file.filename}, size: {img.shape}")
+        # The Chinese pipeline is built on first use inside the worker and
+        # kept warm in the registry
+        try:
+            with metrics.stage('predict'):
+                result = await _predict('ch', img, det_mode=det_mode, fast_path=fast_path)
+        except PoolSaturatedError as e:
+            raise _overloaded(e)
         
-        # Parse result - same format handling as main OCR endpoint
-        if result is None:
-            logger.warning("Chinese OCR result is None")
+        if not result:
+            logger.warning(f"Chinese OCR returned no result: {type(result)}")
             return {
                 "text": "",
                 "confidence": 0.0,
-                "message": "No text detected - result is None"
+                "message": "No text detected"
             }
         
-        if not isinstance(result, (list, tuple)) or len(result) == 0:
-            logger.warning(f"Chinese OCR result is empty or invalid: {type(result)}")
-            return {
-                "text": "",
-                "confidence": 0.0,
-                "message": f"No text detected - invalid result format: {type(result)}"
-            }
+        with metrics.stage('parse'):
+            lines = _result_lines(result[0])
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, (text, score, _) in enumerate(lines):
+                    logger.debug(f"  Chinese Text[{i}]: '{text}' (confidence: {score:.3f})")
+            
+            # Reading order: speech bubbles right-to-left, columns right-to-left inside them
+            _, blocks = _layout(lines)
+            response = _text_fields(lines, blocks)
+            response["skipped_stages"] = _skipped_stages(result)
         
-        all_text = []
-        all_confidences = []
-        text_with_positions = []  # Store text with position for sorting
+        logger.info(f"Chinese OCR completed: {len(lines)} text lines in {len(blocks)} blocks, text preview: {response['text'][:150] or 'empty'}")
+        _sample_result("/ocr-chinese", 'ch', img, result, response, filename=file.filename)
+        await _cache_store(cache_key, response)
+        return response
         
-        # Parse using same logic as main endpoint
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Chinese OCR error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
+
+
+@app.post("/ocr-raw")
+async def perform_ocr_raw(
+    request: Request,
+    lang: str = DEFAULT_LANG,
+    det_mode: Optional[str] = None,
+    fast_path: Optional[bool] = None,
+):
+    """
+    Perform OCR on raw pixels the client has already decoded.
+    
+    The body is a 16-byte header followed by the pixel buffer (see
+    ingest.parse_raw_image): b'QRAW', uint32 width, uint32 height, uint8
+    channels (1, 3 or 4), uint8 order (0 = BGR(A), 1 = RGB(A)), 2 padding
+    bytes, all little-endian. There is no encode/decode round trip; BGR
+    pixels are read in place, other layouts are converted to BGR once.
+    
+    Args:
+        lang: Language pipeline ('japan' or 'ch'), query parameter
+        det_mode: 'full' or 'adaptive' detection, query parameter
+        fast_path: Skip stages a bubble crop doesn't need, query parameter
+    
+    Returns:
+        JSON with recognized text and confidence score, like /ocr
+    """
+    if lang not in PIPELINE_CONFIGS:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {lang}")
+    det_mode = _det_mode(det_mode)
+    fast_path = _fast_path(fast_path)
+    metrics.set_lang(lang)
+    
+    try:
+        with metrics.stage('read'):
+            body = await request.body()
         try:
-            if isinstance(result, list) and len(result) > 0:
-                for page_result in result:
-                    if isinstance(page_result, dict):
-                        rec_texts = page_result.get('rec_texts', [])
-                        rec_scores = page_result.get('rec_scores', [])
-                        rec_boxes = page_result.get('rec_boxes', [])  # Get detection boxes for sorting
-                        
-                        log_and_print(f"Chinese OCR: Found {len(rec_texts)} text items, {len(rec_scores)} scores, {len(rec_boxes)} boxes")
-                        
-                        # Log all detected texts for debugging
-                        for i, text in enumerate(rec_texts):
-                            score = rec_scores[i] if i < len(rec_scores) else 0.0
-                            box_info = rec_boxes[i] if i < len(rec_boxes) else None
-                            log_and_print(f"  Chinese Text[{i}]: '{text}' (confidence: {score:.3f}, box: {box_info})")
-                        
-                        if len(rec_texts) == 0:
-                            log_and_print("Chinese OCR: No text items found in rec_texts!", 'warning')
-                            result_keys = list(page_result.keys()) if isinstance(page_result, dict) else 'N/A'
-                            log_and_print(f"Chinese OCR: Result keys: {result_keys}", 'warning')
-                        
-                        # Include ALL text with position info for sorting
-                        for i, text in enumerate(rec_texts):
-                            text_str = str(text).strip() if text else ""
-                            if text_str:
-                                # Get box position for sorting (top Y coordinate)
-                                box = rec_boxes[i] if i < len(rec_boxes) else None
-                                y_pos = 0
-                                if box is not None:
-                                    # Box format: [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
-                                    if isinstance(box, (list, tuple)) and len(box) > 0:
-                                        if isinstance(box[0], (list, tuple)) and len(box[0]) > 1:
-                                            y_pos = float(box[0][1])  # Top Y coordinate
-                                
-                                text_with_positions.append({
-                                    'text': text_str,
-                                    'y_pos': y_pos,
-                                    'index': i,
-                                    'score': float(rec_scores[i]) if i < len(rec_scores) else 0.5
-                                })
-                        
-                        # Sort by Y position (top to bottom) to maintain reading order
-                        text_with_positions.sort(key=lambda x: x['y_pos'])
-                        
-                        # Extract sorted text and scores
-                        for item in text_with_positions:
-                            all_text.append(item['text'])
-                            all_confidences.append(item['score'])
-                    elif isinstance(page_result, list):
-                        # Old format fallback
-                        for line in page_result:
-                            if line is None or not isinstance(line, list):
-                                continue
-                            for word_info in line:
-                                if word_info is None or not isinstance(word_info, (list, tuple)) or len(word_info) < 2:
-                                    continue
-                                text_conf = word_info[1]
-                                if isinstance(text_conf, (list, tuple)) and len(text_conf) >= 2:
-                                    text, confidence = text_conf[0], text_conf[1]
-                                    if text and str(text).strip():
-                                        all_text.append(str(text).strip())
-                                        all_confidences.append(float(confidence))
-        except Exception as e:
-            logger.error(f"Error parsing Chinese OCR result: {e}", exc_info=True)
+            with metrics.stage('decode'):
+                img = parse_raw_image(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid raw image: {e}")
+        metrics.observe_image(img)
         
-        # Combine all text - for Chinese, join without spaces unless text naturally has spaces
-        has_natural_spaces = any(" " in text for text in all_text) if all_text else False
-        if has_natural_spaces:
-            combined_text = " ".join(all_text) if all_text else ""
-        else:
-            # For Chinese, join directly without spaces
-            combined_text = "".join(all_text) if all_text else ""
+        with metrics.stage('cache'):
+            cache_key, cached = await _cache_lookup(body, lang, det_mode=det_mode, fast_path=fast_path)
+        if cached is not None:
+            logger.info(f"Raw OCR cache hit ({img.shape[1]}x{img.shape[0]})")
+            return cached
+        
+        if settings.PREPROCESS:
+            img = await run_in_threadpool(_preprocess_image, img)
+        logger.debug(f"Processing raw OCR ({lang} model), image size: {img.shape}")
+        try:
+            with metrics.stage('predict'):
+                result = await _predict(lang, img, det_mode=det_mode, fast_path=fast_path)
+        except PoolSaturatedError as e:
+            raise _overloaded(e)
+        
+        with metrics.stage('parse'):
+            lines = _result_lines(result[0]) if result else []
+            _, blocks = _layout(lines)
+            response = _text_fields(lines, blocks)
+            response["skipped_stages"] = _skipped_stages(result)
+        logger.info(f"Raw OCR completed: {len(lines)} text blocks detected, text preview: {response['text'][:150] or 'empty'}")
+        _sample_result("/ocr-raw", lang, img, result, response)
+        await _cache_store(cache_key, response)
+        return response
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Raw OCR error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
+
+
+@app.post("/ocr-page")
+async def perform_ocr_page(
+    file: UploadFile = File(...),
+    boxes: str = Form(...),
+    lang: str = Form(DEFAULT_LANG),
+    normalized: bool = Form(False),
+    fast_path: Optional[bool] = Form(None),
+    reuse_detection: Optional[bool] = Form(None),
+):
+    """
+    Recognize every overlay box of a page in one request.
+    
+    With the page index (OCR_PAGE_INDEX_SIZE > 0) the whole page is detected
+    the first time it is seen and each box reads the detected lines it
+    overlaps; sending the same page again with moved, resized or new boxes
+    only recognizes lines not read before. Otherwise every box crop runs the
+    full pipeline.
+    
+    Args:
+        file: Full page image
+        boxes: JSON list of boxes shaped like OverlayBoxModel
+            ({"x", "y", "width", "height", "rotation"?, "overlay_id"?}),
+            rotation in degrees clockwise around the box centre
+        lang: Language pipeline ('japan' or 'ch')
+        normalized: Box coordinates are fractions of the page size instead of pixels
+        fast_path: Answer blank boxes without inference and skip document
+            orientation when every box is small (default: OCR_CROP_FAST_PATH);
+            only used without the page index
+        reuse_detection: Use the page index (default: on when OCR_PAGE_INDEX_SIZE > 0)
+    
+    Returns:
+        JSON with per-box text, confidence and polygon (page coordinates),
+        plus the recognized lines and skipped stages of each box and, with
+        the page index, `page_index` telling whether the page's lines were
+        already known and how many lines were recognized or reused
+    """
+    if lang not in PIPELINE_CONFIGS:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {lang}")
+    metrics.set_lang(lang)
+    metrics.add_elapsed('upload')
+    use_index = page_index is not None and reuse_detection is not False
+    
+    try:
+        with metrics.stage('read'):
+            contents = await read_upload(file, settings.UPLOAD_MMAP_THRESHOLD)
+        page_key = None
+        try:
+            with metrics.stage('decode'):
+                img = await run_in_threadpool(_decode_image, contents)
+            if img is not None and use_index:
+                with metrics.stage('hash'):
+                    page_key = await run_in_threadpool(_page_index_key, contents)
+        finally:
+            release_buffer(contents)
+        if img is None:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+        metrics.observe_image(img)
         
-        avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0.0
+        page_boxes = _parse_page_boxes(boxes, img.shape, normalized)
+        logger.debug(f"Processing page OCR ({lang} model) for image: {file.filename}, {len(page_boxes)} boxes")
         
-        log_and_print(f"Chinese OCR completed: {len(all_text)} text blocks detected, combined length: {len(combined_text)}, text preview: {combined_text[:150] if combined_text else 'empty'}")
+        if use_index:
+            try:
+                box_lines, box_skipped, index_summary = await _read_page_boxes(img, page_key, page_boxes, lang)
+            except PoolSaturatedError as e:
+                raise _overloaded(e)
+            with metrics.stage('parse'):
+                response_boxes = []
+                for i, box in enumerate(page_boxes):
+                    lines = box_lines[i]
+                    _, blocks = _layout(lines)
+                    response_boxes.append({
+                        "index": i,
+                        "id": box['id'],
+                        **_text_fields(lines, blocks),
+                        "polygon": box_polygon(box['x'], box['y'], box['width'], box['height'], box['rotation']).round(1).tolist(),
+                        "skipped_stages": box_skipped[i],
+                    })
+            logger.info(
+                f"Page OCR completed: {sum(1 for b in response_boxes if b['text'])}/{len(response_boxes)} boxes with text, "
+                f"{index_summary['recognized']} lines recognized, {index_summary['reused']} reused"
+            )
+            _sample_result("/ocr-page", lang, img, box_lines, response_boxes, filename=file.filename, boxes=page_boxes)
+            return {
+                "width": int(img.shape[1]),
+                "height": int(img.shape[0]),
+                "boxes": response_boxes,
+                "page_index": index_summary,
+            }
         
+        with metrics.stage('crop'):
+            crops = await run_in_threadpool(_crop_page_boxes, img, page_boxes)
+        # One predict() over every non-empty crop instead of one request per box
+        crop_indexes = [i for i, crop in enumerate(crops) if crop is not None]
+        plans = {}
+        params = PREDICT_PARAMS
+        if _fast_path(fast_path):
+            plans = await run_in_threadpool(lambda: {i: plan_crop(crops[i], params) for i in crop_indexes})
+            fast_path_counts["blank"] += sum(1 for plan in plans.values() if plan['blank'])
+            crop_indexes = [i for i in crop_indexes if not plans[i]['blank']]
+            # The batch shares one set of predict parameters
+            if crop_indexes and all('doc_ori' in plans[i]['skipped_stages'] for i in crop_indexes):
+                params = dict(params, use_doc_orientation_classify=False)
+                fast_path_counts["no_doc_ori"] += len(crop_indexes)
+        results = []
+        if crop_indexes:
+            try:
+                with metrics.stage('predict'):
+                    results = await pool.run(run_predict, lang, [crops[i] for i in crop_indexes], params)
+            except PoolSaturatedError as e:
+                raise _overloaded(e)
+        results_by_box = dict(zip(crop_indexes, results or []))
+        
+        with metrics.stage('parse'):
+            response_boxes = []
+            for i, box in enumerate(page_boxes):
+                geometry = (box['x'], box['y'], box['width'], box['height'], box['rotation'])
+                lines = _result_lines(results_by_box.get(i))
+                _, blocks = _layout(lines)
+                matrix = box_affine(*geometry)
+                if i in plans and plans[i]['blank']:
+                    skipped = plans[i]['skipped_stages']
+                else:
+                    skipped = ['doc_ori'] if i in results_by_box and params is not PREDICT_PARAMS else []
+                response_boxes.append({
+                    "index": i,
+                    "id": box['id'],
+                    **_text_fields(lines, blocks, to_page=lambda points: crop_to_page(points, matrix)),
+                    "polygon": box_polygon(*geometry).round(1).tolist(),
+                    "skipped_stages": skipped,
+                })
+        
+        logger.info(f"Page OCR completed: {sum(1 for b in response_boxes if b['text'])}/{len(response_boxes)} boxes with text")
+        _sample_result("/ocr-page", lang, img, results, response_boxes, filename=file.filename, boxes=page_boxes)
         return {
-            "text": combined_text,
-            "confidence": float(avg_confidence),
-            "blocks": len(all_text)
+            "width": int(img.shape[1]),
+            "height": int(img.shape[0]),
+            "boxes": response_boxes,
         }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Page OCR error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
+
+
+@app.post("/ocr-multi")
+async def perform_ocr_multi(
+    file: UploadFile = File(...),
+    langs: str = Form("ch,japan"),
+    mode: str = Form("best"),
+    det_mode: Optional[str] = Form(None),
+    fast_path: Optional[bool] = Form(None),
+):
+    """
+    Detect text once and recognize it with several language models.
+    
+    Replaces calling /ocr-chinese and then /ocr with the same crop: detection
+    and orientation run a single time and each detected line is read by
+    every language in `langs`.
+    
+    Args:
+        file: Image file (JPEG, PNG, etc.)
+        langs: Comma-separated languages, e.g. "ch,japan"
+        mode: 'best' picks each line's reading with the highest score;
+            'both' also returns every language's full text
+        det_mode: 'adaptive' detects on a downscaled copy of oversized pages
+            (default: OCR_DET_MODE)
+        fast_path: Skip stages a bubble crop doesn't need, as for /ocr
+    
+    Returns:
+        JSON with recognized text and confidence, the language chosen per
+        line, and in 'both' mode the text per language
+    """
+    lang_list = [lang.strip() for lang in langs.split(",") if lang.strip()]
+    unknown = [lang for lang in lang_list if lang not in REC_MODELS]
+    if not lang_list or unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported languages: {unknown or langs}")
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(MODES)}")
+    det_side_limit = settings.DET_SIDE_LIMIT if _det_mode(det_mode) == 'adaptive' else None
+    fast_path = _fast_path(fast_path)
+    metrics.set_lang('+'.join(lang_list))
+    metrics.add_elapsed('upload')
+    
+    try:
+        with metrics.stage('read'):
+            contents = await read_upload(file, settings.UPLOAD_MMAP_THRESHOLD)
+        try:
+            with metrics.stage('cache'):
+                cache_key, cached = await _cache_lookup(contents, f"multi:{mode}", {
+                "langs": lang_list,
+                "rec_models": {lang: REC_MODELS[lang] for lang in lang_list},
+                "stage_models": STAGE_MODELS,
+                "predict": PREDICT_PARAMS,
+                "det_side_limit": det_side_limit,
+            }, fast_path=fast_path)
+            if cached is not None:
+                logger.info(f"Multi-language OCR cache hit for image: {file.filename}")
+                return cached
+            
+            with metrics.stage('decode'):
+                img = await run_in_threadpool(_decode_image, contents, True)
+        finally:
+            release_buffer(contents)
+        if img is None:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+        metrics.observe_image(img)
+        
+        logger.debug(f"Processing OCR ({'+'.join(lang_list)}, mode={mode}) for image: {file.filename}, size: {img.shape}")
+        plan = _plan_crop(img) if fast_path else None
+        params = PREDICT_PARAMS
+        if plan is not None and 'doc_ori' in plan['skipped_stages']:
+            params = dict(params, use_doc_orientation_classify=False)
+        if plan is not None and plan['blank']:
+            result = empty_result(lang_list, mode)
+        else:
+            try:
+                with metrics.stage('predict'):
+                    result = await pool.run(
+                        run_staged, img, lang_list, mode, params, det_side_limit, plan is not None and plan['single_line'],
+                    )
+            except PoolSaturatedError as e:
+                raise _overloaded(e)
+            metrics.add_stages(result.get('timings'))
         
+        with metrics.stage('parse'):
+            texts = result['rec_texts']
+            scores = result['rec_scores']
+            lines = list(zip(texts, scores, result['rec_polys']))
+            order, blocks = _layout(lines)
+            response = _text_fields(lines, blocks)
+            response["lines"] = [
+                {"text": texts[i], "confidence": scores[i], "lang": result['rec_langs'][i]}
+                for i in order
+            ]
+            if mode == 'both':
+                response["by_lang"] = {}
+                for lang, reading in result['alternatives'].items():
+                    lang_texts = reading['rec_texts']
+                    lang_scores = reading['rec_scores']
+                    response["by_lang"][lang] = {
+                        "text": "\n".join(
+                            _join_text([lang_texts[i] for i in block['lines'] if lang_texts[i]])
+                            for block in blocks
+                        ),
+                        "confidence": float(sum(lang_scores) / len(lang_scores)) if lang_scores else 0.0,
+                    }
+            response["skipped_stages"] = plan['skipped_stages'] if plan is not None else []
+        
+        logger.info(f"Multi-language OCR completed: {len(texts)} text blocks detected, text preview: {response['text'][:150] or 'empty'}")
+        _sample_result("/ocr-multi", lang_list, img, result, response, filename=file.filename, mode=mode)
+        await _cache_store(cache_key, response)
+        return response
+    
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Chinese OCR error: {str(e)}", exc_info=True)
+        logger.error(f"Multi-language OCR error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
 
 
+def _get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+def _resolve_job_directory(directory):
+    """Resolve a directory job path, keeping it inside OCR_JOBS_LIBRARY_ROOT when that is set"""
+    root = settings.JOBS_LIBRARY_ROOT
+    path = os.path.abspath(os.path.join(root, directory) if root else directory)
+    if root:
+        root = os.path.abspath(root)
+        if os.path.commonpath([root, path]) != root:
+            raise HTTPException(status_code=400, detail="directory must be inside the library root")
+    if not os.path.isdir(path):
+        raise HTTPException(status_code=400, detail=f"Not a directory: {directory}")
+    return path
+
+
+@app.post("/jobs")
+async def create_job(
+    directory: Optional[str] = Form(None),
+    lang: str = Form(DEFAULT_LANG),
+    files: Optional[List[UploadFile]] = File(None),
+):
+    """
+    Start an OCR job over a whole chapter.
+    
+    Args:
+        directory: Folder of page images to OCR (e.g. a chapter in comics/).
+            Submitting the same folder and language again resumes the
+            existing job and skips pages that are already done.
+        lang: Language pipeline ('japan' or 'ch')
+        files: Alternatively, the page images themselves
+    
+    Returns:
+        Job summary; follow progress at /jobs/{id}/events
+    """
+    if lang not in PIPELINE_CONFIGS:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {lang}")
+    if bool(directory) == bool(files):
+        raise HTTPException(status_code=400, detail="Provide either directory or files")
+    
+    if directory:
+        job = await job_manager.create_for_directory(_resolve_job_directory(directory), lang)
+    else:
+        job = await job_manager.create_for_uploads(files, lang)
+    logger.info(f"OCR job {job.id} started: {len(job.pages)} pages, {len(job.pending_indexes())} to process")
+    return job.summary()
+
+
+@app.get("/jobs")
+async def list_jobs():
+    return [job.summary() for job in sorted(job_manager.jobs.values(), key=lambda j: j.created)]
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, results: bool = False):
+    """Poll a job; with results=true the per-page results so far are included"""
+    job = _get_job(job_id)
+    summary = job.summary()
+    if results:
+        summary["results"] = [job.results[i] for i in sorted(job.results)]
+    return summary
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Stop a running job; finished pages are kept and the job can be resumed"""
+    job = _get_job(job_id)
+    job_manager.cancel(job)
+    return job.summary()
+
+
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    """Continue a cancelled, failed or interrupted job with the pages not done yet"""
+    job = _get_job(job_id)
+    job_manager.start(job)
+    return job.summary()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, format: str = "ndjson"):
+    """
+    Stream a job's per-page results as they complete.
+    
+    Pages finished before the client connected are replayed first. The
+    stream ends with an "end" event once the job stops.
+    
+    Args:
+        format: 'ndjson' (one JSON event per line) or 'sse' (Server-Sent Events)
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or sse")
+    job = _get_job(job_id)
+    
+    # Subscribe and snapshot together, so every page is sent exactly once
+    queue = job.subscribe()
+    replay = [{"event": "page", "result": job.results[i]} for i in sorted(job.results)]
+    running = job.task is not None and not job.task.done()
+    
+    def encode(event):
+        data = json.dumps(event, ensure_ascii=False)
+        if format == "sse":
+            return f"event: {event['event']}\ndata: {data}\n\n"
+        return data + "\n"
+    
+    async def stream():
+        try:
+            for event in replay:
+                yield encode(event)
+            if not running:
+                yield encode({"event": "end", **job.summary()})
+                return
+            while True:
+                event = await queue.get()
+                yield encode(event)
+                if event["event"] == "end":
+                    return
+        finally:
+            job.unsubscribe(queue)
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type)
+
+
+async def _session_ocr(job):
+    """OCR one WebSocket job; the result fields are those of /ocr plus server_timing"""
+    with metrics.track("/ws") as timer:
+        lang = job['lang']
+        metrics.set_lang(lang)
+        contents = job['image']
+        with metrics.stage('cache'):
+            cache_key, cached = await _cache_lookup(contents, lang, det_mode=job['det_mode'], fast_path=job['fast_path'])
+        if cached is not None:
+            return dict(cached, server_timing=timer.server_timing())
+        
+        with metrics.stage('decode'):
+            img = await run_in_threadpool(_decode_image, contents, True)
+        if img is None:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+        metrics.observe_image(img)
+        
+        # A session is already limited to a few jobs in flight, so a full
+        # pool means wait (still cancellable), not fail
+        with metrics.stage('predict'):
+            while True:
+                try:
+                    result = await _predict(lang, img, det_mode=job['det_mode'], fast_path=job['fast_path'])
+                    break
+                except PoolSaturatedError as e:
+                    await asyncio.sleep(e.retry_after)
+        
+        with metrics.stage('parse'):
+            lines = _result_lines(result[0]) if result else []
+            _, blocks = _layout(lines)
+            response = _text_fields(lines, blocks)
+            response["skipped_stages"] = _skipped_stages(result)
+        _sample_result("/ws", lang, img, result, response, job=job['id'], page=job['page'])
+        await _cache_store(cache_key, response)
+        return dict(response, server_timing=timer.server_timing())
+
+
+def _ws_error(status, detail, job_id=None):
+    return {"type": "error", "id": job_id, "status": status, "detail": detail}
+
+
+def _ws_job_id(value):
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+def _ws_ocr_job(request):
+    """Validated job fields of an 'ocr' message (the image is attached later)"""
+    job_id = request.get("id")
+    if not _ws_job_id(job_id):
+        raise HTTPException(status_code=400, detail="'ocr' needs a string or integer 'id'")
+    lang = request.get("lang", DEFAULT_LANG)
+    if lang not in PIPELINE_CONFIGS:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {lang}")
+    priority = request.get("priority", 0)
+    if not isinstance(priority, int) or isinstance(priority, bool):
+        raise HTTPException(status_code=400, detail="'priority' must be an integer")
+    fast_path = request.get("fast_path")
+    if fast_path is not None and not isinstance(fast_path, bool):
+        raise HTTPException(status_code=400, detail="'fast_path' must be true or false")
+    return {
+        "job_id": job_id,
+        "page": request.get("page"),
+        "priority": priority,
+        "lang": lang,
+        "det_mode": _det_mode(request.get("det_mode")),
+        "fast_path": _fast_path(fast_path),
+    }
+
+
+async def _ws_submit(session, job, image):
+    try:
+        session.submit(image=image, **job)
+    except SessionFullError as e:
+        await session.send(_ws_error(429, str(e), job["job_id"]))
+        return
+    except ValueError as e:
+        await session.send(_ws_error(409, str(e), job["job_id"]))
+        return
+    await session.send({"type": "queued", "id": job["job_id"], "page": job["page"], "queued": session.pending})
+
+
+def _ws_targets(request):
+    """Job ids and page a cancel/priority message applies to"""
+    ids = request.get("ids") or []
+    if not isinstance(ids, list) or not all(_ws_job_id(job_id) for job_id in ids):
+        raise HTTPException(status_code=400, detail="'ids' must be a list of string or integer ids")
+    if "id" in request:
+        if not _ws_job_id(request["id"]):
+            raise HTTPException(status_code=400, detail="'id' must be a string or integer")
+        ids = [*ids, request["id"]]
+    page = request.get("page")
+    if not ids and page is None:
+        raise HTTPException(status_code=400, detail="Give 'id', 'ids' or 'page'")
+    return ids, page
+
+
+@app.websocket("/ws")
+async def ocr_session(websocket: WebSocket):
+    """
+    Persistent OCR session: pipeline many jobs over one connection and get
+    each result as soon as it is ready, in completion order.
+    
+    Client messages (JSON text frames):
+        {"type": "ocr", "id": ..., "page": ..., "priority": 0, "lang": "japan",
+         "det_mode": ..., "fast_path": ..., "image": "<base64>"}
+            Queue a job. Without "image", the next binary frame is the image.
+            Higher priority runs first (e.g. the visible page above prefetches).
+        {"type": "cancel", "id"/"ids"/"page": ...}
+            Drop matching queued jobs before inference; running ones send no result.
+        {"type": "priority", "priority": n, "id"/"ids"/"page": ...}
+            Change the priority of matching queued jobs.
+        {"type": "stats"}
+    
+    Server messages: "queued" (job accepted), "result" (the /ocr response
+    fields plus id, page and server_timing), "error" (id, status, detail),
+    "cancelled" (dropped and running ids), "reprioritized" and "stats".
+    
+    Each connection runs OCR_WS_IN_FLIGHT jobs at a time and queues at most
+    OCR_WS_MAX_PENDING more.
+    """
+    await websocket.accept()
+    session = OcrSession(
+        _session_ocr,
+        websocket.send_json,
+        max_in_flight=settings.WS_IN_FLIGHT,
+        max_pending=settings.WS_MAX_PENDING,
+    )
+    # An 'ocr' message whose image arrives in the next binary frame
+    awaiting_image = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                if awaiting_image is None:
+                    await session.send(_ws_error(400, "Binary frame without a preceding 'ocr' message"))
+                else:
+                    await _ws_submit(session, awaiting_image, message["bytes"])
+                    awaiting_image = None
+                continue
+            
+            if awaiting_image is not None:
+                await session.send(_ws_error(400, "Expected the image as a binary frame", awaiting_image["job_id"]))
+                awaiting_image = None
+            try:
+                request = json.loads(message.get("text") or "")
+                if not isinstance(request, dict):
+                    raise ValueError("not an object")
+            except ValueError:
+                await session.send(_ws_error(400, "Messages must be JSON objects"))
+                continue
+            
+            kind = request.get("type")
+            try:
+                if kind == "ocr":
+                    job = _ws_ocr_job(request)
+                    if "image" not in request:
+                        awaiting_image = job
+                        continue
+                    try:
+                        image = base64.b64decode(request["image"], validate=True)
+                    except (binascii.Error, TypeError):
+                        raise HTTPException(status_code=400, detail="'image' is not valid base64")
+                    await _ws_submit(session, job, image)
+                elif kind == "cancel":
+                    dropped, running = session.cancel(*_ws_targets(request))
+                    if dropped or running:
+                        logger.info(f"Session cancelled {len(dropped)} queued and {len(running)} running jobs")
+                    await session.send({"type": "cancelled", "dropped": dropped, "running": running})
+                elif kind == "priority":
+                    priority = request.get("priority")
+                    if not isinstance(priority, int) or isinstance(priority, bool):
+                        raise HTTPException(status_code=400, detail="'priority' must be an integer")
+                    ids, page = _ws_targets(request)
+                    changed = session.reprioritize(priority, ids, page)
+                    await session.send({"type": "reprioritized", "ids": changed, "priority": priority})
+                elif kind == "stats":
+                    await session.send(dict(session.stats(), type="stats"))
+                else:
+                    raise HTTPException(status_code=400, detail=f"Unknown message type: {kind}")
+            except HTTPException as e:
+                job_id = request.get("id")
+                await session.send(_ws_error(e.status_code, e.detail, job_id if _ws_job_id(job_id) else None))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.close()
+
+
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="info")
+    
+    parser = argparse.ArgumentParser(description="PaddleOCR server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--preload", default=settings.PRELOAD,
+        help=f"Languages to load at startup, comma-separated, or 'none'; the rest "
+             f"load on first use (default: OCR_PRELOAD={settings.PRELOAD}; available: {', '.join(PIPELINE_CONFIGS)})",
+    )
+    parser.add_argument("--no-warmup", action="store_true", help="Load preloaded models without a warm-up predict")
+    parser.add_argument("--workers", type=int, default=settings.WORKERS, help="Server processes sharing the port (see workers.py)")
+    parser.add_argument("--threads", type=int, default=settings.THREADS, help="Intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--affinity", action="store_true", default=settings.CPU_AFFINITY, help="Pin each worker to its own cores")
+    args = parser.parse_args()
+    settings.PRELOAD = args.preload
+    if args.no_warmup:
+        settings.WARMUP = False
+    # Process pool workers read their settings from the environment
+    os.environ["OCR_PRELOAD"] = settings.PRELOAD
+    os.environ["OCR_WARMUP"] = "1" if settings.WARMUP else "0"
+    
+    if args.workers > 1:
+        import workers
+        threads = args.threads or max(1, len(workers.available_cpus()) // args.workers)
+        workers.serve(args.workers, threads, args.affinity, args.host, args.port, args.preload, not args.no_warmup)
+        raise SystemExit(0)
+    if args.threads:
+        # Paddle is imported with the first model load, so it still sees these
+        from workers import thread_budget_env
+        os.environ.update(thread_budget_env(args.threads))
+        settings.THREADS = args.threads
+        cv2.setNumThreads(args.threads)
+    
+    # log_config=None: uvicorn's loggers propagate to the queued root handler
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info", log_config=None)
 
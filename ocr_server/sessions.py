@@ -0,0 +1,169 @@
+"""
+Per-connection OCR sessions for the WebSocket endpoint.
+
+A viewer flipping pages sends OCR jobs faster than they finish, and most of
+them are stale by then. A session keeps the connection's jobs in its own
+priority queue and hands only `max_in_flight` of them at a time to the
+inference pool, so everything still queued can be reprioritized (the page on
+screen first, prefetched pages after) or cancelled before any inference is
+spent on it. Results are sent as each job finishes, in whatever order that is.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SessionFullError(Exception):
+    """Raised when a session already holds `max_pending` queued jobs"""
+
+
+class OcrSession:
+    """
+    Args:
+        process: `async process(job)` returning the result message fields for
+            a job dict (id, page, priority and the fields given to `submit`)
+        send: `async send(message)` delivering a JSON-able dict to the client
+        max_in_flight: Jobs of this session running at once; the rest wait
+            in the session queue where they can still be cancelled
+        max_pending: Queued jobs beyond this are refused with SessionFullError
+    """
+
+    def __init__(self, process, send, max_in_flight=1, max_pending=64):
+        self._process = process
+        self._send = send
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_pending = max(1, max_pending)
+        self._send_lock = asyncio.Lock()
+        # Heap of (-priority, sequence, job id); entries whose job was
+        # cancelled or reprioritized since are skipped when popped
+        self._queue = []
+        self._sequence = itertools.count()
+        self._queued = {}
+        self._running = {}
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    @property
+    def pending(self):
+        return len(self._queued)
+
+    def submit(self, job_id, page=None, priority=0, **fields):
+        """Queue a job; higher `priority` runs first, ties in submission order"""
+        if job_id in self._queued or job_id in self._running:
+            raise ValueError(f"Job id already in use: {job_id}")
+        if len(self._queued) >= self.max_pending:
+            raise SessionFullError(f"Session queue is full ({self.max_pending} jobs)")
+        job = dict(fields, id=job_id, page=page, priority=priority)
+        self._queued[job_id] = job
+        self._push(job)
+        self._dispatch()
+
+    def _push(self, job):
+        job['sequence'] = next(self._sequence)
+        heapq.heappush(self._queue, (-job['priority'], job['sequence'], job['id']))
+
+    def _matching(self, jobs, ids, page):
+        ids = set(ids or ())
+        return [
+            job_id for job_id, job in jobs.items()
+            if job_id in ids or (page is not None and job['page'] == page)
+        ]
+
+    def cancel(self, ids=None, page=None):
+        """
+        Cancel jobs by id and/or page. Queued jobs are dropped before they
+        reach inference; running ones stop being awaited and send no result
+        (inference already on a worker still finishes). Returns (dropped,
+        running) job ids.
+        """
+        dropped = self._matching(self._queued, ids, page)
+        for job_id in dropped:
+            del self._queued[job_id]
+        running = self._matching(self._running, ids, page)
+        for job_id in running:
+            self._running[job_id]['task'].cancel()
+        self.cancelled += len(dropped) + len(running)
+        return dropped, running
+
+    def reprioritize(self, priority, ids=None, page=None):
+        """Change the priority of queued jobs by id and/or page; returns their ids"""
+        changed = self._matching(self._queued, ids, page)
+        for job_id in changed:
+            job = self._queued[job_id]
+            job['priority'] = priority
+            self._push(job)
+        return changed
+
+    def _next_job(self):
+        while self._queue:
+            _, sequence, job_id = heapq.heappop(self._queue)
+            job = self._queued.get(job_id)
+            if job is not None and job['sequence'] == sequence:
+                return self._queued.pop(job_id)
+        return None
+
+    def _dispatch(self):
+        while len(self._running) < self.max_in_flight:
+            job = self._next_job()
+            if job is None:
+                return
+            job['task'] = asyncio.create_task(self._run(job))
+            # A callback rather than `finally`: a task cancelled before it
+            # starts never enters its coroutine
+            job['task'].add_done_callback(lambda _, job_id=job['id']: self._finished(job_id))
+            self._running[job['id']] = job
+
+    def _finished(self, job_id):
+        self._running.pop(job_id, None)
+        self._dispatch()
+
+    async def _run(self, job):
+        try:
+            fields = await self._process(job)
+            message = dict(fields, type='result', id=job['id'], page=job['page'])
+            self.completed += 1
+        except asyncio.CancelledError:
+            message = None
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Session job {job['id']} failed: {e}")
+            message = {
+                'type': 'error',
+                'id': job['id'],
+                'page': job['page'],
+                'status': getattr(e, 'status_code', 500),
+                'detail': getattr(e, 'detail', str(e)),
+            }
+        if message is not None:
+            try:
+                await self.send(message)
+            except Exception as e:
+                # The client went away; close() cleans up the rest
+                logger.debug(f"Could not send result of session job {job['id']}: {e}")
+
+    async def send(self, message):
+        """Send one message; concurrent jobs must not interleave their writes"""
+        async with self._send_lock:
+            await self._send(message)
+
+    def stats(self):
+        return {
+            'queued': len(self._queued),
+            'running': len(self._running),
+            'completed': self.completed,
+            'cancelled': self.cancelled,
+            'failed': self.failed,
+        }
+
+    async def close(self):
+        """Drop queued jobs and cancel running ones, e.g. when the client disconnects"""
+        self._queued.clear()
+        self._queue.clear()
+        tasks = [job['task'] for job in self._running.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,155 @@
+"""
+Server tunables, read from environment variables so they can be changed from
+the .bat launchers without editing code.
+"""
+import os
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def env_str(name, default):
+    value = os.environ.get(name)
+    return value if value not in (None, "") else default
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Model registry: how many language pipelines stay resident, and how long an
+# unused pipeline is kept before it is dropped (0 = no limit)
+MAX_MODELS = env_int("OCR_MAX_MODELS", 0)
+MODEL_IDLE_TIMEOUT = env_float("OCR_MODEL_IDLE_TIMEOUT", 0)
+
+# Inference pool: predict() runs on these workers instead of the event loop.
+# A PaddleOCR instance is not safe to call from several threads at once, so
+# more than one thread worker only helps with OCR_POOL_KIND=process, where
+# every worker process loads its own models.
+POOL_KIND = env_str("OCR_POOL_KIND", "thread")
+POOL_WORKERS = env_int("OCR_POOL_WORKERS", 1)
+POOL_QUEUE = env_int("OCR_POOL_QUEUE", 8)
+
+# Micro-batching: requests for the same model arriving within the window are
+# sent to predict() together, up to OCR_BATCH_MAX images per call
+BATCHING = env_bool("OCR_BATCHING", False)
+BATCH_WINDOW_MS = env_float("OCR_BATCH_WINDOW_MS", 10)
+BATCH_MAX = env_int("OCR_BATCH_MAX", 8)
+
+# OCR result cache: responses for identical uploads are served from memory
+# (OCR_CACHE_SIZE entries, 0 disables the cache) and optionally from a SQLite
+# file that survives restarts (OCR_CACHE_DB)
+CACHE_SIZE = env_int("OCR_CACHE_SIZE", 256)
+CACHE_DB = env_str("OCR_CACHE_DB", "")
+CACHE_DB_MAX = env_int("OCR_CACHE_DB_MAX", 10000)
+
+# Page endpoint: upper bound on overlay boxes per /ocr-page request
+PAGE_MAX_BOXES = env_int("OCR_PAGE_MAX_BOXES", 256)
+
+# Page detection index for /ocr-page (see page_index.py): the text lines
+# detected on the last OCR_PAGE_INDEX_SIZE pages (0 disables) are kept with
+# their readings, so moving or resizing boxes on a page seen before only
+# recognizes lines not read yet. A line belongs to a box when at least
+# OCR_PAGE_INDEX_MIN_OVERLAP of its area lies inside it. OCR_PAGE_INDEX_CELL
+# is the grid cell size in pixels. The index runs on the detection, line
+# orientation and recognition stage models, which are loaded and warmed at
+# startup next to the full pipelines; OCR_PAGE_INDEX_SIZE=0 saves that memory.
+PAGE_INDEX_SIZE = env_int("OCR_PAGE_INDEX_SIZE", 32)
+PAGE_INDEX_MIN_OVERLAP = env_float("OCR_PAGE_INDEX_MIN_OVERLAP", 0.5)
+PAGE_INDEX_CELL = env_int("OCR_PAGE_INDEX_CELL", 128)
+
+# Staged pipeline: line crops per recognition/orientation batch
+REC_BATCH_SIZE = env_int("OCR_REC_BATCH_SIZE", 8)
+
+# Chapter OCR jobs: manifests, results and uploaded pages live in OCR_JOBS_DIR.
+# When OCR_JOBS_LIBRARY_ROOT is set, directory jobs must point inside it.
+JOBS_DIR = env_str("OCR_JOBS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs"))
+JOBS_CONCURRENCY = env_int("OCR_JOBS_CONCURRENCY", 2)
+JOBS_LIBRARY_ROOT = env_str("OCR_JOBS_LIBRARY_ROOT", "")
+
+# WebSocket sessions (/ws): jobs of one connection running at once (the rest
+# wait in the session's priority queue, where they can still be cancelled or
+# reprioritized) and queued jobs allowed per connection
+WS_IN_FLIGHT = env_int("OCR_WS_IN_FLIGHT", 1)
+WS_MAX_PENDING = env_int("OCR_WS_MAX_PENDING", 64)
+
+# Detection mode. 'full' runs the PaddleOCR pipeline at full resolution;
+# 'adaptive' detects on a copy downscaled to OCR_DET_SIDE_LIMIT pixels on the
+# longer side and recognizes full-resolution crops. Requests can override it.
+DET_MODE = env_str("OCR_DET_MODE", "full")
+DET_SIDE_LIMIT = env_int("OCR_DET_SIDE_LIMIT", 1600)
+
+# Crop fast path for /ocr, /ocr-chinese, /ocr-raw and /ocr-page boxes (see
+# staged_pipeline.plan_crop): crops whose inner area has a grayscale standard
+# deviation below OCR_BLANK_STD are answered as empty without running a
+# model, document orientation is skipped when the longer side is under
+# OCR_DOC_ORI_MIN_SIDE, and crops OCR_SINGLE_LINE_ASPECT times longer than
+# they are thick, and at most OCR_SINGLE_LINE_MAX_THICKNESS pixels thick, go
+# straight to recognition as a single line. Requests can turn it off with
+# fast_path=false.
+CROP_FAST_PATH = env_bool("OCR_CROP_FAST_PATH", True)
+BLANK_STD = env_float("OCR_BLANK_STD", 4.0)
+DOC_ORI_MIN_SIDE = env_int("OCR_DOC_ORI_MIN_SIDE", 640)
+SINGLE_LINE_ASPECT = env_float("OCR_SINGLE_LINE_ASPECT", 3.5)
+SINGLE_LINE_MAX_THICKNESS = env_int("OCR_SINGLE_LINE_MAX_THICKNESS", 128)
+
+# Ingestion: uploads of at least this many bytes are memory-mapped from the
+# spooled temp file instead of read into memory (0 disables). OCR_PREPROCESS
+# upscales crops whose shorter side is below OCR_PREPROCESS_MIN_SIDE.
+UPLOAD_MMAP_THRESHOLD = env_int("OCR_UPLOAD_MMAP_THRESHOLD", 4 * 1024 * 1024)
+PREPROCESS = env_bool("OCR_PREPROCESS", False)
+PREPROCESS_MIN_SIDE = env_int("OCR_PREPROCESS_MIN_SIDE", 100)
+
+# Logging: records go through a queue and are written by a background thread.
+# OCR_LOG_LEVEL=DEBUG adds per-line results; OCR_LOG_FORMAT=json writes one
+# JSON object per record; OCR_LOG_FILE also writes to a file. Every
+# OCR_RESULT_SAMPLE_EVERY-th OCR result (0 = off) is dumped in full to
+# OCR_RESULT_SAMPLE_FILE as JSON lines.
+LOG_LEVEL = env_str("OCR_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = env_str("OCR_LOG_FORMAT", "text")
+LOG_FILE = env_str("OCR_LOG_FILE", "")
+RESULT_SAMPLE_EVERY = env_int("OCR_RESULT_SAMPLE_EVERY", 0)
+RESULT_SAMPLE_FILE = env_str("OCR_RESULT_SAMPLE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "results.jsonl"))
+
+# OCR engine. 'paddle' is PaddleOCR; 'onnx' runs the same models exported to
+# ONNX (see export_onnx.py) on ONNX Runtime's CPU provider, reading them from
+# OCR_ONNX_MODEL_DIR and preferring int8-quantized copies with OCR_ONNX_INT8;
+# 'fake' is the stand-in from benchmarks/fake_engine.py for load tests
+# without a PaddleOCR install. The fake engine costs OCR_FAKE_COST_MS per
+# image plus OCR_FAKE_COST_MS_PER_MP per megapixel and OCR_FAKE_LINE_COST_MS
+# per recognized line, spent sleeping (like native inference, which releases
+# the GIL) or, with OCR_FAKE_COST_MODE=cpu, spinning on the CPU while holding
+# the GIL.
+ENGINE = env_str("OCR_ENGINE", "paddle")
+FAKE_COST_MS = env_float("OCR_FAKE_COST_MS", 20)
+FAKE_COST_MS_PER_MP = env_float("OCR_FAKE_COST_MS_PER_MP", 40)
+FAKE_LINE_COST_MS = env_float("OCR_FAKE_LINE_COST_MS", 2)
+FAKE_COST_MODE = env_str("OCR_FAKE_COST_MODE", "sleep")
+FAKE_LINES = env_int("OCR_FAKE_LINES", 6)
+ONNX_MODEL_DIR = env_str("OCR_ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "onnx"))
+ONNX_INT8 = env_bool("OCR_ONNX_INT8", False)
+
+# Startup: language pipelines loaded in the background right after the server
+# binds (comma-separated, 'none' = all lazy), each followed by a warm-up
+# predict on a tiny image unless OCR_WARMUP is off. Languages not listed load
+# on their first request. `python server.py --preload` overrides this.
+PRELOAD = env_str("OCR_PRELOAD", "japan")
+WARMUP = env_bool("OCR_WARMUP", True)
+
+# Serving processes: OCR_WORKERS uvicorn processes share the listening socket
+# (see workers.py). Each gets OCR_THREADS intra-op threads for Paddle,
+# OpenMP/MKL and OpenCV (0 = library defaults) and, with OCR_CPU_AFFINITY,
+# its own set of cores.
+WORKERS = env_int("OCR_WORKERS", 1)
+THREADS = env_int("OCR_THREADS", 0)
+CPU_AFFINITY = env_bool("OCR_CPU_AFFINITY", False)
@@ -0,0 +1,355 @@
+"""
+Staged OCR pipeline: detection, orientation and recognition as separate steps.
+
+Each full PaddleOCR pipeline owns its own detection and orientation models, so
+running the Chinese pipeline and then the Japanese one on the same crop
+detects the text twice. Here document orientation and text detection run
+once, and the detected line crops are fed to the recognizer of every
+requested language.
+"""
+import logging
+import time
+
+import cv2
+import numpy as np
+
+import settings
+from geometry import crop_quad, quad_bounds
+from pipelines import PREDICT_PARAMS, REC_MODELS, STAGE_MODELS, get_stage_model, warmup_image
+
+logger = logging.getLogger(__name__)
+
+# 'best': one text per line, from the language that scored it highest
+# 'both': additionally return every language's reading of each line
+MODES = ('best', 'both')
+
+# Stage names, as reported in `timings` and `skipped_stages`
+STAGES = ('doc_ori', 'det', 'textline_ori', 'rec')
+
+# Pixels sampled per side by the blank check
+_BLANK_SAMPLE = 256
+
+
+def empty_result(langs, mode='best'):
+    """A result with no lines"""
+    result = {
+        'rec_texts': [],
+        'rec_scores': [],
+        'rec_polys': np.zeros((0, 4, 2), dtype=np.float32),
+        'rec_boxes': np.zeros((0, 4), dtype=np.float32),
+        'rec_langs': [],
+    }
+    if mode == 'both':
+        result['alternatives'] = {lang: {'rec_texts': [], 'rec_scores': []} for lang in langs}
+    return result
+
+
+def plan_crop(img, params=None):
+    """
+    Decide, from the pixels alone, which stages a bubble crop can skip.
+
+    - blank: the inner area has a grayscale standard deviation below
+      OCR_BLANK_STD; nothing needs to run. The 20% margin left out holds the
+      outline of a bubble drawn edge to edge.
+    - document orientation: skipped when the longer side is below
+      OCR_DOC_ORI_MIN_SIDE
+    - single line: a crop OCR_SINGLE_LINE_ASPECT times taller than wide (or
+      wider than tall) and at most OCR_SINGLE_LINE_MAX_THICKNESS pixels
+      across its short side is one line; detection and line orientation are
+      skipped and the whole crop goes to recognition. The thickness cap keeps
+      tall pages and multi-column strips out.
+
+    Returns a dict with `blank`, `single_line` and `skipped_stages`, the
+    stages `params` would have run that can be skipped.
+    """
+    params = PREDICT_PARAMS if params is None else params
+    h, w = img.shape[:2]
+    enabled = [
+        stage for stage, switch in (
+            ('doc_ori', 'use_doc_orientation_classify'),
+            ('det', None),
+            ('textline_ori', 'use_textline_orientation'),
+            ('rec', None),
+        )
+        if switch is None or params.get(switch)
+    ]
+
+    step = max(1, max(h, w) // _BLANK_SAMPLE)
+    inner = img[h // 5:h - h // 5:step, w // 5:w - w // 5:step]
+    if inner.ndim == 3:
+        inner = inner.mean(axis=2)
+    if inner.size == 0 or float(inner.std()) < settings.BLANK_STD:
+        return {'blank': True, 'single_line': False, 'skipped_stages': enabled}
+
+    skipped = set()
+    if max(h, w) < settings.DOC_ORI_MIN_SIDE:
+        skipped.add('doc_ori')
+    single_line = (
+        min(h, w) <= settings.SINGLE_LINE_MAX_THICKNESS
+        and max(h, w) >= settings.SINGLE_LINE_ASPECT * max(1, min(h, w))
+    )
+    if single_line:
+        skipped.update(('doc_ori', 'det', 'textline_ori'))
+    return {
+        'blank': False,
+        'single_line': single_line,
+        'skipped_stages': [stage for stage in enabled if stage in skipped],
+    }
+
+
+def stages_in_use():
+    """Stage models the settings make requests run, besides the full pipelines"""
+    stages = set()
+    if settings.DET_MODE == 'adaptive':
+        stages.update(STAGES)
+    if settings.CROP_FAST_PATH:
+        # Single-line crops go straight to the recognizer
+        stages.add('rec')
+    if settings.PAGE_INDEX_SIZE > 0:
+        # /ocr-page detects whole pages and recognizes their lines
+        stages.update(('det', 'rec'))
+        if PREDICT_PARAMS.get('use_textline_orientation'):
+            stages.add('textline_ori')
+    return stages
+
+
+def warm_up_stages(langs, predict=True):
+    """
+    Load the stage models in use (see `stages_in_use`), the recognizers of
+    `langs` among them, and with `predict` run each once on a tiny image.
+    Returns the seconds spent per model.
+    """
+    stages = stages_in_use()
+    models = [(stage, STAGE_MODELS[stage]) for stage in STAGES if stage in stages and stage != 'rec']
+    if 'rec' in stages:
+        models += [('rec', name) for name in dict.fromkeys(REC_MODELS[lang] for lang in langs)]
+    img = warmup_image()
+    seconds = {}
+    for stage, model_name in models:
+        start = time.perf_counter()
+        model = get_stage_model(stage, model_name)
+        if predict:
+            if stage in ('doc_ori', 'det'):
+                model.predict(img)
+            else:
+                model.predict([img], batch_size=1)
+        seconds[f"{stage}:{model_name}"] = round(time.perf_counter() - start, 3)
+    return seconds
+
+
+class StagedPipeline:
+    """
+    Args:
+        get_model: `get_model(stage, model_name=None)` returning a warm stage
+            model; defaults to the shared registry
+    """
+
+    def __init__(self, get_model=get_stage_model):
+        self._get_model = get_model
+
+    def classify_document(self, img):
+        """Clockwise rotation of the whole image in degrees (0, 90, 180 or 270)"""
+        result = self._get_model('doc_ori').predict(img)[0]
+        labels = result.get('label_names') or ['0']
+        return int(labels[0])
+
+    def detect(self, img, params, side_limit=None):
+        """
+        Text line quads (N, 4, 2) and their detection scores.
+
+        With `side_limit`, pages whose longer side exceeds it are detected on a
+        downscaled copy and the quads are mapped back to full-resolution
+        coordinates, so only recognition sees the full-resolution pixels.
+        """
+        scale = 1.0
+        det_img = img
+        longest = max(img.shape[:2])
+        if side_limit and longest > side_limit:
+            scale = side_limit / float(longest)
+            det_img = cv2.resize(
+                img,
+                (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale))),
+                interpolation=cv2.INTER_AREA,
+            )
+            # The copy is already at the limit; don't let the detector resize it again
+            params = dict(params, text_det_limit_side_len=side_limit, text_det_limit_type='max')
+
+        result = self._get_model('det').predict(
+            det_img,
+            limit_side_len=params.get('text_det_limit_side_len'),
+            limit_type=params.get('text_det_limit_type'),
+            thresh=params.get('text_det_thresh'),
+            box_thresh=params.get('text_det_box_thresh'),
+            unclip_ratio=params.get('text_det_unclip_ratio'),
+        )[0]
+        polys = np.asarray(result.get('dt_polys', []), dtype=np.float32).reshape(-1, 4, 2)
+        scores = np.asarray(result.get('dt_scores', []), dtype=np.float32)
+        if scale != 1.0:
+            polys = polys / scale
+        return polys, scores
+
+    def classify_lines(self, crops):
+        """Turn upside-down line crops the right way up"""
+        results = self._get_model('textline_ori').predict(crops, batch_size=settings.REC_BATCH_SIZE)
+        fixed = []
+        for crop, result in zip(crops, results):
+            labels = result.get('label_names') or ['0_degree']
+            fixed.append(np.ascontiguousarray(crop[::-1, ::-1]) if labels[0].startswith('180') else crop)
+        return fixed
+
+    def recognize(self, crops, lang):
+        """Recognize line crops with the `lang` model. Returns (texts, scores)."""
+        rec = self._get_model('rec', REC_MODELS[lang])
+        results = rec.predict(crops, batch_size=settings.REC_BATCH_SIZE)
+        texts = [str(result.get('rec_text') or '').strip() for result in results]
+        scores = [float(result.get('rec_score') or 0.0) for result in results]
+        return texts, scores
+
+    def run(self, img, langs, mode='best', params=None, det_side_limit=None, single_line=False):
+        """
+        Detect once, recognize with every language in `langs`.
+
+        `det_side_limit` enables downscaled detection for oversized pages
+        (see `detect`). With `single_line` the whole image is one text line:
+        orientation and detection are skipped and it goes straight to
+        recognition (see `plan_crop`).
+
+        Returns a dict shaped like a PaddleOCR predict() result (rec_texts,
+        rec_scores, rec_polys, rec_boxes) plus `rec_langs`, the language
+        picked for each line, `timings` with the seconds spent in each stage,
+        and in 'both' mode `alternatives` with every language's texts and
+        scores for the same lines.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        unknown = [lang for lang in langs if lang not in REC_MODELS]
+        if unknown or not langs:
+            raise ValueError(f"Unsupported OCR languages: {unknown or langs}")
+        params = PREDICT_PARAMS if params is None else params
+        timings = {}
+        started = time.perf_counter()
+
+        def lap(stage):
+            nonlocal started
+            now = time.perf_counter()
+            timings[stage] = timings.get(stage, 0.0) + now - started
+            started = now
+
+        if single_line:
+            h, w = img.shape[:2]
+            polys = np.array([[[0, 0], [w, 0], [w, h], [0, h]]], dtype=np.float32)
+            crops = [crop_quad(img, polys[0])]
+            lap('crop')
+            result = self._read_lines(polys, crops, langs, mode, params)
+            lap('rec')
+            return dict(result, timings=timings)
+
+        if params.get('use_doc_orientation_classify'):
+            angle = self.classify_document(img)
+            if angle:
+                # np.rot90 turns counter-clockwise, undoing a clockwise rotation
+                img = np.ascontiguousarray(np.rot90(img, k=angle // 90))
+            lap('doc_ori')
+
+        polys, _ = self.detect(img, params, side_limit=det_side_limit)
+        lap('det')
+        if len(polys) == 0:
+            return dict(empty_result(langs, mode), timings=timings)
+
+        # Top-to-bottom, then left-to-right, like the full pipeline
+        bounds = quad_bounds(polys)
+        order = np.lexsort((bounds[:, 0], bounds[:, 1]))
+        polys = polys[order]
+
+        crops = [crop_quad(img, poly) for poly in polys]
+        valid = [i for i, crop in enumerate(crops) if crop is not None]
+        polys = polys[valid]
+        crops = [crops[i] for i in valid]
+        lap('crop')
+        if not crops:
+            return dict(empty_result(langs, mode), timings=timings)
+        if params.get('use_textline_orientation'):
+            crops = self.classify_lines(crops)
+            lap('textline_ori')
+        result = self._read_lines(polys, crops, langs, mode, params)
+        lap('rec')
+        return dict(result, timings=timings)
+
+    def read_quads(self, img, polys, lang, params=None):
+        """
+        Recognize the given text line quads of `img` with the `lang` model,
+        turning upside-down lines first when the params enable it. Returns
+        (texts, scores) per quad; quads too small to crop read as ''.
+        """
+        params = PREDICT_PARAMS if params is None else params
+        texts = [''] * len(polys)
+        scores = [0.0] * len(polys)
+        crops = [crop_quad(img, poly) for poly in polys]
+        valid = [i for i, crop in enumerate(crops) if crop is not None]
+        crops = [crops[i] for i in valid]
+        if not crops:
+            return texts, scores
+        if params.get('use_textline_orientation'):
+            crops = self.classify_lines(crops)
+        read_texts, read_scores = self.recognize(crops, lang)
+        for i, text, score in zip(valid, read_texts, read_scores):
+            texts[i] = text
+            scores[i] = score
+        return texts, scores
+
+    def _read_lines(self, polys, crops, langs, mode, params):
+        """Recognize the line crops with every language and keep the best reading of each"""
+        # Languages sharing a recognition model are recognized once
+        by_model = {}
+        readings = {}
+        for lang in langs:
+            model_name = REC_MODELS[lang]
+            if model_name not in by_model:
+                by_model[model_name] = self.recognize(crops, lang)
+            readings[lang] = by_model[model_name]
+
+        scores = np.array([readings[lang][1] for lang in langs], dtype=np.float32)
+        best = scores.argmax(axis=0)
+        best_scores = scores[best, np.arange(scores.shape[1])]
+        texts = [readings[langs[b]][0][i] for i, b in enumerate(best)]
+
+        keep = [
+            i for i, text in enumerate(texts)
+            if text and best_scores[i] >= params.get('text_rec_score_thresh', 0.0)
+        ]
+        kept_polys = polys[keep]
+        result = {
+            'rec_texts': [texts[i] for i in keep],
+            'rec_scores': [float(best_scores[i]) for i in keep],
+            'rec_polys': kept_polys,
+            'rec_boxes': quad_bounds(kept_polys),
+            'rec_langs': [langs[best[i]] for i in keep],
+        }
+        if mode == 'both':
+            result['alternatives'] = {
+                lang: {
+                    'rec_texts': [readings[lang][0][i] for i in keep],
+                    'rec_scores': [readings[lang][1][i] for i in keep],
+                }
+                for lang in langs
+            }
+        return result
+
+
+staged = StagedPipeline()
+
+
+def run_staged(image, langs, mode='best', params=None, det_side_limit=None, single_line=False):
+    """Module-level entry point so inference pools can pickle it"""
+    return staged.run(image, list(langs), mode, params, det_side_limit, single_line)
+
+
+def detect_page(image, params=None, det_side_limit=None):
+    """Text line quads of a whole page, no orientation or recognition (see StagedPipeline.detect)"""
+    params = PREDICT_PARAMS if params is None else params
+    return staged.detect(image, params, side_limit=det_side_limit)[0]
+
+
+def read_quads(image, polys, lang, params=None):
+    """Module-level StagedPipeline.read_quads for the inference pools"""
+    return staged.read_quads(image, polys, lang, params)
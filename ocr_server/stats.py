@@ -0,0 +1,87 @@
+"""
+Small in-process statistics helpers for the /stats endpoint.
+"""
+import threading
+import time
+from collections import deque
+
+
+class RollingWindow:
+    """
+    Keep the most recent `size` samples (e.g. latencies in seconds) and report
+    percentiles over them. Safe to update from worker threads.
+    """
+
+    def __init__(self, size=1000):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        with self._lock:
+            self._samples.append(value)
+            self.count += 1
+            self.total += value
+
+    def percentile(self, p):
+        """Nearest-rank percentile over the window, p in [0, 100]"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, max(0, int(round(p / 100.0 * len(samples))) - 1))
+        return samples[index]
+
+    def mean(self):
+        with self._lock:
+            return sum(self._samples) / len(self._samples) if self._samples else 0.0
+
+    def summary(self, scale=1000.0, digits=2):
+        """Count plus mean/p50/p95/p99/max, scaled (default: seconds -> ms)"""
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+        def pick(p):
+            index = min(len(samples) - 1, max(0, int(round(p / 100.0 * len(samples))) - 1))
+            return round(samples[index] * scale, digits)
+
+        return {
+            "count": count,
+            "mean": round(sum(samples) / len(samples) * scale, digits),
+            "p50": pick(50),
+            "p95": pick(95),
+            "p99": pick(99),
+            "max": round(samples[-1] * scale, digits),
+        }
+
+
+class ThroughputMeter:
+    """Completions per second over a sliding time window"""
+
+    def __init__(self, window_seconds=60.0):
+        self._window = window_seconds
+        self._stamps = deque()
+        self._lock = threading.Lock()
+
+    def mark(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._stamps.append(now)
+            self._trim(now)
+
+    def rate(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if not self._stamps:
+                return 0.0
+            span = max(now - self._stamps[0], 1e-3)
+            return len(self._stamps) / min(span, self._window)
+
+    def _trim(self, now):
+        while self._stamps and now - self._stamps[0] > self._window:
+            self._stamps.popleft()
@@ -0,0 +1,35 @@
+"""
+Test setup: the server modules are imported by plain name from ocr_server/,
+and anything that needs models runs on the fake engine.
+
+    cd ocr_server && python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Read by settings at import time, so set before any server module is imported
+os.environ.setdefault("OCR_ENGINE", "fake")
+os.environ.setdefault("OCR_PRELOAD", "none")
+os.environ.setdefault("OCR_FAKE_COST_MS", "0")
+os.environ.setdefault("OCR_FAKE_COST_MS_PER_MP", "0")
+os.environ.setdefault("OCR_FAKE_LINE_COST_MS", "0")
+os.environ.setdefault("OCR_JOBS_DIR", tempfile.mkdtemp(prefix="ocr-test-jobs-"))
+
+
+@pytest.fixture(scope='session')
+def client():
+    """
+    One test client for the whole run: leaving it runs the server's shutdown,
+    which closes the module-level inference pool for good
+    """
+    from fastapi.testclient import TestClient
+
+    import server
+
+    with TestClient(server.app) as client:
+        yield client
@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+
+from staged_pipeline import plan_crop
+
+
+def text_image(height, width):
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.line(img, (width // 2, height // 10), (width // 2, height - height // 10), (0, 0, 0), max(2, width // 20))
+    cv2.line(img, (width // 10, height // 2), (width - width // 10, height // 2), (0, 0, 0), max(2, height // 20))
+    return img
+
+
+def test_blank_crop():
+    plan = plan_crop(np.full((200, 120, 3), 255, dtype=np.uint8))
+    assert plan['blank'] and plan['skipped_stages'] == ['doc_ori', 'det', 'textline_ori', 'rec']
+
+
+def test_thin_strip_is_a_single_line():
+    plan = plan_crop(text_image(400, 48))
+    assert plan['single_line']
+    assert plan['skipped_stages'] == ['doc_ori', 'det', 'textline_ori']
+
+
+def test_tall_page_is_not_a_single_line():
+    # Tall enough for the aspect ratio, far too thick for one line
+    plan = plan_crop(text_image(3600, 800))
+    assert not plan['blank'] and not plan['single_line']
+    assert plan['skipped_stages'] == []
+
+
+def test_small_crop_skips_document_orientation():
+    plan = plan_crop(text_image(200, 150))
+    assert not plan['single_line']
+    assert plan['skipped_stages'] == ['doc_ori']
+
+
+def test_tall_page_runs_detection_on_ocr(client):
+    data = cv2.imencode('.png', text_image(3600, 800))[1].tobytes()
+    response = client.post('/ocr', files={'file': ('page.png', data, 'image/png')})
+    assert response.status_code == 200, response.text
+    assert 'det' not in response.json()['skipped_stages']
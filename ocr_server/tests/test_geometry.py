@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import pytest
+
+from geometry import box_affine, box_polygon, crop_box, crop_to_page
+
+
+@pytest.mark.parametrize('rotation', [0.0, 30.0, -90.0, 135.0])
+def test_affine_round_trip(rotation):
+    matrix = box_affine(120.0, 80.0, 60.0, 40.0, rotation)
+    corners = np.array([[0, 0], [60, 0], [60, 40], [0, 40], [30, 20]], dtype=np.float64)
+    page = crop_to_page(corners, matrix)
+    back = page @ matrix[:, :2].T + matrix[:, 2]
+    np.testing.assert_allclose(back, corners, atol=1e-6)
+
+
+def test_box_polygon_rotates_around_the_centre():
+    np.testing.assert_allclose(box_polygon(10, 20, 30, 40), [[10, 20], [40, 20], [40, 60], [10, 60]], atol=1e-6)
+    # Clockwise by 90 degrees on screen: the top-left corner ends up top-right
+    polygon = box_polygon(0, 0, 40, 20, 90)
+    np.testing.assert_allclose(polygon.mean(axis=0), [20, 10], atol=1e-6)
+    np.testing.assert_allclose(polygon[0], [30, -10], atol=1e-6)
+
+
+def test_crop_box():
+    img = np.arange(100 * 80 * 3, dtype=np.uint8).reshape(100, 80, 3)
+    crop = crop_box(img, 10, 20, 30, 40)
+    assert crop.shape == (40, 30, 3)
+    np.testing.assert_array_equal(crop, img[20:60, 10:40])
+    assert crop_box(img, 10, 20, 30, 40, 45).shape == (40, 30, 3)
+    assert crop_box(img, 10, 20, 0, 40) is None
+
+
+def test_parse_page_boxes():
+    from fastapi import HTTPException
+
+    from server import _parse_page_boxes
+
+    boxes = _parse_page_boxes(json.dumps([{'x': 0.5, 'y': 0.25, 'width': 0.1, 'height': 0.5, 'overlay_id': 'a'}]), (200, 100, 3), True)
+    assert boxes == [{'id': 'a', 'x': 50, 'y': 50, 'width': 10, 'height': 100, 'rotation': 0.0}]
+
+    for box in (
+        {'x': float('nan'), 'y': 0, 'width': 10, 'height': 10},
+        {'x': 0, 'y': 0, 'width': 'inf', 'height': 10},
+        {'x': 0, 'y': 0, 'width': 10, 'height': 10, 'rotation': 'nan'},
+        {'x': 0, 'y': 0, 'width': 1e9, 'height': 10},
+        {'x': 0, 'y': 0, 'width': 0, 'height': 10},
+        {'x': 50, 'y': 50, 'width': 10, 'height': -20},
+        {'x': 0, 'y': 0, 'width': 10},
+    ):
+        with pytest.raises(HTTPException) as error:
+            _parse_page_boxes(json.dumps([box]), (200, 100, 3), False)
+        assert error.value.status_code == 400
+    # Up to the page diagonal is allowed, for rotated boxes
+    assert _parse_page_boxes(json.dumps([{'x': 0, 'y': 0, 'width': 220, 'height': 10, 'rotation': 60}]), (200, 100, 3), False)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from ingest import RAW_HEADER, RAW_MAGIC, RAW_ORDER_BGR, RAW_ORDER_RGB, parse_raw_image
+
+
+def raw(pixels, order=RAW_ORDER_BGR, magic=RAW_MAGIC, channels=None, width=None, height=None):
+    h, w = pixels.shape[:2]
+    c = pixels.shape[2] if pixels.ndim == 3 else 1
+    header = RAW_HEADER.pack(magic, w if width is None else width, h if height is None else height, c if channels is None else channels, order)
+    return header + pixels.tobytes()
+
+
+def test_bgr_is_a_view_of_the_buffer():
+    pixels = np.arange(4 * 5 * 3, dtype=np.uint8).reshape(4, 5, 3)
+    img = parse_raw_image(raw(pixels))
+    np.testing.assert_array_equal(img, pixels)
+    assert not img.flags.owndata
+
+
+@pytest.mark.parametrize('channels', [1, 3, 4])
+def test_every_layout_becomes_bgr(channels):
+    bgr = np.zeros((2, 3, 3), dtype=np.uint8)
+    bgr[..., 0], bgr[..., 1], bgr[..., 2] = 10, 20, 30
+    if channels == 1:
+        pixels, order, expected = np.full((2, 3), 7, dtype=np.uint8), RAW_ORDER_BGR, np.full((2, 3, 3), 7)
+    elif channels == 3:
+        pixels, order, expected = bgr[..., ::-1].copy(), RAW_ORDER_RGB, bgr
+    else:
+        pixels, order, expected = np.dstack([bgr[..., ::-1], np.full((2, 3), 255, np.uint8)]), RAW_ORDER_RGB, bgr
+    img = parse_raw_image(raw(pixels, order))
+    assert img.shape == (2, 3, 3)
+    np.testing.assert_array_equal(img, expected)
+
+
+@pytest.mark.parametrize('buffer', [
+    b'QRAW',
+    raw(np.zeros((2, 2, 3), np.uint8), magic=b'XXXX'),
+    raw(np.zeros((2, 2, 3), np.uint8), channels=2),
+    raw(np.zeros((2, 2, 3), np.uint8), order=5),
+    raw(np.zeros((2, 2, 3), np.uint8), width=0),
+    raw(np.zeros((2, 2, 3), np.uint8), width=100_000, height=100_000),
+    raw(np.zeros((2, 2, 3), np.uint8), width=3),
+    raw(np.zeros((2, 2, 3), np.uint8))[:-1],
+])
+def test_invalid_headers_and_sizes(buffer):
+    with pytest.raises(ValueError):
+        parse_raw_image(buffer)
@@ -0,0 +1,71 @@
+import asyncio
+
+import cv2
+import numpy as np
+
+from jobs import JobManager
+
+
+def write_pages(directory, names):
+    img = np.full((32, 32, 3), 255, dtype=np.uint8)
+    for name in names:
+        cv2.imwrite(str(directory / name), img)
+
+
+def drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+def test_job_cancelled_before_it_starts_ends_its_streams(tmp_path):
+    async def test():
+        pages = tmp_path / 'chapter'
+        pages.mkdir()
+        write_pages(pages, ['1.png'])
+
+        async def process_page(img, lang):
+            return {'text': 'x'}
+
+        manager = JobManager(str(tmp_path / 'jobs'), process_page)
+        job = await manager.create_for_directory(str(pages), 'japan')
+        queue = job.subscribe()
+        manager.cancel(job)
+        await asyncio.gather(job.task, return_exceptions=True)
+        await asyncio.sleep(0)
+        events = drain(queue)
+        assert [event['event'] for event in events] == ['end']
+        assert events[0]['status'] == job.status == 'cancelled'
+    asyncio.run(test())
+
+
+def test_restart_for_new_pages_keeps_streams_open(tmp_path):
+    async def test():
+        pages = tmp_path / 'chapter'
+        pages.mkdir()
+        write_pages(pages, ['2.png', '4.png'])
+        release = asyncio.Event()
+
+        async def process_page(img, lang):
+            await release.wait()
+            return {'text': 'x'}
+
+        manager = JobManager(str(tmp_path / 'jobs'), process_page, concurrency=1)
+        job = await manager.create_for_directory(str(pages), 'japan')
+        queue = job.subscribe()
+        await asyncio.sleep(0.05)
+
+        write_pages(pages, ['1.png', '3.png'])
+        assert await manager.create_for_directory(str(pages), 'japan') is job
+        release.set()
+        await job.task
+        await asyncio.sleep(0)
+
+        events = [event['event'] for event in drain(queue)]
+        assert events.count('end') == 1 and events[-1] == 'end'
+        assert job.status == 'completed'
+        assert sorted((record['index'], record['page']) for record in job.results.values()) == [
+            (0, '1.png'), (1, '2.png'), (2, '3.png'), (3, '4.png'),
+        ]
+    asyncio.run(test())
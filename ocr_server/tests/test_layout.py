@@ -0,0 +1,56 @@
+import numpy as np
+
+from layout import analyze_layout
+
+
+def box(x1, y1, x2, y2):
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+
+def test_no_lines():
+    order, blocks = analyze_layout(0)
+    assert order.tolist() == []
+    assert blocks == []
+
+
+def test_without_geometry_keeps_recognition_order():
+    order, blocks = analyze_layout(3)
+    assert order.tolist() == [0, 1, 2]
+    assert [block['lines'] for block in blocks] == [[0, 1, 2]]
+
+
+def test_vertical_bubbles_read_right_to_left():
+    polys = np.array([
+        box(260, 100, 290, 400),  # 0: left bubble, left column
+        box(900, 100, 930, 400),  # 1: right bubble, right column
+        box(300, 100, 330, 400),  # 2: left bubble, right column
+        box(860, 100, 890, 350),  # 3: right bubble, left column
+    ], dtype=np.float32)
+    order, blocks = analyze_layout(4, polys=polys)
+    assert order.tolist() == [1, 3, 2, 0]
+    assert [block['lines'] for block in blocks] == [[1, 3], [2, 0]]
+    assert all(block['orientation'] == 'vertical' for block in blocks)
+    assert blocks[0]['polygon'] == box(860, 100, 930, 400)
+
+
+def test_lower_bubble_comes_after_the_row_above():
+    polys = np.array([
+        box(900, 600, 930, 900),  # 0: lower right
+        box(100, 100, 130, 400),  # 1: upper left
+        box(500, 100, 530, 400),  # 2: upper right
+    ], dtype=np.float32)
+    order, blocks = analyze_layout(3, polys=polys)
+    assert order.tolist() == [2, 1, 0]
+    assert len(blocks) == 3
+
+
+def test_horizontal_lines_read_top_to_bottom():
+    boxes = np.array([
+        [100, 160, 400, 190],  # 0: second row
+        [100, 100, 420, 130],  # 1: first row
+        [600, 700, 900, 730],  # 2: another bubble further down
+    ], dtype=np.float32)
+    order, blocks = analyze_layout(3, boxes=boxes)
+    assert order.tolist() == [1, 0, 2]
+    assert [block['lines'] for block in blocks] == [[1, 0], [2]]
+    assert blocks[0]['orientation'] == 'horizontal'
@@ -0,0 +1,133 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from page_index import LineGrid, PageIndex
+
+
+def quad(x1, y1, x2, y2):
+    return np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float64)
+
+
+@pytest.fixture
+def grid():
+    return LineGrid(np.array([
+        quad(10, 10, 50, 300),     # 0
+        quad(100, 10, 140, 300),   # 1
+        quad(600, 500, 640, 900),  # 2, several cells away
+    ]), cell=64)
+
+
+def test_query_by_overlap(grid):
+    assert grid.query(quad(0, 0, 60, 400)) == [0]
+    assert grid.query(quad(0, 0, 700, 1000)) == [0, 1, 2]
+    # Half of line 1 is inside: enough at 0.5, not at 0.75
+    assert grid.query(quad(0, 0, 120, 400)) == [0, 1]
+    assert grid.query(quad(0, 0, 120, 400), min_overlap=0.75) == [0]
+    assert grid.query(quad(300, 300, 400, 400)) == []
+
+
+def test_query_rotated_box(grid):
+    # Line 2 turned by 90 degrees around its centre still covers most of it
+    centre = np.array([620, 700])
+    rotated = (quad(600, 500, 640, 900) - centre) @ np.array([[0, 1], [-1, 0]]) + centre
+    assert grid.query(rotated, min_overlap=0.05) == [2]
+    assert grid.query(rotated) == []
+
+
+def test_query_clamps_huge_and_non_finite_boxes(grid):
+    assert grid.query(quad(-1e30, -1e30, 1e30, 1e30)) == [0, 1, 2]
+    assert grid.query(quad(np.nan, 0, 60, 400)) == []
+    assert grid.query(quad(-np.inf, 0, np.inf, 400)) == []
+    assert LineGrid(np.zeros((0, 4, 2))).query(quad(0, 0, 100, 100)) == []
+
+
+def test_page_index_lru_keeps_readings():
+    index = PageIndex(max_pages=2)
+    first = index.put('a', [quad(0, 0, 10, 10)])
+    first.store('rec', [0], ['text'], [0.9])
+    # A concurrent put of the same page keeps the existing entry
+    assert index.put('a', [quad(0, 0, 10, 10)]) is first
+    assert first.read('rec', [0]) == [(0, 'text', 0.9)]
+    assert first.unread([0], 'other-rec') == [0]
+
+    index.put('b', [])
+    index.get('a')
+    index.put('c', [])
+    assert index.get('b') is None
+    assert index.get('a') is first
+    assert index.stats()['evictions'] == 1
+
+
+def _page(seed):
+    from benchmarks.synthetic import make_page
+
+    img = make_page(seed=seed)[0]
+    return img.shape, cv2.imencode('.png', img)[1].tobytes()
+
+
+def _ocr_page(client, data, boxes, **fields):
+    response = client.post(
+        '/ocr-page',
+        files={'file': ('page.png', data, 'image/png')},
+        data={'boxes': json.dumps(boxes), **fields},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_box_edits_only_run_recognition(client):
+    (height, width, _), data = _page(seed=11)
+    whole = [{'x': 0, 'y': 0, 'width': width, 'height': height}]
+
+    first = _ocr_page(client, data, whole)
+    assert first['page_index']['cached'] is False
+    assert first['page_index']['recognized'] == first['page_index']['lines'] > 0
+    assert first['boxes'][0]['text']
+    assert 'det' not in first['boxes'][0]['skipped_stages']
+
+    # A box tightened around one line: no detection, no recognition
+    line = np.array(first['boxes'][0]['layout'][0]['lines'][0]['polygon'])
+    (x0, y0), (x1, y1) = line.min(axis=0), line.max(axis=0)
+    nudged = [{'x': x0 - 4, 'y': y0 - 4, 'width': x1 - x0 + 8, 'height': y1 - y0 + 8}]
+    second = _ocr_page(client, data, nudged)
+    assert second['page_index'] == {'cached': True, 'lines': first['page_index']['lines'], 'recognized': 0, 'reused': 1}
+    assert second['boxes'][0]['text'] == first['boxes'][0]['layout'][0]['lines'][0]['text']
+    assert {'det', 'rec'} <= set(second['boxes'][0]['skipped_stages'])
+
+
+def test_new_box_recognizes_only_unread_lines(client):
+    (height, width, _), data = _page(seed=12)
+    left = [{'x': 0, 'y': 0, 'width': width / 2, 'height': height}]
+    whole = [{'x': 0, 'y': 0, 'width': width, 'height': height}]
+
+    first = _ocr_page(client, data, left)
+    second = _ocr_page(client, data, whole)
+    assert second['page_index']['cached'] is True
+    assert second['page_index']['reused'] == first['page_index']['recognized']
+    assert second['page_index']['recognized'] == second['page_index']['lines'] - first['page_index']['recognized']
+
+
+def test_reuse_detection_off_crops_every_box(client):
+    (height, width, _), data = _page(seed=13)
+    result = _ocr_page(client, data, [{'x': 0, 'y': 0, 'width': width, 'height': height}], reuse_detection='false')
+    assert 'page_index' not in result
+    assert result['boxes'][0]['text']
+
+
+
+def test_index_stage_models_are_warmed(monkeypatch):
+    import settings
+    from staged_pipeline import stages_in_use, warm_up_stages
+
+    monkeypatch.setattr(settings, 'DET_MODE', 'full')
+    monkeypatch.setattr(settings, 'CROP_FAST_PATH', False)
+    monkeypatch.setattr(settings, 'PAGE_INDEX_SIZE', 0)
+    assert stages_in_use() == set()
+    monkeypatch.setattr(settings, 'PAGE_INDEX_SIZE', 32)
+    assert stages_in_use() == {'det', 'textline_ori', 'rec'}
+    assert sorted(warm_up_stages(['japan', 'ch'])) == [
+        'det:PP-OCRv5_server_det', 'rec:PP-OCRv5_server_rec', 'textline_ori:PP-LCNet_x1_0_textline_ori',
+    ]
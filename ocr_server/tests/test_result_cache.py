@@ -0,0 +1,50 @@
+from result_cache import ResultCache, make_key
+
+
+def test_key_depends_on_bytes_lang_and_params():
+    key = make_key(b'image', 'japan', {'a': 1, 'b': 2})
+    assert key == make_key(b'image', 'japan', {'b': 2, 'a': 1})
+    assert key != make_key(b'other', 'japan', {'a': 1, 'b': 2})
+    assert key != make_key(b'image', 'ch', {'a': 1, 'b': 2})
+    assert key != make_key(b'image', 'japan', {'a': 1, 'b': 3})
+
+
+def test_memory_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    cache.put('a', {'text': 'a'})
+    cache.put('b', {'text': 'b'})
+    assert cache.get('a') == {'text': 'a'}
+    cache.put('c', {'text': 'c'})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'text': 'a'}
+    assert cache.get('c') == {'text': 'c'}
+    stats = cache.stats()
+    assert (stats['entries'], stats['evictions_memory'], stats['hits_memory'], stats['misses']) == (2, 1, 3, 1)
+
+
+def test_lookup_hashes_the_upload():
+    cache = ResultCache()
+    key, value = cache.lookup(b'image', 'japan', {})
+    assert value is None
+    cache.put(key, {'text': 'x'})
+    assert cache.lookup(b'image', 'japan', {}) == (key, {'text': 'x'})
+
+
+def test_sqlite_tier_survives_restarts_and_evicts_least_recently_used(tmp_path):
+    db = str(tmp_path / 'cache.db')
+    cache = ResultCache(max_entries=1, db_path=db, max_disk_entries=2)
+    cache.put('a', {'text': 'a'})
+    cache.put('b', {'text': 'b'})
+    # From disk, which also marks 'a' as recently used
+    assert cache.get('a') == {'text': 'a'}
+    assert cache.stats()['hits_disk'] == 1
+    cache.put('c', {'text': 'c'})
+    assert cache.stats()['evictions_disk'] == 1
+    cache.close()
+
+    reopened = ResultCache(max_entries=4, db_path=db, max_disk_entries=2)
+    assert reopened.get('b') is None
+    assert reopened.get('a') == {'text': 'a'}
+    assert reopened.get('c') == {'text': 'c'}
+    assert reopened.stats()['disk_entries'] == 2
+    reopened.close()
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from sessions import OcrSession, SessionFullError
+
+
+class Recorder:
+    """process/send pair for a session: jobs block until released"""
+
+    def __init__(self):
+        self.started = []
+        self.sent = []
+        self.release = {}
+
+    async def process(self, job):
+        self.started.append(job['id'])
+        self.release[job['id']] = asyncio.Event()
+        await self.release[job['id']].wait()
+        if job.get('fail'):
+            raise ValueError('bad image')
+        return {'text': f"text {job['id']}"}
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def finish(self, job_id):
+        """Let a running job finish and the session dispatch the next one"""
+        self.release[job_id].set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+
+def run(test):
+    return asyncio.run(test())
+
+
+def test_jobs_run_by_priority_then_submission_order():
+    async def test():
+        recorder = Recorder()
+        session = OcrSession(recorder.process, recorder.send)
+        session.submit('a', page=1)
+        session.submit('b', page=2)
+        session.submit('c', page=3, priority=5)
+        session.submit('d', page=4, priority=5)
+        await asyncio.sleep(0)
+        for job_id in ('a', 'c', 'd', 'b'):
+            await recorder.finish(job_id)
+        assert recorder.started == ['a', 'c', 'd', 'b']
+        assert [m['id'] for m in recorder.sent] == ['a', 'c', 'd', 'b']
+        assert recorder.sent[0] == {'text': 'text a', 'type': 'result', 'id': 'a', 'page': 1}
+        assert session.stats()['completed'] == 4
+    run(test)
+
+
+def test_reprioritize_queued_jobs():
+    async def test():
+        recorder = Recorder()
+        session = OcrSession(recorder.process, recorder.send)
+        for job_id in ('a', 'b', 'c'):
+            session.submit(job_id, page=job_id)
+        await asyncio.sleep(0)
+        assert session.reprioritize(9, page='c') == ['c']
+        for job_id in ('a', 'c', 'b'):
+            await recorder.finish(job_id)
+        assert recorder.started == ['a', 'c', 'b']
+    run(test)
+
+
+def test_cancel_queued_and_running_jobs():
+    async def test():
+        recorder = Recorder()
+        session = OcrSession(recorder.process, recorder.send)
+        session.submit('a', page=1)
+        session.submit('b', page=1)
+        session.submit('c', page=2)
+        await asyncio.sleep(0)
+        assert session.cancel(page=1) == (['b'], ['a'])
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # 'a' sends no result; 'b' never starts
+        await recorder.finish('c')
+        assert recorder.started == ['a', 'c']
+        assert [m['id'] for m in recorder.sent] == ['c']
+        assert session.stats() == {'queued': 0, 'running': 0, 'completed': 1, 'cancelled': 2, 'failed': 0}
+    run(test)
+
+
+def test_failures_are_reported_per_job():
+    async def test():
+        recorder = Recorder()
+        session = OcrSession(recorder.process, recorder.send)
+        session.submit('a', fail=True)
+        await asyncio.sleep(0)
+        await recorder.finish('a')
+        assert recorder.sent == [{'type': 'error', 'id': 'a', 'page': None, 'status': 500, 'detail': 'bad image'}]
+    run(test)
+
+
+def test_limits_and_duplicate_ids():
+    async def test():
+        recorder = Recorder()
+        session = OcrSession(recorder.process, recorder.send, max_in_flight=1, max_pending=2)
+        session.submit('a')
+        session.submit('b')
+        session.submit('c')
+        with pytest.raises(SessionFullError):
+            session.submit('d')
+        with pytest.raises(ValueError):
+            session.submit('a')
+        await session.close()
+        assert session.stats()['queued'] == 0
+        assert session.stats()['running'] == 0
+    run(test)
+
+
+def test_ws_rejects_malformed_ids(client):
+    with client.websocket_connect('/ws') as ws:
+        for message in ({'type': 'cancel', 'ids': [{}]}, {'type': 'cancel', 'ids': 'abc'}, {'type': 'priority', 'priority': 1, 'id': [1]}):
+            ws.send_json(message)
+            reply = ws.receive_json()
+            assert reply['type'] == 'error' and reply['status'] == 400
+        # The session survived
+        ws.send_json({'type': 'stats'})
+        assert ws.receive_json()['type'] == 'stats'
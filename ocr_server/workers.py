@@ -0,0 +1,315 @@
+"""
+Multi-process serving.
+
+One PaddleOCR process can't use a big machine well: concurrent requests
+either fight over the library's intra-op threads or leave cores idle. Here
+the supervisor binds the listening socket once and starts N worker
+processes that all accept from it, so the OS spreads connections across
+them. Each worker holds its own model registry, runs with a fixed thread
+budget (OMP/MKL/OpenBLAS, Paddle `cpu_threads`, OpenCV) and can be pinned to
+its own cores.
+
+    python workers.py serve --workers 4 --threads 8 --affinity
+    python workers.py autotune --engine fake
+
+`autotune` starts the server with several workers x threads splits of the
+machine's cores, drives each with the benchmark load generator and reports
+the split with the highest throughput.
+
+Every worker has its own in-memory state: the result cache memory tier,
+/metrics and /stats counters, and chapter jobs (a job is only visible on
+the worker that created it). Use a single worker for /jobs.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import settings
+from logging_setup import configure_logging
+
+logger = logging.getLogger(__name__)
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Thread-count variables read by OpenMP, MKL, OpenBLAS and numexpr at import time
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+def available_cpus():
+    """CPUs this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    try:
+        import psutil
+        return sorted(psutil.Process().cpu_affinity())
+    except (ImportError, AttributeError):
+        return list(range(os.cpu_count() or 1))
+
+
+def worker_cpus(index, threads, cpus=None):
+    """The `threads` CPUs of worker `index`, wrapping around when workers x threads exceeds the machine"""
+    cpus = cpus or available_cpus()
+    return [cpus[(index * threads + i) % len(cpus)] for i in range(min(threads, len(cpus)))]
+
+
+def pin_to_cpus(cpus):
+    """Restrict the current process to `cpus`; returns False where that is not supported"""
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+        return True
+    try:
+        import psutil
+        psutil.Process().cpu_affinity(cpus)
+        return True
+    except (ImportError, AttributeError):
+        return False
+
+
+def thread_budget_env(threads):
+    """
+    Environment limiting intra-op threads to `threads`. It has to be in place
+    before numpy/paddle are imported, so the supervisor sets it and the
+    workers inherit it.
+    """
+    env = {name: str(threads) for name in THREAD_ENV_VARS}
+    env['OCR_THREADS'] = str(threads)
+    return env
+
+
+def _worker_main(index, options, sockets):
+    """Entry point of a worker process"""
+    import cv2
+    import uvicorn
+
+    threads = options['threads']
+    if threads:
+        cv2.setNumThreads(threads)
+    cpus = None
+    if options['affinity'] and threads:
+        cpus = worker_cpus(index, threads, options['cpus'])
+        if not pin_to_cpus(cpus):
+            cpus = None
+
+    sys.path.insert(0, SERVER_DIR)
+    config = uvicorn.Config('server:app', host=options['host'], port=options['port'], log_level='info', log_config=None)
+    # Importing the app configures the queued logging
+    config.load()
+    logger.info(f"Worker {index} (pid {os.getpid()}): {threads or 'default'} threads, CPUs {cpus or 'any'}")
+    try:
+        uvicorn.Server(config).run(sockets=sockets)
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the whole process group; uvicorn has already shut down
+        pass
+
+
+def serve(workers, threads=0, affinity=False, host='127.0.0.1', port=8000, preload=None, warmup=True):
+    """Bind once, run `workers` worker processes and restart any that die until interrupted"""
+    import uvicorn
+
+    configure_logging(level=settings.LOG_LEVEL, fmt=settings.LOG_FORMAT)
+    config = uvicorn.Config('server:app', host=host, port=port)
+    sock = config.bind_socket()
+    # Spawned workers inherit the environment; settings are read from it on import
+    if threads:
+        os.environ.update(thread_budget_env(threads))
+    os.environ['OCR_PRELOAD'] = settings.PRELOAD if preload is None else preload
+    if not warmup:
+        os.environ['OCR_WARMUP'] = '0'
+    options = {
+        'threads': threads,
+        'affinity': affinity,
+        'cpus': available_cpus(),
+        'host': host,
+        'port': port,
+    }
+    context = multiprocessing.get_context('spawn')
+
+    def start(index):
+        process = context.Process(
+            target=_worker_main, args=(index, options, [sock]), name=f"ocr-worker-{index}", daemon=False,
+        )
+        process.start()
+        return process
+
+    logger.info(f"Starting {workers} workers on http://{host}:{port} ({threads or 'default'} threads each, affinity {'on' if affinity else 'off'})")
+    processes = [start(i) for i in range(workers)]
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while not stopping:
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.warning(f"Worker {i} exited with code {process.exitcode}, restarting it")
+                    processes[i] = start(i)
+            time.sleep(0.5)
+    finally:
+        logger.info("Stopping workers")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=15)
+            if process.is_alive():
+                process.kill()
+        sock.close()
+
+
+# -- auto-tuning ---------------------------------------------------------------
+
+
+def _children(pid):
+    """Every descendant pid of `pid`"""
+    try:
+        import psutil
+        return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+    except ImportError:
+        pass
+    except Exception:
+        return []
+    found = []
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", encoding='ascii') as f:
+            direct = [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+    for child in direct:
+        found.append(child)
+        found.extend(_children(child))
+    return found
+
+
+def _stop_tree(process):
+    """Stop the supervisor and, where signals don't reach them (Windows), its workers"""
+    children = _children(process.pid)
+    process.terminate()
+    try:
+        process.wait(timeout=20)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+
+def candidate_splits(cpus, max_workers=None):
+    """workers x threads splits that use all `cpus`: 1 x cpus, 2 x cpus/2, ... cpus x 1"""
+    splits = []
+    workers = 1
+    while workers <= cpus and (max_workers is None or workers <= max_workers):
+        splits.append((workers, max(1, cpus // workers)))
+        workers *= 2
+    return splits
+
+
+def autotune(splits, requests=200, concurrency_per_worker=2, engine=None, port=8780, affinity=True, images=None):
+    """Measure each (workers, threads) split with the load generator; returns the reports, fastest first"""
+    import asyncio
+    from benchmarks.loadgen import load_images, peak_rss_mb, run_load, wait_ready
+
+    images = load_images(images, 32, 0)
+    env = dict(os.environ, OCR_CACHE_SIZE='0')
+    if engine:
+        env['OCR_ENGINE'] = engine
+    reports = []
+    for workers, threads in splits:
+        command = [
+            sys.executable, os.path.join(SERVER_DIR, 'workers.py'), 'serve',
+            '--workers', str(workers), '--threads', str(threads), '--port', str(port),
+        ]
+        if affinity:
+            command.append('--affinity')
+        url = f"http://127.0.0.1:{port}"
+        print(f"workers={workers} threads={threads}: starting", file=sys.stderr)
+        process = subprocess.Popen(command, cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(url, process)
+            # Each worker answers /ready on its own; warm the others with a burst first
+            concurrency = workers * concurrency_per_worker
+            report = asyncio.run(run_load(
+                url, ['/ocr'], images, concurrency, requests, warmup=concurrency * 2,
+            ))
+            rss = [peak_rss_mb(pid) for pid in _children(process.pid)]
+            report['peak_rss_mb'] = round(sum(value for value in rss if value), 1) if any(rss) else None
+        finally:
+            _stop_tree(process)
+        report.pop('server_stats', None)
+        report.update(workers=workers, threads=threads)
+        reports.append(report)
+        print(
+            f"workers={workers} threads={threads}: {report['rps']} req/s, "
+            f"p95 {report['latency_ms']['p95']} ms, errors {report['errors']}",
+            file=sys.stderr,
+        )
+        port += 1
+    return sorted(reports, key=lambda report: (report['errors'] > 0, -report['rps']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='Run N worker processes on one port')
+    serve_parser.add_argument('--workers', type=int, default=max(1, settings.WORKERS))
+    serve_parser.add_argument('--threads', type=int, default=settings.THREADS,
+                              help='Intra-op threads per worker (default: cores / workers)')
+    serve_parser.add_argument('--affinity', action='store_true', default=settings.CPU_AFFINITY,
+                              help='Pin each worker to its own cores')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--preload', default=settings.PRELOAD)
+    serve_parser.add_argument('--no-warmup', action='store_true')
+
+    tune_parser = commands.add_parser('autotune', help='Find the fastest workers x threads split')
+    tune_parser.add_argument('--cpus', type=int, default=len(available_cpus()), help='Cores to split (default: all available)')
+    tune_parser.add_argument('--max-workers', type=int)
+    tune_parser.add_argument('--requests', type=int, default=200)
+    tune_parser.add_argument('--concurrency-per-worker', type=int, default=2)
+    tune_parser.add_argument('--engine', help='OCR_ENGINE for the trial servers (e.g. fake)')
+    tune_parser.add_argument('--no-affinity', action='store_true')
+    tune_parser.add_argument('--images', nargs='*', help='Images to send instead of synthetic crops')
+    tune_parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        threads = args.threads or max(1, len(available_cpus()) // args.workers)
+        serve(args.workers, threads, args.affinity, args.host, args.port, args.preload, not args.no_warmup)
+        return
+
+    splits = candidate_splits(args.cpus, args.max_workers)
+    reports = autotune(
+        splits, args.requests, args.concurrency_per_worker, args.engine,
+        affinity=not args.no_affinity, images=args.images,
+    )
+    best = reports[0]
+    result = {
+        'recommended': {
+            'workers': best['workers'],
+            'threads': best['threads'],
+            'command': f"python workers.py serve --workers {best['workers']} --threads {best['threads']}"
+                       + ("" if args.no_affinity else " --affinity"),
+        },
+        'trials': reports,
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()